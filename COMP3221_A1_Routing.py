@@ -3,299 +3,586 @@ import threading
 import sys
 import time
 import re
-from threading import Timer
 
-shut_signal = threading.Event()
-
-def load_config(config_file_path):
+from datagram import CHANNEL_ROUTING, DatagramSocket
+from heartbeat import Heartbeat
+from metrics import format_stats, init_metrics, start_stats_server, stop_stats_server
+from node_log import LEVELS, node_logger, set_level
+from node_state import init_activity, request_shutdown, set_active, wait_until_active
+from persistence import ConfigWriter
+from shared_state import SharedState
+from timer_wheel import TimerWheel
+from transport import ConnectionPool, FrameListener
+from wire import decode_dv_message, encode_dv_change, encode_dv_table
+
+# Periodic full table to every neighbor, in seconds
+SEND_INTERVAL = 10
+# A changed table is sent right away, but to each neighbor at most once per this many seconds;
+# changes made in between go out together in the next message
+TRIGGERED_UPDATES = True
+MIN_TRIGGER_INTERVAL = 1.0
+# Distances from this value on count as unreachable, which bounds counting to infinity
+INFINITY_METRIC = 1000.0
+# Seconds a route that got worse ignores alternatives that are not better than what it had
+HOLD_DOWN = 5.0
+# A neighbor not heard from for this many seconds is considered down
+NEIGHBOR_TIMEOUT = 12
+# Hellos to every neighbor every HELLO_INTERVAL seconds (0: none). A neighbor that sends hellos is
+# considered down after DEAD_MULTIPLIER of its intervals without one, instead of NEIGHBOR_TIMEOUT
+HELLO_INTERVAL = 1.0
+DEAD_MULTIPLIER = 4
+# How routing tables travel: 'tcp', one long-lived stream per neighbor (transport.py), or 'udp',
+# datagrams from the node's UDP socket, dropped when stale or out of order (datagram.py).
+# Link cost changes always go over TCP, the command needs to know the neighbor got it
+TRANSPORT = 'tcp'
+# Counters and latency histograms for the "stats" command (metrics.py); False skips the timing.
+# With STATS_PORT_OFFSET, the node also serves them on localhost, port_id + STATS_PORT_OFFSET (0: no socket)
+METRICS = True
+STATS_PORT_OFFSET = 0
+# Least important of the node's own messages that are shown (node_log.py; "log" command to change it)
+LOG_LEVEL = 'info'
+
+def load_config(config_file_path, current_time=None):
     neighbors = {}
-    current_time = time.time()
+    if current_time is None:
+        current_time = time.time()
     with open(config_file_path, 'r') as file:
         num_neighbors = int(file.readline().strip())
         for _ in range(num_neighbors):
             line = file.readline().strip().split()
-            node_id, distance, port_id = line[0], float(line[1]), int(line[2])
-            neighbors[node_id] = {'distance': distance, 'port_id': port_id, 'last_received': current_time}
+            node_id, distance, port_id = sys.intern(line[0]), float(line[1]), int(line[2])
+            neighbors[node_id] = {'distance': distance, 'port_id': port_id, 'last_received': current_time, 'alive': True,
+                                  'dead_interval': None}
     return neighbors
 
+def format_path(path):
+    # Single-character IDs print as "ABC" like before, longer ones need a separator
+    if all(len(node) == 1 for node in path):
+        return ''.join(path)
+    return '-'.join(path)
+
+def reconstruct_path(node_id, des, routing_table):
+    # Follows the predecessors back from des. Only done for printing; returns None while the
+    # table is inconsistent (a chain that breaks off or loops)
+    path = [des]
+    current = routing_table[des]['pred']
+    while current != node_id:
+        if current is None or current not in routing_table or len(path) > len(routing_table):
+            return None
+        path.append(current)
+        current = routing_table[current]['pred']
+    path.append(node_id)
+    path.reverse()
+    return path
+
 def print_routing_table(node_id, global_state):
         print(f"I am Node {node_id}")
-        routing_table = global_state['routing_table']
+        routing_table = global_state['routing_state'].snapshot()['routing_table']
         for des in sorted(routing_table.keys()):
             dis = routing_table[des]['distance']
-            path = routing_table[des]['path']
             if dis != float('inf'):
+                path = reconstruct_path(node_id, des, routing_table)
+                path = '(path not settled yet)' if path is None else format_path(path)
                 print(f"Least cost path from {node_id} to {des}: {path}, link cost: {dis:.1f}")
 
-def routing(node_id, message, global_state):
-    lines = message.split('\n')
-    fr = lines[0].strip()
-    #print(f"Receive this message from {fr}:\n{message}")
+def best_route(node_id, des, global_state, held=None):
+    # Bellman-Ford step over the latest vector of every live neighbor. While a route is held down,
+    # only its previous next hop or a route no worse than the one that was lost is accepted
+    # Our path through a neighbor is that neighbor's path with us in front, so the predecessor
+    # of des is the one the neighbor reported (or us, for the link to the neighbor itself).
+    # That only holds while our route to the predecessor goes through the same neighbor; taking
+    # nothing else keeps every path equal to the path to its predecessor plus one hop
+    best_distance, best_hop, best_pred = float('inf'), None, None
+    vectors = global_state['vectors']
+    routing_table = global_state['routing_table']
+    for neighbor_id, info in global_state['neighbors'].items():
+        if not info['alive']:
+            continue
+        if neighbor_id == des:
+            distance, pred = info['distance'], node_id
+        else:
+            entry = vectors[neighbor_id].get(des)
+            if entry is None:
+                continue
+            distance, pred = info['distance'] + entry[0], entry[1]
+            if pred != neighbor_id and routing_table.get(pred, {}).get('next_hop') != neighbor_id:
+                continue
+        if held is not None and neighbor_id != held[2] and distance > held[1]:
+            continue
+        if distance < best_distance:
+            best_distance, best_hop, best_pred = distance, neighbor_id, pred
+    if best_distance >= INFINITY_METRIC:
+        return float('inf'), None, None
+    return best_distance, best_hop, best_pred
+
+def update_route(node_id, des, global_state, now):
+    # Recomputes the route to des, returns True if it changed. Caller is inside routing_state.write()
     routing_table = global_state['routing_table']
-    global_state['neighbors'][fr]['last_received'] = time.time()
+    hold_downs = global_state['hold_downs']
+    old = routing_table.get(des)
+    held = hold_downs.get(des)
+    if held is not None and now >= held[0]:
+        del hold_downs[des]
+        held = None
+
+    distance, next_hop, pred = best_route(node_id, des, global_state, held)
+    if held is None and old is not None and distance > old['distance'] and HOLD_DOWN > 0:
+        # The route got worse: for a while, ignore alternatives that could be stale echoes of it
+        held = hold_downs[des] = (now + HOLD_DOWN, old['distance'], old['next_hop'])
+        global_state['timers'].arm(('hold_down', des), HOLD_DOWN)
+        distance, next_hop, pred = best_route(node_id, des, global_state, held)
+
+    if old is not None and old['distance'] == distance and old['next_hop'] == next_hop and old['pred'] == pred:
+        return False
+    if old is None and distance == float('inf'):
+        return False
+    routing_table[des] = {'distance': distance, 'next_hop': next_hop, 'pred': pred}
+    return True
+
+def update_routes(node_id, destinations, global_state):
+    # Routes whose predecessor got a new route are recomputed as well (see best_route)
+    metrics = global_state['metrics']
+    if metrics is not None:
+        start = time.perf_counter()
+    now = global_state['clock']()
+    children = global_state['children']
+    pending = list(destinations)
     if_changed = False
-    for line in lines[1:]:
-        des, dis, path = line.split(' ')
-        dis = float(dis)
-        if des != node_id and node_id not in path:
-            if des in routing_table.keys():
-                if fr not in routing_table[des]['path']:
-                    if dis + routing_table[fr]['distance'] < routing_table[des]['distance']:
-                        #print(f"I've entered this condition 1, with des {des}, path {path}")
-                        routing_table[des]['distance'] = dis + routing_table[fr]['distance']
-                        routing_table[des]['path'] = routing_table[fr]['path'] + path[1:]
-                        if_changed = True
-                elif fr in routing_table[des]['path']:
-                    if routing_table[des]['distance'] != dis+routing_table[fr]['distance']:
-                        #print(f"I've entered this condition 2, with des {des}, path {path}")
-                        routing_table[des]['distance'] = dis + routing_table[fr]['distance']
-                        routing_table[des]['path'] = routing_table[fr]['path'] + path[1:]
-                        if_changed = True
-            else:
-                #print("I've entered this condition 3")
-                routing_table[des] = {'distance':dis + routing_table[fr]['distance'],'path':routing_table[fr]['path'] + path[1:]}
-                if_changed = True
-        elif des == node_id:
-            if dis < routing_table[fr]['distance']:
-                #print(f"I've entered condition 4, with des {des}, path {path}, dis {dis}")
-                routing_table[fr]['distance'] = dis
-                routing_table[fr]['path'] = node_id+path[1:-1]+fr
-                if_changed = True
-    global_state['routing_table'] = routing_table
-    
-    #print(global_state['routing_print_allowed'])
-    if if_changed and global_state['routing_print_allowed']:
-        print("---- Routing Algorithm Completed ----")
-        print_routing_table(node_id, global_state)
-        print("-------------------------------------")
+    while pending:
+        des = pending.pop()
+        if des != node_id and update_route(node_id, des, global_state, now):
+            if_changed = True
+            for neighbor_children in children.values():
+                pending.extend(neighbor_children.get(des, ()))
+    if metrics is not None:
+        metrics.observe('routing_spf_seconds', time.perf_counter() - start)
+        if if_changed:
+            metrics.routes_changed(now)
+    return if_changed
+
+def routes_through(node_id, fr, preds):
+    # Which destinations of fr's vector are reached through node_id. Each predecessor chain is
+    # walked once and the answer remembered for every node on it, so this is linear in the vector
+    through = {fr: False, node_id: True}
+    for des in preds:
+        chain = []
+        current = des
+        while current not in through:
+            through[current] = None  # on the chain being walked
+            chain.append(current)
+            # fr only leaves out (poisons) a reachable predecessor when its route goes through us
+            current = preds.get(current, node_id)
+        # Meeting the chain itself again (None) is a loop as well
+        result = through[current] is not False
+        for node in chain:
+            through[node] = result
+    return through
+
+def routing(node_id, fr, entries, global_state):
+    metrics = global_state['metrics']
+    if metrics is not None:
+        start = time.perf_counter()
+    with global_state['routing_state'].write('routing_table', 'neighbors'):
+        neighbor = global_state['neighbors'][fr]
+        neighbor['last_received'] = global_state['clock']()
+        if not neighbor['alive'] and metrics is not None:
+            metrics.count('routing_neighbor_flaps_total', neighbor=fr, state='up')
+        neighbor['alive'] = True
+        # Once a neighbor sends hellos, only hellos keep it alive
+        if neighbor['dead_interval'] is None:
+            global_state['timers'].arm(('neighbor', fr), NEIGHBOR_TIMEOUT)
+
+        # Keep the neighbor's whole vector as {des: (distance, predecessor)}; only destinations it
+        # changed need a new route. A path through this node would be a loop, it counts as
+        # unreachable like a poisoned route
+        old_vector = global_state['vectors'][fr]
+        reachable = {des: (dis, pred) for des, dis, pred in entries if dis < INFINITY_METRIC}
+        through = routes_through(node_id, fr, {des: pred for des, (_, pred) in reachable.items()})
+        vector = {des: entry for des, entry in reachable.items() if not through[des]}
+        global_state['vectors'][fr] = vector
+        children = global_state['children'][fr] = {}
+        for des, (_, pred) in vector.items():
+            children.setdefault(pred, []).append(des)
+        changed = {des for des in vector if old_vector.get(des) != vector[des]}
+        changed.update(des for des in old_vector if des not in vector)
+        changed.add(fr)
+        if_changed = update_routes(node_id, changed, global_state)
+    if metrics is not None:
+        metrics.observe('routing_update_seconds', time.perf_counter() - start)
+
+    # The table itself is only printed by the "routing table" command
+    if if_changed:
+        global_state['log'].debug("Routing table changed after a message from %s", fr)
+    return if_changed
 
 def listening_to_neighbors(node_id, port_id, server_socket, global_state, config_file_path):
-    print(f"[{node_id}] Node is listening on port {port_id}\n")
+    global_state['log'].info("[%s] Node is listening on port %s", node_id, port_id)
+    listener = FrameListener(server_socket)
+    shut_signal = global_state['shut_signal']
 
     while not shut_signal.is_set():
-        if not global_state['active']:
-            continue
+        if not wait_until_active(global_state, shut_signal):
+            break
 
         try:
-            conn, addr = server_socket.accept()
-            #print(f"[{node_id}] Connection from {addr} established.\n")
-            data = conn.recv(4096)
-            if data:
-                message = data.decode('utf-8')
-                #print(f"receive message: {message}")
-                if message.startswith('change'):
-                    temp_split = message.split(' ')
-                    des = temp_split[1]
-                    new_cost = float(temp_split[2])
-                    change_link_cost(node_id, des,  new_cost, global_state, config_file_path)
-                else:
-                    routing(node_id, message, global_state)
-            conn.close()
-        except socket.error:
+            messages = listener.poll(1.0)
+        except (OSError, ValueError):
             break
 
-    print(f"[{node_id}] Node has stopped listening on port {port_id}\n")
+        for data in messages:
+            receive_message(node_id, data, global_state, config_file_path)
+
+    listener.close()
+    global_state['log'].info("[%s] Node has stopped listening on port %s", node_id, port_id)
+
+def receive_message(node_id, data, global_state, config_file_path):
+    # Called by the listener, or by the UDP socket's thread with TRANSPORT = 'udp'.
+    # Returns True if the routing table changed
+    metrics = global_state['metrics']
+    if metrics is not None:
+        metrics.count('routing_bytes_received_total', len(data))
+        start = time.perf_counter()
+    try:
+        kind, sender, content = decode_dv_message(data)
+    except ValueError:
+        global_state['log'].warning("[%s] Dropped a malformed message", node_id)
+        if metrics is not None:
+            metrics.count('routing_messages_dropped_total', reason='malformed')
+        return False
+    if metrics is not None:
+        metrics.observe('routing_decode_seconds', time.perf_counter() - start)
+    if sender not in global_state['neighbors']:
+        global_state['log'].warning("[%s] Dropped a message from %s, which is not a neighbor", node_id, sender)
+        if metrics is not None:
+            metrics.count('routing_messages_dropped_total', reason='not_neighbor')
+        return False
+    if metrics is not None:
+        metrics.count('routing_messages_received_total', kind=kind)
+    if kind == 'change':
+        change_link_cost(node_id, sender, content, global_state, config_file_path)
+        return True
+    if routing(node_id, sender, content, global_state):
+        trigger_update(global_state)
+        return True
+    return False
+
+def receive_datagram(node_id, data, global_state, config_file_path):
+    # A disabled node hears nothing, like the listener that stops reading its streams
+    if global_state['active']:
+        receive_message(node_id, data, global_state, config_file_path)
 
 def command_line_interface(node_id, global_state, config_file_path, server_socket):
-    while not shut_signal.is_set():
+    while not global_state['shut_signal'].is_set():
         cmd = input()
-        if cmd == "config":
-            neighbors = global_state["neighbors"]
-            for neighbor, info in neighbors.items():
-                print(f"{neighbor} {info['distance']} {info['port_id']}")
-        elif cmd == "shutdown":
-            shut_signal.set()
-            server_socket.close()
-        elif re.match(r'shutdown -n \d+', cmd):
-            wait_time = int(re.findall(r'\d+', cmd)[0])
-            print(f"Shutdown scheduled in {wait_time} seconds.")
-            time.sleep(wait_time)
-            shut_signal.set()
-            server_socket.close()
-        elif cmd == "routing table":
-            print("---- Routing Table ----")
-            print_routing_table(node_id, global_state)
-            print("------------------------")
-        elif re.match(r"^change [a-zA-Z] \d+(\.\d+)?$", cmd):
-            temp_split = cmd.split(" ")
-            target_id = temp_split[1]
-            new_dis = temp_split[2]
-            routing_table = global_state['routing_table']
-            neighbors = global_state['neighbors']
-            if target_id in neighbors.keys():
-                target_port = neighbors[target_id]['port_id']
-                message = f"change {node_id} {new_dis}"
-                try:
-                    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                        s.connect(('localhost', target_port))
-                        s.sendall(message.encode('utf-8'))
-                except socket.error as e:
-                    print(f"Error sending message to neighbor {target_id}: {e}")
-                    print(f"Please make sure {target_id} is active, so it can update its own config file")
-                    print(f"The link cost change unsucceed because {target_id} is not active\n")
-                    continue
-                change_link_cost(node_id, target_id, float(new_dis), global_state, config_file_path)
-            else:
-                print(f"{target_id} is not {node_id}'s neighbor\n")
-        elif cmd == "disable":
-            global_state['active'] = False
-            print(f"[{node_id}] is disabled")
-        elif cmd == "enable":
-            global_state['active'] = True
-            print(f"[{node_id}] is enabled again")
+        run_command(node_id, cmd, global_state, config_file_path, server_socket)
+
+def run_command(node_id, cmd, global_state, config_file_path, server_socket):
+    if cmd == "config":
+        neighbors = global_state["neighbors"]
+        for neighbor, info in neighbors.items():
+            print(f"{neighbor} {info['distance']} {info['port_id']}")
+    elif cmd == "shutdown":
+        shutdown(global_state, server_socket)
+    elif re.match(r'shutdown -n \d+', cmd):
+        wait_time = int(re.findall(r'\d+', cmd)[0])
+        print(f"Shutdown scheduled in {wait_time} seconds.")
+        # On a timer of its own, the command line (the launcher's, for every node) keeps going
+        timer = threading.Timer(wait_time, shutdown, args=(global_state, server_socket))
+        timer.daemon = True
+        timer.start()
+    elif cmd == "routing table":
+        print("---- Routing Table ----")
+        print_routing_table(node_id, global_state)
+        print("------------------------")
+    elif cmd.startswith("log "):
+        level = cmd[len("log "):]
+        if set_level(global_state['log'], level):
+            print(f"[{node_id}] log level: {level}")
         else:
-            print("Can't recognise your command, check Readme.txt, and make sure you type your command right.\n")
+            print(f"Log levels: {', '.join(LEVELS)}")
+    elif cmd == "stats":
+        print(format_stats(global_state))
+    elif re.match(r"^change \S+ \d+(\.\d+)?$", cmd):
+        temp_split = cmd.split(" ")
+        target_id = temp_split[1]
+        new_dis = temp_split[2]
+        change_neighbor_cost(node_id, target_id, float(new_dis), global_state, config_file_path)
+    elif cmd == "disable":
+        set_active(global_state, False)
+        print(f"[{node_id}] is disabled")
+    elif cmd == "enable":
+        # Neighbors were not heard from while disabled, restart their timeouts from now
+        current_time = global_state['clock']()
+        with global_state['routing_state'].write('neighbors'):
+            for neighbor_id, info in global_state['neighbors'].items():
+                info['last_received'] = current_time
+                global_state['timers'].arm(('neighbor', neighbor_id), neighbor_timeout(info))
+        set_active(global_state, True)
+        print(f"[{node_id}] is enabled again")
+    else:
+        print("Can't recognise your command, check Readme.txt, and make sure you type your command right.\n")
+
+def change_neighbor_cost(node_id, target_id, cost, global_state, config_file_path):
+    # The "change" command: tell the neighbor first, so both ends of the link agree on the cost
+    neighbors = global_state['neighbors']
+    if target_id not in neighbors.keys():
+        print(f"{target_id} is not {node_id}'s neighbor\n")
+        return False
+    target_port = neighbors[target_id]['port_id']
+    message = encode_dv_change(node_id, cost)
+    if global_state['metrics'] is not None:
+        global_state['metrics'].count('routing_messages_sent_total', kind='change')
+        global_state['metrics'].count('routing_bytes_sent_total', len(message))
+    if not global_state['pool'].send(target_port, message):
+        print(f"Error sending message to neighbor {target_id}")
+        print(f"Please make sure {target_id} is active, so it can update its own config file")
+        print(f"The link cost change unsucceed because {target_id} is not active\n")
+        return False
+    change_link_cost(node_id, target_id, cost, global_state, config_file_path)
+    return True
 
 def change_link_cost(my_id, des, cost, global_state, config_file_path):
-    # change the cost to the des, delete all related routes in routing table
-    update_cost_in_file(config_file_path, des, cost)
-    global_state["neighbors"][des]["distance"] = cost
-    
-    nodes_to_delete = []
-    for node in global_state["routing_table"].keys():
-        if node == des:
-            global_state["routing_table"][des]['distance'] = cost
-            global_state["routing_table"][des]['path'] = my_id+des
-        else:
-            if des in global_state["routing_table"][node]['path']:
-                nodes_to_delete.append(node)
-    
-    for node in nodes_to_delete:
-        del global_state["routing_table"][node]
-
-    print("---- Routing Table updated ----")
-    print_routing_table(my_id, global_state)
-    print("-------------------------------")
-
-def update_cost_in_file(file_path, target, new_cost):
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    updated_lines = []
-    for line in lines:
-        parts = line.split()
-        if parts[0] == target:
-            parts[1] = str(new_cost)
-            updated_line = ' '.join(parts)
-            updated_lines.append(updated_line + '\n')
-        else:
-            updated_lines.append(line)
-    
-    with open(file_path, 'w') as file:
-        file.writelines(updated_lines)
+    # change the cost to the des and recompute every route
+    # (the config file is rewritten in the background)
+    global_state['config_writer'].set_cost(des, cost)
+    with global_state['routing_state'].write('routing_table', 'neighbors'):
+        global_state["neighbors"][des]["distance"] = cost
+        update_routes(my_id, list(global_state['routing_table']), global_state)
 
-def format_routing_table_for_sending(routing_table):
-    lines = [f"{node_id} {info['distance']} {info['port_id']}" for node_id, info in routing_table.items()]
-    routing_table_str = "\n".join(lines)
-    return routing_table_str
+    global_state['log'].info("[%s] Link to %s now costs %s, routing table updated", my_id, des, cost)
+    trigger_update(global_state)
 
 def init_routing_table(node_id, neighbors):
     routing_table = {}
     for neighbor_id, info in neighbors.items():
-        path = node_id + neighbor_id
-        routing_table[neighbor_id] = {'distance': info['distance'], 'path': path}
+        routing_table[neighbor_id] = {'distance': info['distance'], 'next_hop': neighbor_id, 'pred': node_id}
     return routing_table
 
-def format_routing_table_for_sending(routing_table):
-    lines = [f"{node_id} {info['distance']} {info['path']}" for node_id, info in routing_table.items()]
-    routing_table_str = "\n".join(lines)
-    return routing_table_str
-
-def sending_routing_table(node_id, global_state, sending_port):
-    while not shut_signal.is_set():
-        if not global_state['active']:
-            continue
-
-        routing_table = global_state['routing_table']
-        neighbors = global_state['neighbors']
-        routing_table_str = format_routing_table_for_sending(routing_table)
-        message = f"{node_id}\n{routing_table_str}"
-
-        for neighbor_id, info in neighbors.items():
-            try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sending_socket:
-                    #print(f"sending message to {neighbor_id} {info['port_id']}:\n{message}")
-                    sending_socket.connect(('localhost', info['port_id']))
-                    sending_socket.sendall(message.encode('utf-8'))
-            except socket.error as e:
-                #print(f"error sending to {neighbor_id}: {e}")
-                pass
-        time.sleep(10)
-
-
-def allow_routing_print(global_state):
-    global_state['routing_print_allowed'] = True
-    #print(f"global_state's routing_print_allowed = True now: {global_state['routing_print_allowed']}")
-
-def check_neighbors_alive(global_state, node_id):
-    while not shut_signal.is_set():
-        if not global_state['active']:
-            for node, info in global_state['neighbors'].items():
-                info['last_received'] = time.time()
+def format_routing_table_for_sending(node_id, routing_table, neighbor_id=None):
+    # Split horizon with poison reverse: routes through neighbor_id are advertised back to it as unreachable
+    entries = []
+    for des, info in list(routing_table.items()):
+        if info['next_hop'] == neighbor_id:
+            entries.append((des, float('inf'), None))
+        else:
+            entries.append((des, info['distance'], info['pred']))
+    return encode_dv_table(node_id, entries)
+
+def init_updates(global_state):
+    global_state['updates'] = {'condition': threading.Condition(), 'triggered': set(), 'last_sent': {},
+                               'triggers': 0, 'triggered_sends': 0, 'periodic_sends': 0}
+
+def trigger_update(global_state):
+    # Called after the routing table changed, the sending thread does the actual sending
+    if not TRIGGERED_UPDATES:
+        return
+    updates = global_state['updates']
+    with updates['condition']:
+        updates['triggered'].update(global_state['neighbors'])
+        updates['triggers'] += 1
+        updates['condition'].notify()
+
+def due_neighbors(global_state, now):
+    # Returns the neighbors to send to now, and how long to wait otherwise
+    updates = global_state['updates']
+    due, wait = {}, SEND_INTERVAL
+    for neighbor_id in global_state['neighbors']:
+        last_sent = updates['last_sent'].get(neighbor_id)
+        if last_sent is None or now >= last_sent + SEND_INTERVAL:
+            due[neighbor_id] = 'periodic'
             continue
+        if neighbor_id in updates['triggered']:
+            if now >= last_sent + MIN_TRIGGER_INTERVAL:
+                due[neighbor_id] = 'triggered'
+                continue
+            wait = min(wait, last_sent + MIN_TRIGGER_INTERVAL - now)
+        wait = min(wait, last_sent + SEND_INTERVAL - now)
+    return due, wait
 
-        current_time = time.time()
-        timeout_neighbors = [node for node, info in global_state['neighbors'].items() if current_time - info['last_received'] > 12]
-        for node in timeout_neighbors:
-            nodes_to_del = []
-            print(f"Haven't received message from neighbor {node}, consider it down.")
-            print(f"It may take a while for the network to be stable, please type in \"routing table\" later to check if the routing table is correct.\n")
-            for dest, route in global_state['routing_table'].items():
-                #print(f"dest is {dest}, route is {route}\ndest is in global state neighbors? {dest in global_state['neighbors'].keys()}")
-                if dest not in global_state['neighbors'].keys() and node in route['path']:
-                    nodes_to_del.append(dest)
-                elif dest in global_state['neighbors'].keys() and node in route['path']:
-                    global_state['routing_table'][dest]['distance'] = global_state['neighbors'][dest]['distance']
-                    global_state['routing_table'][dest]['path'] = node_id + dest
-                global_state['routing_table'][node]['distance'] = float('inf')
-            for node_to_del in nodes_to_del:
-                del global_state['routing_table'][node_to_del]
-        time.sleep(10)
-
-def print_routing_thread(node_id, global_state):
+def sending_routing_table(node_id, global_state, sending_port):
+    updates = global_state['updates']
+    shut_signal = global_state['shut_signal']
     while not shut_signal.is_set():
-        if not global_state['active']:
-            continue
-        print("---- Current Routing Table ----")
-        print_routing_table(node_id, global_state)
-        print("-------------------------------")
-        time.sleep(60)
+        if not wait_until_active(global_state, shut_signal):
+            break
 
-def start_server(node_id, port_id, config_file_path):
+        with updates['condition']:
+            due, wait = due_neighbors(global_state, global_state['clock']())
+            if not due:
+                # Woken up early by trigger_update; at least every second to notice a shutdown
+                updates['condition'].wait(min(wait, 1.0))
+                continue
+            updates['triggered'].difference_update(due)
+
+        # Unreachable neighbors are retried by the pool with backoff
+        send_tables(node_id, global_state, due,
+                    lambda neighbor_id, message: global_state['transport'].send(global_state['neighbors'][neighbor_id]['port_id'], message))
+
+def send_tables(node_id, global_state, due, send):
+    # due: {neighbor: 'periodic' or 'triggered'}; send(neighbor_id, message) does the actual sending
+    updates = global_state['updates']
+    metrics = global_state['metrics']
+    routing_table = global_state['routing_state'].snapshot()['routing_table']
+    for neighbor_id, reason in due.items():
+        message = format_routing_table_for_sending(node_id, routing_table, neighbor_id)
+        send(neighbor_id, message)
+        updates['last_sent'][neighbor_id] = global_state['clock']()
+        updates[f"{reason}_sends"] += 1
+        if metrics is not None:
+            metrics.count('routing_messages_sent_total', kind=reason)
+            metrics.count('routing_bytes_sent_total', len(message))
+
+
+def neighbor_timeout(info):
+    return info['dead_interval'] if info['dead_interval'] is not None else NEIGHBOR_TIMEOUT
+
+def hello_received(global_state, fr, dead_interval):
+    # Only keeps the neighbor alive; routes come with its tables
+    with global_state['routing_state'].write('neighbors'):
+        neighbor = global_state['neighbors'][fr]
+        neighbor['last_received'] = global_state['clock']()
+        neighbor['dead_interval'] = dead_interval
+    global_state['timers'].arm(('neighbor', fr), dead_interval)
+
+def timer_expired(node_id, global_state, key):
+    # Called by the timer wheel: ('neighbor', id) when a neighbor was not heard from for
+    # NEIGHBOR_TIMEOUT, ('hold_down', des) when the hold-down of a route ran out.
+    # Returns True if the routing table changed
+    kind, target = key
+    if kind == 'neighbor':
+        # While disabled nothing is received; the enable command rearms every neighbor
+        if global_state['active']:
+            return neighbor_timed_out(node_id, global_state, target)
+    elif kind == 'hold_down':
+        return hold_down_expired(node_id, global_state, target)
+    return False
+
+def neighbor_timed_out(node_id, global_state, node):
+    with global_state['routing_state'].write('routing_table', 'neighbors'):
+        if not global_state['neighbors'][node]['alive']:
+            return False
+        global_state['log'].warning("Haven't received message from neighbor %s, consider it down.\n"
+                                    "It may take a while for the network to be stable, please type in \"routing table\" later to check if the routing table is correct.", node)
+        global_state['neighbors'][node]['alive'] = False
+        if global_state['metrics'] is not None:
+            global_state['metrics'].count('routing_neighbor_flaps_total', neighbor=node, state='down')
+        global_state['vectors'][node] = {}
+        global_state['children'][node] = {}
+        # Every route may have gone through the lost neighbor
+        if_changed = update_routes(node_id, list(global_state['routing_table']), global_state)
+    if if_changed:
+        trigger_update(global_state)
+    return if_changed
+
+def hold_down_expired(node_id, global_state, des):
+    with global_state['routing_state'].write('routing_table'):
+        # Also gone when a later update_route found it expired first
+        if global_state['hold_downs'].pop(des, None) is None:
+            return False
+        if_changed = update_routes(node_id, [des], global_state)
+    if if_changed:
+        trigger_update(global_state)
+    return if_changed
+
+def init_global_state(node_id, config_file_path, clock=time.time, timer_class=TimerWheel):
+    # A node's state without any thread or socket; the emulator drives it with a virtual clock
+    # and timers (timer_class(on_expire, log=logger) with arm and cancel, like TimerWheel)
     global_state = {}
-    neighbors = load_config(config_file_path)
+    global_state['clock'] = clock
+    neighbors = load_config(config_file_path, clock())
     routing_table = init_routing_table(node_id, neighbors)
     global_state['routing_table'] = routing_table
     global_state['neighbors'] = neighbors
-    global_state['routing_print_allowed'] = False
-    global_state['active'] = True
+    # Latest distance vector received from each neighbor: {dest: (distance, predecessor)}
+    global_state['vectors'] = {neighbor_id: {} for neighbor_id in neighbors}
+    # The same vectors indexed by predecessor: {pred: [dest, ...]}
+    global_state['children'] = {neighbor_id: {} for neighbor_id in neighbors}
+    global_state['hold_downs'] = {}
+    global_state['log'] = node_logger(node_id, LOG_LEVEL)
+    # Deadlines of neighbor timeouts and hold-downs, rearmed on every message from a neighbor
+    global_state['timers'] = timer_class(lambda key: timer_expired(node_id, global_state, key), log=global_state['log'])
+    # Routes and neighbors are changed inside routing_state.write() only, one writer at a time, which
+    # also owns vectors, children and hold_downs. Printing and sending read routing_state.snapshot().
+    # Route entries are replaced, never changed in place, so a snapshot only copies the table's dict
+    global_state['routing_state'] = SharedState({'routing_table': routing_table, 'neighbors': neighbors},
+                                                copiers={'routing_table': dict})
+    # Set by stop_node for this node only; nodes run in-process share the module
+    global_state['shut_signal'] = threading.Event()
+    init_activity(global_state)
+    init_metrics(global_state, node_id, METRICS)
+    global_state['pool'] = ConnectionPool()
+    global_state['config_writer'] = ConfigWriter(config_file_path, log=global_state['log'])
+    init_updates(global_state)
+    return global_state
+
+def start_node(node_id, port_id, config_file_path):
+    # Starts a node's listening, sending and maintenance threads and returns its state and socket.
+    # start_server adds the command line on top; benchmarks start several nodes in one process
+    global_state = init_global_state(node_id, config_file_path)
+    neighbors = global_state['neighbors']
+    for neighbor_id in neighbors:
+        global_state['timers'].arm(('neighbor', neighbor_id), NEIGHBOR_TIMEOUT)
 
     '''
     print(f"debug: the routing table is ")
     for node_id, info in routing_table.items():
-        print(f"{node_id} {info['distance']} {info['path']}")
+        print(f"{node_id} {info['distance']} {info['next_hop']}")
     print(f"debug: the neighbors table is ")
     for neighbor, info in neighbors.items():
         print(f"{neighbor} {info['distance']} {info['port_id']}")
     '''
 
-    Timer(60, allow_routing_print, args=(global_state,)).start()
-
     listening_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Long-lived neighbor streams leave TIME_WAIT entries behind, so allow quick restarts on the same port
+    listening_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     listening_socket.bind(('localhost', port_id))
     listening_socket.listen()
+    # The UDP socket carries the hellos, and the routing tables too with TRANSPORT = 'udp'
+    global_state['datagrams'] = DatagramSocket(port_id, log=global_state['log'])
+    if TRANSPORT == 'udp':
+        global_state['datagrams'].on(CHANNEL_ROUTING, lambda data: receive_datagram(node_id, data, global_state, config_file_path))
+        global_state['transport'] = global_state['datagrams']
+    else:
+        global_state['transport'] = global_state['pool']
+    if HELLO_INTERVAL > 0:
+        # Hellos go to the neighbors' own port numbers
+        peers = {neighbor_id: info['port_id'] for neighbor_id, info in neighbors.items()}
+        global_state['heartbeat'] = Heartbeat(node_id, global_state['datagrams'], peers,
+                                              lambda fr, dead_interval: hello_received(global_state, fr, dead_interval),
+                                              lambda: global_state['active'], HELLO_INTERVAL, DEAD_MULTIPLIER)
+    else:
+        global_state['heartbeat'] = None
+    if STATS_PORT_OFFSET:
+        start_stats_server(global_state, port_id + STATS_PORT_OFFSET)
 
     listening_thread = threading.Thread(target=listening_to_neighbors, args=(node_id, port_id, listening_socket, global_state, config_file_path))
-    cli_thread = threading.Thread(target=command_line_interface, args=(node_id, global_state, config_file_path, listening_socket))
     sending_thread = threading.Thread(target=sending_routing_table, args=(node_id, global_state, port_id+1000))
-    check_thread = threading.Thread(target=check_neighbors_alive, args=(global_state, node_id))
-    print_thread = threading.Thread(target=print
 
     listening_thread.start()
-    cli_thread.start()
     sending_thread.start()
-    check_thread.start()
+    return global_state, listening_socket
+
+def stop_node(global_state):
+    # The threads notice the shutdown signal by themselves, the timers, hellos and sockets are closed here
+    request_shutdown(global_state, global_state['shut_signal'])
+    global_state['timers'].close()
+    stop_stats_server(global_state)
+    if global_state['heartbeat'] is not None:
+        global_state['heartbeat'].close()
+    global_state['datagrams'].close()
+    global_state['pool'].close()
+    global_state['config_writer'].close()
+
+def shutdown(global_state, server_socket):
+    # The "shutdown" command, right away or from the timer of "shutdown -n"
+    if not global_state['shut_signal'].is_set():
+        stop_node(global_state)
+        server_socket.close()
 
+def start_server(node_id, port_id, config_file_path):
+    global_state, listening_socket = start_node(node_id, port_id, config_file_path)
+    cli_thread = threading.Thread(target=command_line_interface, args=(node_id, global_state, config_file_path, listening_socket))
+    cli_thread.start()
     cli_thread.join()
 
 if __name__ == "__main__":
@@ -2,75 +2,262 @@ import socket
 import threading
 import sys
 import time
-import json
 import re
 
+from convergence import (convergence_metrics, format_convergence_metrics, init_convergence, note_change,
+                         note_report, wait_for_convergence, wait_for_first_calculation)
+from datagram import CHANNEL_ROUTING, DatagramSocket
+from heartbeat import Heartbeat
+from metrics import format_stats, init_metrics, start_stats_server, stop_stats_server
+from node_log import LEVELS, node_logger, set_level
+from cost_matrix import convert_cost_matrix, make_cost_matrix, DenseCostMatrix
+from spf import build_spt, update_edge
+from node_state import init_activity, request_shutdown, set_active, wait_until_active
+from persistence import ConfigWriter
+from shared_state import SharedState
+from timer_wheel import TimerWheel
+from transport import ConnectionPool, FrameListener
+from wire import decode_ls_advertisement, encode_ls_advertisement
+from worker_pool import WorkerPool, format_worker_metrics
+
 shut_signal = threading.Event()
 calculation_signal = threading.Event()
 
-
-def load_config(config_file_path):
+# 'incremental' repairs the shortest path tree per changed link, 'full' reruns dijkstra every time
+SPF_MODE = 'incremental'
+# More pending link changes than this between two calculations forces a full run
+INCREMENTAL_EDGE_LIMIT = 8
+# Every this many advertisements a neighbor gets the full table instead of a delta, to resync
+FULL_SNAPSHOT_EVERY = 6
+# 'dense' stores the cost table as a V x V array of doubles, 'sparse' keeps only the finite links
+# of each row; 'auto' switches to sparse from SPARSE_MATRIX_NODES nodes on
+COST_MATRIX = 'auto'
+SPARSE_MATRIX_NODES = 256
+# Received advertisements are handled by this many workers, the listener only reads and decodes
+# them (0: the listener handles them itself). Each worker queues up to WORKER_QUEUE_SIZE messages
+WORKERS = 4
+WORKER_QUEUE_SIZE = 64
+# Advertisement to every neighbor, in seconds
+SEND_INTERVAL = 10
+# A neighbor not heard from for this many seconds is considered down
+NEIGHBOR_TIMEOUT = 15
+# Hellos to every neighbor every HELLO_INTERVAL seconds (0: none). A neighbor that sends hellos is
+# considered down after DEAD_MULTIPLIER of its intervals without one, instead of NEIGHBOR_TIMEOUT
+HELLO_INTERVAL = 1.0
+DEAD_MULTIPLIER = 4
+# How advertisements travel: 'tcp', one long-lived stream per neighbor (transport.py), or 'udp',
+# datagrams from the node's UDP socket, dropped when stale or out of order (datagram.py)
+TRANSPORT = 'tcp'
+# Counters and latency histograms for the "stats" command (metrics.py); False skips the timing.
+# With STATS_PORT_OFFSET, the node also serves them on localhost, port_id + STATS_PORT_OFFSET (0: no socket)
+METRICS = True
+STATS_PORT_OFFSET = 0
+# Least important of the node's own messages that are shown (node_log.py; "log" command to change it)
+LOG_LEVEL = 'info'
+
+
+def load_config(config_file_path, current_time=None):
     neighbors = {}
+    # A neighbor that is never heard from times out like one that went silent
+    if current_time is None:
+        current_time = time.time()
     with open(config_file_path, 'r') as file:
         num_neighbors = int(file.readline().strip())
         for _ in range(num_neighbors):
             line = file.readline().strip().split()
             node_id, link_cost, port_id = line[0], float(line[1]), int(line[2])
-            neighbors[node_id] = {'link_cost': link_cost, 'port_id': port_id, 'last_received': None,'active': True}
+            neighbors[node_id] = {'link_cost': link_cost, 'port_id': port_id, 'last_received': current_time,'active': True,
+                                  'dead_interval': None}
 
     return neighbors
 
 
 def listening_to_neighbors(port_id, server_socket, global_state, config_file_path,update_singal):
     node_id = global_state['node_id']
-    print(f"[{node_id}] Node is listening on port {port_id}\n")
+    global_state['log'].info("[%s] Node is listening on port %s", node_id, port_id)
+    listener = FrameListener(server_socket)
 
     while not shut_signal.is_set():
 
-        if not global_state['active']:
-            continue
+        if not wait_until_active(global_state, shut_signal):
+            break
 
         try:
-            conn, addr = server_socket.accept()
-            print(f"[{node_id}] Connection from {addr} established.\n")
-            data = conn.recv(4096)
-
-            if data:
-                message = data.decode('utf-8')
-                message = json.loads(message)
-                sender = message['sender']
-                updates = message['table']
-        
-                global_state['neighbors'][sender]['last_received'] = time.time()
-
-                 # Check if the node has just been enable and should ignore checking
-                if global_state['last_enable'] is not None and time.time() - global_state['last_enable'] < 5:
-                    time_to_wait = 5 - (time.time() - global_state['last_enable'])
-                    print(f"Ignoring listening for {time_to_wait} more seconds.")
-                    time.sleep(time_to_wait) 
-                    continue
-
-                num_changes = update_routing_table(updates, global_state,config_file_path)
-                if num_changes > 0:
-                    print("update detected")
-                    global_state['update'] = True
-
-            conn.close()
-        except socket.error:
+            messages = listener.poll(1.0)
+        except (OSError, ValueError):
             break
 
-    print(f"[{node_id}] Node has stopped listening on port {port_id}\n")
-
-def init_routing_table(node_id, neighbors):
-    cost_table = {}
+        for data in messages:
+            receive_advertisement(data, global_state, config_file_path)
+
+    listener.close()
+    global_state['log'].info("[%s] Node has stopped listening on port %s", node_id, port_id)
+
+def receive_advertisement(data, global_state, config_file_path, block=True):
+    # Called by the listener, or by the UDP socket's thread with TRANSPORT = 'udp'
+    message = decode_received(data, global_state)
+    if message is None:
+        return
+    if global_state['workers'] is not None:
+        # Blocks while the sender's worker is backed up, unless block is False
+        if not global_state['workers'].submit(message['sender'], message, block):
+            global_state['log'].debug("Dropped an advertisement from %s, its worker is backed up", message['sender'])
+            if global_state['metrics'] is not None:
+                global_state['metrics'].count('routing_messages_dropped_total', reason='backlog')
+    else:
+        handle_advertisement(message, global_state, config_file_path)
+
+def receive_datagram_advertisement(data, global_state, config_file_path):
+    # A disabled node hears nothing, like the listener that stops reading its streams.
+    # The UDP socket's thread takes in the hellos too, so it never waits for a worker: an
+    # advertisement that finds its worker backed up is lost like a datagram, the next one replaces it
+    if global_state['active']:
+        receive_advertisement(data, global_state, config_file_path, block=False)
+
+def handle_advertisement(message, global_state, config_file_path):
+    advertisement_received(global_state, message['sender'])
+
+     # Check if the node has just been enable and should ignore checking
+    time_to_wait = enable_wait(global_state)
+    if time_to_wait > 0:
+        global_state['log'].info("Ignoring listening for %.1f more seconds.", time_to_wait)
+        time.sleep(time_to_wait) 
+        return
+
+    apply_advertisement(message, global_state, config_file_path)
+
+
+def enable_wait(global_state):
+    # Seconds left of the 5 after "enable" during which advertisements are ignored, 0 once over
+    if global_state['last_enable'] is None:
+        return 0
+    return max(5 - (global_state['clock']() - global_state['last_enable']), 0)
+
+
+def advertisement_received(global_state, sender):
+    # The sender is alive and has reported, whatever its advertisement brings
+    with global_state['routing_state'].write('neighbors'):
+        info = global_state['neighbors'][sender]
+        info['last_received'] = global_state['clock']()
+        # Once a neighbor sends hellos, only hellos keep it alive
+        hellos = info['dead_interval'] is not None
+    if global_state['liveness'] is not None and not hellos:
+        global_state['liveness'].arm(sender, NEIGHBOR_TIMEOUT)
+    note_report(global_state, sender)
+
+
+def start_workers(global_state, config_file_path):
+    if WORKERS <= 0:
+        global_state['workers'] = None
+        return
+    global_state['workers'] = WorkerPool(lambda message: handle_advertisement(message, global_state, config_file_path),
+                                         WORKERS, WORKER_QUEUE_SIZE, log=global_state['log'])
+
+
+def decode_advertisement(data):
+    return decode_ls_advertisement(data)
+
+
+def decode_received(data, global_state):
+    # Returns the advertisement, or None when it is dropped (async_node decodes through here too)
+    node_id = global_state['node_id']
+    metrics = global_state['metrics']
+    if metrics is not None:
+        metrics.count('routing_bytes_received_total', len(data))
+        start = time.perf_counter()
+    try:
+        message = decode_advertisement(data)
+    except ValueError:
+        global_state['log'].warning("[%s] Dropped a malformed message", node_id)
+        if metrics is not None:
+            metrics.count('routing_messages_dropped_total', reason='malformed')
+        return None
+    if metrics is not None:
+        metrics.observe('routing_decode_seconds', time.perf_counter() - start)
+    if message['sender'] not in global_state['neighbors']:
+        global_state['log'].warning("[%s] Dropped a message from %s, which is not a neighbor", node_id, message['sender'])
+        if metrics is not None:
+            metrics.count('routing_messages_dropped_total', reason='not_neighbor')
+        return None
+    if metrics is not None:
+        metrics.count('routing_messages_received_total', kind=message['type'])
+    return message
+
+
+def build_advertisement(global_state, neighbor_id):
+    # Send the neighbor only the rows changed since the table version it last acknowledged,
+    # or the whole table when it has acknowledged nothing yet or a periodic resync is due.
+    # The rows come from the published snapshot, so encoding never holds up the listener
+    routing_state = global_state['routing_state']
+    with routing_state.write('neighbors'):
+        global_state['neighbors'][neighbor_id]['sent_count'] += 1
+        info = dict(global_state['neighbors'][neighbor_id])
+        snapshot = routing_state.snapshot()
+
+    if info['acked_version'] == 0 or info['sent_count'] % FULL_SNAPSHOT_EVERY == 0:
+        kind = 'full'
+        rows = list(snapshot['cost'].keys())
+    else:
+        kind = 'delta'
+        # The neighbor's own row included: a copy of it that changed here goes back to the
+        # neighbor too, which keeps it only if it is newer than its own (see update_routing_table)
+        rows = [node for node, version in snapshot['row_versions'].items()
+                if version > info['acked_version']]
+
+    table = {'cost': {node: snapshot['cost'][node] for node in rows},
+             'time': {node: snapshot['time'][node] for node in rows}}
+    message = {"sender": global_state['node_id'], "type": kind,
+               "epoch": global_state['epoch'], "version": snapshot['table_version'],
+               "ack": info['received_version'], "ack_epoch": info['received_epoch'],
+               "table": table}
+    payload = encode_ls_advertisement(message)
+    metrics = global_state['metrics']
+    if metrics is not None:
+        metrics.count('routing_messages_sent_total', kind=kind)
+        metrics.count('routing_bytes_sent_total', len(payload))
+    return payload
+
+
+def apply_advertisement(message, global_state, config_file_path):
+    num_changes = merge_advertisement(message, global_state, config_file_path)
+    if num_changes > 0:
+        global_state['log'].debug("Update from %s: %d changes", message['sender'], num_changes)
+        note_change(global_state)
+
+
+def merge_advertisement(message, global_state, config_file_path):
+    # Takes the advertisement into the table, returns how many changes it brought
+    metrics = global_state['metrics']
+    if metrics is not None:
+        start = time.perf_counter()
+    with global_state['routing_state'].write('neighbors'):
+        info = global_state['neighbors'][message['sender']]
+        info['received_epoch'] = message['epoch']
+        info['received_version'] = message['version']
+        # An acknowledgement of an earlier run of this node (before a restart) counts as nothing received
+        info['acked_version'] = message['ack'] if message['ack_epoch'] == global_state['epoch'] else 0
+
+        num_changes = update_routing_table(message['table'], global_state, config_file_path)
+    if metrics is not None:
+        metrics.observe('routing_update_seconds', time.perf_counter() - start)
+    return num_changes
+
+
+def init_routing_table(node_id, neighbors, nodes=None, current_time=None):
     time_table = {}
 
-    # List of all nodes in the network
-    nodes = ['A', 'B', 'C']
-    current_time = time.time()
+    # Start with the nodes we know of, the rest are added as advertisements name them
+    if nodes is None:
+        nodes = [node_id] + [dest for dest in neighbors if dest != node_id]
+    if current_time is None:
+        current_time = time.time()
 
+    kind = COST_MATRIX
+    if kind == 'auto':
+        kind = 'sparse' if len(nodes) >= SPARSE_MATRIX_NODES else 'dense'
+    # Every entry starts as float('inf')
+    cost_table = make_cost_matrix(nodes, kind)
     for node in nodes:
-        cost_table[node] = {dest: float('inf') for dest in nodes}
         time_table[node] = None
         
     time_table[node_id] = current_time
@@ -87,24 +274,30 @@ def init_routing_table(node_id, neighbors):
     return table
 
 def format_print_for_dict(global_table):
-    nodes = sorted(global_table['cost'].keys())
-    max_width = max(len(str(item)) for row in global_table['cost'].values() for item in row.values()) + 1
+    cost_table = global_table['cost']
+    nodes = sorted(cost_table.keys())
+    # Each row is read once, instead of looking every cell up through the matrix
+    rows = {src: dict(cost_table[src].items()) for src in nodes}
+    max_width = max(max(map(len, map(str, row.values())), default=0) for row in rows.values()) + 1
     max_width = max(max_width, max(len(node) for node in nodes))
+    infinity = f"{'∞':>{max_width}}"
     
     # Header
-    header = "Source/Dest" + ''.join(f"{node:>{max_width}}" for node in nodes)
-    print(header)
+    lines = ["Source/Dest" + ''.join(f"{node:>{max_width}}" for node in nodes)]
     
     # Rows
     for src in nodes:
+        row = rows[src]
         row_data = [f"{src:>{max_width}}"]  # Align right
         for dest in nodes:
-            cost = global_table['cost'][src][dest]
+            cost = row.get(dest, float('inf'))
             if cost == float('inf'):
-                row_data.append(f"{'∞':>{max_width}}")
+                row_data.append(infinity)
             else:
                 row_data.append(f"{cost:>{max_width}.1f}")
-        print(''.join(row_data))
+        lines.append(''.join(row_data))
+    # One write, so tables printed by different workers do not interleave
+    print('\n'.join(lines))
 
 def update_routing_table(update_message, global_state,config_file_path):
     
@@ -118,59 +311,149 @@ def update_routing_table(update_message, global_state,config_file_path):
     
     change_count = 0
 
+    # Learn about nodes we have not heard of, from the rows and from the destinations they list
+    # Membership tests per key, a set difference would cost O(V) per row
+    known = local_costs.keys()
+    new_nodes = [node for node in recv_costs if node not in known]
+    for row in recv_costs.values():
+        new_nodes.extend(dest for dest in row if dest not in known)
+    if new_nodes:
+        add_nodes(global_state, new_nodes)
+        local_costs = global_table['cost']
+        change_count += 1
+
     for neighbor, recv_time in recv_times.items():
        
         # Skip if no update received from this neighbor
         if recv_time is None:
             continue
 
+        # Only this node stamps its own row; should a newer copy come back anyway (from a run of
+        # this node with a clock ahead), stamp the real row again so the network takes it back
+        if neighbor == node_id:
+            if recv_time > local_times[node_id]:
+                set_row_time(global_state, node_id, global_state['clock']())
+            continue
+
         # Check if received update is newer than the local timestamp for the neighbor
         if local_times[neighbor] is None or recv_time > local_times[neighbor]:
             
-            if recv_costs[neighbor][node_id]!= local_costs[node_id][neighbor] and local_times[neighbor] is not None:
-                print("only print after receive modify")
-                local_costs[node_id][neighbor] = recv_costs[neighbor][node_id]
-                local_times[node_id] = time.time()
-                apply_changes(node_id,neighbor,recv_costs[neighbor][node_id],config_file_path)
-                print("differences in changes nodes")
+            # Received rows may list only the links, a node they leave out is unreachable.
+            # inf is the neighbor taking this node for down, not a new cost, and a neighbor this
+            # node takes for down gets its link back from its hellos, not from its row
+            recv_cost = recv_costs[neighbor].get(node_id, float('inf'))
+            info = global_state['neighbors'].get(neighbor)
+            if (recv_cost != local_costs[node_id][neighbor] and local_times[neighbor] is not None
+                    and recv_cost != float('inf') and (info is None or info['active'])):
+                set_link_cost(global_state, node_id, neighbor, recv_cost)
+                set_row_time(global_state, node_id, global_state['clock']())
+                global_state['config_writer'].set_cost(neighbor, recv_cost)
+                global_state['log'].debug("%s changed the cost of its link to this node to %s", neighbor, recv_cost)
                 change_count+=1
 
             
-            if local_costs[neighbor] != recv_costs[neighbor] and local_times[neighbor] is not None:
+            # A row heard of for the first time counts too, the routes may go through it
+            if local_costs[neighbor] != recv_costs[neighbor]:
         
-                print(f"differences in {neighbor}")
+                global_state['log'].debug("Row of %s changed", neighbor)
                 change_count += 1 
 
-            local_times[neighbor] = recv_time
-            local_costs[neighbor] = recv_costs[neighbor]
-                
-    format_print_for_dict(global_table)
-    
+            set_row_time(global_state, neighbor, recv_time)
+            set_cost_row(global_state, neighbor, recv_costs[neighbor])
+
     return change_count
 
 
+def add_nodes(global_state, nodes):
+    global_table = global_state['global_table']
+    cost_table = global_table['cost']
+    for node in nodes:
+        if node not in cost_table:
+            cost_table.add_node(node)
+            global_table['time'][node] = None
+    # The shortest path tree is rebuilt so it covers the new nodes
+    global_state['rebuild_spt'] = True
+    global_state['pending_edges'] = []
+    if COST_MATRIX == 'auto' and isinstance(cost_table, DenseCostMatrix) and len(cost_table) >= SPARSE_MATRIX_NODES:
+        global_table['cost'] = convert_cost_matrix(cost_table, 'sparse')
+    global_state['routing_state'].mark_changed('cost', 'time')
+
+
+def format_path(path):
+    # Single-character IDs print as "ABC" like before, longer ones need a separator
+    if all(len(node) == 1 for node in path):
+        return ''.join(path)
+    return '-'.join(path)
+
+
+# The helpers below are the only writers of the table. Each marks the parts of the shared routing
+# state it changed (SharedState.mark_changed), so a write block publishes just those: an
+# advertisement that changes nothing copies nothing
+
+def mark_row_changed(global_state, node):
+    # Each change gets a new table version, deltas carry the rows changed after a given version
+    global_table = global_state['global_table']
+    global_table['table_version'] += 1
+    global_table['row_versions'][node] = global_table['table_version']
+    global_state['routing_state'].mark_changed('row_versions', 'table_version')
+
+
+def set_row_time(global_state, node, timestamp):
+    global_state['global_table']['time'][node] = timestamp
+    global_state['routing_state'].mark_changed('time')
+    mark_row_changed(global_state, node)
+
+
+def record_edge_change(global_state, src, dest, cost):
+    # Remember changed links so the next calculation can repair the tree instead of rebuilding it
+    if global_state['rebuild_spt']:
+        return
+    if len(global_state['pending_edges']) >= INCREMENTAL_EDGE_LIMIT:
+        global_state['rebuild_spt'] = True
+        global_state['pending_edges'] = []
+        return
+    global_state['pending_edges'].append((src, dest, cost))
+
+
+def set_link_cost(global_state, src, dest, cost):
+    cost_table = global_state['global_table']['cost']
+    if cost_table[src][dest] != cost:
+        cost_table[src][dest] = cost
+        global_state['routing_state'].mark_changed('cost')
+        record_edge_change(global_state, src, dest, cost)
+        mark_row_changed(global_state, src)
+
+
+def set_cost_row(global_state, src, row):
+    cost_table = global_state['global_table']['cost']
+    old_row = cost_table.get(src, {})
+    changed = False
+    for dest, cost in row.items():
+        if old_row.get(dest, float('inf')) != cost:
+            record_edge_change(global_state, src, dest, cost)
+            changed = True
+    for dest, cost in old_row.items():
+        if dest not in row and cost != float('inf'):
+            record_edge_change(global_state, src, dest, float('inf'))
+            changed = True
+    # An unchanged row is left as it is, so the matrix keeps sharing it with the snapshot
+    if changed:
+        cost_table[src] = row
+        global_state['routing_state'].mark_changed('cost')
+
+
 def send_updates(global_state):
     while not shut_signal.is_set():
-        if not global_state['active']:
-            time.sleep(1)
-            continue
+        if not wait_until_active(global_state, shut_signal):
+            break
     
-        table = global_state['global_table']
         neighbors = global_state['neighbors']
         
-        message =  {"sender":global_state['node_id'], "table":table }
-        message = json.dumps(message)
-        
         for neighbor_id, info in neighbors.items():
-            try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.connect(('localhost', info['port_id']))
-                    s.sendall(message.encode('utf-8'))
-            except socket.error as e:
-                #print(f"Error sending cost table to neighbor {neighbor_id}: {e}")
-                pass
+            # Unreachable neighbors are retried by the pool with backoff (port_id never changes)
+            global_state['transport'].send(info['port_id'], build_advertisement(global_state, neighbor_id))
                 
-        time.sleep(10)
+        shut_signal.wait(SEND_INTERVAL)
 
 def reconstruct_path(source, destination, predecessors):
     current_node = destination
@@ -186,48 +469,57 @@ def routing_calculation_thread(global_state, calculation_signal):
     while not shut_signal.is_set():
         calculation_signal.wait()  # Wait for a signal to start calculation
         calculation_signal.clear()  # Reset signal after waking up
+        # stop_node wakes this thread up to notice the shutdown
+        if shut_signal.is_set():
+            break
         
-        print("Performing routing calculations...")
-    
-        dijkstra(global_state)
-        
-        format_print_for_dict(global_state['global_table'])
+        recalculate_routes(global_state)
 
-def dijkstra(global_state):
-    # Retrieve the cost table from the global state
-    cost_table = global_state['global_table']['cost']
+
+def recalculate_routes(global_state):
+    # The routes themselves are only printed by the "routing table" command: a table per
+    # calculation is more than a terminal keeps up with in a large network
     node_id = global_state['node_id']
-    
-    # Initialize distances: Set the distance to all nodes as infinity, except for the start node
-    distances = {node: float('inf') for node in cost_table}
-    distances[node_id] = 0
+    _, distances, _ = calculate_routes(global_state)
+    reachable = sum(1 for dest, distance in distances.items() if dest != node_id and distance != float('inf'))
+    global_state['log'].info("[%s] Routes calculated: %d of %d nodes reachable", node_id, reachable, len(distances) - 1)
+
+def calculate_routes(global_state):
+    # The calculation without the printing, returns the table it ran on and its results
+    routing_state = global_state['routing_state']
+    node_id = global_state['node_id']
+
+    # The shortest path tree belongs to the calculation, the CLI can run one as well
+    with global_state['calculation_lock']:
+        # Take the published table and the link changes made up to it together; the
+        # calculation itself runs on the snapshot without holding up the writers
+        with routing_state.write():
+            cost_table = routing_state.snapshot()['cost']
+            pending, global_state['pending_edges'] = global_state['pending_edges'], []
+            rebuild, global_state['rebuild_spt'] = global_state['rebuild_spt'], False
+
+        # Repair the previous shortest path tree when only a few links changed, otherwise rebuild it
+        start = time.perf_counter()
+        if global_state['spf_mode'] == 'incremental' and not rebuild and global_state['spt'] is not None:
+            for src, dest, cost in pending:
+                update_edge(global_state['spt'], src, dest, cost)
+        else:
+            global_state['spt'] = build_spt(cost_table, node_id)
+        if global_state['metrics'] is not None:
+            global_state['metrics'].observe('routing_spf_seconds', time.perf_counter() - start)
+
+        spt = global_state['spt']
+        distances, predecessors = dict(spt['distances']), dict(spt['predecessors'])
 
-    # Initialize predecessors: Used to reconstruct the shortest path
-    predecessors = {node: None for node in cost_table}
-    
-    # Nodes to visit
-    unvisited = set(cost_table.keys())
-    
-    current_node = node_id
-    while unvisited:
-        # Find the unvisited node with the smallest distance
-        current_node = min(unvisited, key=lambda node: distances[node])
-        unvisited.remove(current_node)
-        
-        # Consider all neighbors of the current node
-        for neighbor, cost in cost_table[current_node].items():
-            if neighbor in unvisited:
-                new_cost = distances[current_node] + cost
-                if new_cost < distances[neighbor]:
-                    distances[neighbor] = round(new_cost,3)
-                    predecessors[neighbor] = current_node
-
-        if distances[current_node] == float('inf'):
-            break  # Remaining nodes are unreachable from start node
-    
     # Update the global state with the shortest distances and paths
     global_state['shortest_distances'] = distances
     global_state['predecessors'] = predecessors
+    return cost_table, distances, predecessors
+
+
+def dijkstra(global_state):
+    node_id = global_state['node_id']
+    cost_table, distances, predecessors = calculate_routes(global_state)
 
     print(f"Shortest paths from node {node_id}:")
     for dest in cost_table.keys():
@@ -236,151 +528,307 @@ def dijkstra(global_state):
                 print(f"Node {node_id} to node {dest}: Unreachable")
             else:
                 path = reconstruct_path(node_id, dest, predecessors)
-                print(f"Node {node_id} to node {dest}: Distance = {distances[dest]}, Path = {''.join(path)}")
+                print(f"Node {node_id} to node {dest}: Distance = {distances[dest]}, Path = {format_path(path)}")
     
 
-def apply_changes(node_id,other_node,new_cost,config_file_path):
-    # Read the contents of the file
-    with open(config_file_path, 'r') as file:
-        lines = file.readlines()
-
-    # Update the cost for the specified neighbor
-    with open(config_file_path, 'w') as file:
-        for line in lines:
-            parts = line.split()
-            if parts[0] == other_node:
-                # Replace the cost with the new cost, maintaining other data unchanged
-                parts[1] = str(new_cost)
-                updated_line = ' '.join(parts) + '\n'
-                file.write(updated_line)
-            else:
-                file.write(line)
-
 def update_link_cost(node_id, other_node, new_cost, global_state,config_file_path):
-    cost_table = global_state['global_table']['cost']
-    time_table = global_state['global_table']['time']
-    
-    cost_table[node_id][other_node] = new_cost
-    time_table[node_id] = time.time()
-    apply_changes(node_id,other_node,new_cost,config_file_path)
+    with global_state['routing_state'].write():
+        set_link_cost(global_state, node_id, other_node, new_cost)
+        set_row_time(global_state, node_id, global_state['clock']())
+    note_change(global_state)
+    # Saved to the config file in the background
+    global_state['config_writer'].set_cost(other_node, new_cost)
 
 
 def monitor_convergence(global_state, calculation_signal):
+    # Signal a calculation whenever the convergence detector says the table has settled
     while not shut_signal.is_set():
-        update = global_state['update']
-
-        if update:
-            print("Convergence waiting!")
-            print(f"Update: Node {global_state['node_id']} is gathering information. Waiting for 20 seconds before executing the routing algorithm.")
-            time.sleep(20)
-            calculation_signal.set()  # Signal that convergence time has been reached
-        
-            global_state['update'] = False
-
-        time.sleep(1)  # Check periodically, adjust as needed
+        reason = wait_for_convergence(global_state, shut_signal)
+        if reason is None:
+            break
+        global_state['log'].info("Convergence detected (%s), executing routing algorithm", reason)
+        calculation_signal.set()
 
 
 def command_line_interface(global_state, config_file_path, server_socket):
     while not shut_signal.is_set():
-        node_id = global_state['node_id']
         cmd = input()
-        if cmd == "config":
-            neighbors = load_config(config_file_path)
-            for neighbor, info in neighbors.items():
-                print(f"{neighbor} {info['distance']} {info['port_id']}")
-
-        elif cmd == "routing table":
-            print("from terminal")
-            dijkstra(global_state)
-
-        elif re.match(r"^change [A-J] [A-J] \d+(\.\d+)?$", cmd):
-            print("change detected!")
-            _, src, des, cost_str = cmd.split(" ")
-            new_cost = float(cost_str)
-            cost_table = global_state['global_table']['cost']
-            
-            # Check if either source or destination matches the current node ID
-            if src != node_id and des != node_id:
-                print(f"Node {node_id} cannot change the link {src}-{des} as it is not associated with either node.")
-                return
-
-            # Determine if the link exists and is not infinite
-            other_node = src if src != node_id else des
-            if cost_table[node_id][other_node] != float('inf'):
-                print(f"Updating cost for link {src}-{des} from {cost_table[node_id][other_node]} to {new_cost}.")
-                update_link_cost(node_id, other_node, new_cost, global_state,config_file_path)
-            else:
-                print(f"Link {src}-{des} does not exist.")
-            
-        elif cmd == "disable":
-            global_state['active'] = False
-            print(f"[{node_id}] is disabled")
-
-        elif cmd == "enable":
-            current_time = time.time()
-            global_state['global_table']['time'][node_id] = current_time
-            global_state['last_enable'] = current_time
-            neighbors = global_state['neighbors']
-            for neighbor_id, info in neighbors.items():
-                global_state['neighbors'][neighbor_id]['last_received'] = current_time
+        # Only the threaded node can be shut down, run_command is shared with async_node
+        if cmd == "shutdown":
+            stop_node(global_state)
+            global_state['log'].info("[%s] is shutting down", global_state['node_id'])
+        else:
+            run_command(cmd, global_state, config_file_path)
+
+
+def stop_node(global_state):
+    # The threads notice the shutdown signal by themselves (the calculation thread once woken up),
+    # the timers, hellos, workers and sockets are closed here
+    request_shutdown(global_state, shut_signal)
+    calculation_signal.set()
+    stop_stats_server(global_state)
+    if global_state['liveness'] is not None:
+        global_state['liveness'].close()
+    if global_state['heartbeat'] is not None:
+        global_state['heartbeat'].close()
+    if global_state['workers'] is not None:
+        global_state['workers'].close()
+    global_state['datagrams'].close()
+    global_state['pool'].close()
+    global_state['config_writer'].close()
+
+
+def run_command(cmd, global_state, config_file_path):
+    node_id = global_state['node_id']
+    if cmd == "config":
+        neighbors = load_config(config_file_path)
+        for neighbor, info in neighbors.items():
+            print(f"{neighbor} {info['distance']} {info['port_id']}")
 
-            global_state['active'] = True
-            print(f"[{node_id}] is enabled")
+    elif cmd == "routing table":
+        dijkstra(global_state)
+        format_print_for_dict(global_state['routing_state'].snapshot())
 
-        
+    elif cmd.startswith("log "):
+        level = cmd[len("log "):]
+        if set_level(global_state['log'], level):
+            print(f"[{node_id}] log level: {level}")
         else:
-            print("Can't recognise your command, check Readme.txt, and make sure you type your command right.\n")
+            print(f"Log levels: {', '.join(LEVELS)}")
 
+    elif cmd == "convergence":
+        print(format_convergence_metrics(convergence_metrics(global_state)))
 
-def check_neighbors_alive(global_state):
-    while not shut_signal.is_set():
+    elif cmd == "stats":
+        print(format_stats(global_state))
 
-        if not global_state['active']:
-            time.sleep(1)
-            continue
+    elif cmd == "workers":
+        if global_state.get('workers') is None:
+            print("Advertisements are handled by the listener itself")
+        else:
+            print(format_worker_metrics(global_state['workers'].metrics()))
 
-        current_time = time.time()
-        node_id = global_state['node_id']
-        neighbors = global_state['neighbors']
-        timeout_neighbors = [neighbour_id for neighbour_id, info in neighbors.items() if current_time - info['last_received'] > 15]
-        print(f"timeout_neighbours: {timeout_neighbors}")
-        for neighbor_id in timeout_neighbors:
-            if neighbors[neighbor_id]['active']:
-                neighbors[neighbor_id]['active'] = False
-                print(f"Haven't received message from neighbor {neighbor_id}, consider it down.\n")
-                global_state['global_table']['cost'][node_id][neighbor_id] = float('inf')
-
-                for node in global_state['global_table']['cost'][neighbor_id].keys():
-                    global_state['global_table']['cost'][neighbor_id][node] = float('inf')
-                   
-                global_state['global_table']['time'][node_id] = current_time
-                global_state['global_table']['time'][neighbor_id] = current_time
+    elif re.match(r"^change \S+ \S+ \d+(\.\d+)?$", cmd):
+        print("change detected!")
+        _, src, des, cost_str = cmd.split(" ")
+        new_cost = float(cost_str)
+        cost_table = global_state['routing_state'].snapshot()['cost']
         
-        time.sleep(5)
+        # Check if either source or destination matches the current node ID
+        if src != node_id and des != node_id:
+            print(f"Node {node_id} cannot change the link {src}-{des} as it is not associated with either node.")
+            return
+
+        # Determine if the link exists and is not infinite
+        other_node = src if src != node_id else des
+        if cost_table[node_id].get(other_node, float('inf')) != float('inf'):
+            print(f"Updating cost for link {src}-{des} from {cost_table[node_id][other_node]} to {new_cost}.")
+            update_link_cost(node_id, other_node, new_cost, global_state,config_file_path)
+        else:
+            print(f"Link {src}-{des} does not exist.")
+        
+    elif cmd in ("spf full", "spf incremental"):
+        with global_state['routing_state'].write():
+            global_state['spf_mode'] = cmd.split(" ")[1]
+            global_state['rebuild_spt'] = True
+        print(f"[{node_id}] shortest path calculation mode: {global_state['spf_mode']}")
+
+    elif cmd == "disable":
+        set_active(global_state, False)
+        print(f"[{node_id}] is disabled")
+
+    elif cmd == "enable":
+        current_time = global_state['clock']()
+        with global_state['routing_state'].write('neighbors'):
+            set_row_time(global_state, node_id, current_time)
+            global_state['last_enable'] = current_time
+            neighbors = global_state['neighbors']
+            for neighbor_id, info in neighbors.items():
+                global_state['neighbors'][neighbor_id]['last_received'] = current_time
+                # Neighbors were not heard from while disabled, restart their timeouts from now
+                if global_state['liveness'] is not None:
+                    global_state['liveness'].arm(neighbor_id, neighbor_timeout(info))
 
+        set_active(global_state, True)
+        print(f"[{node_id}] is enabled")
 
-def start_server(node_id, port_id, config_file_path):
+    
+    else:
+        print("Can't recognise your command, check Readme.txt, and make sure you type your command right.\n")
+
+
+def start_liveness(global_state):
+    # One deadline per neighbor on a timer wheel, rearmed by every advertisement received from it,
+    # so a silent neighbor is taken down within a tick of its timeout instead of on the next scan
+    global_state['liveness'] = TimerWheel(lambda neighbor_id: neighbor_timed_out(global_state, neighbor_id),
+                                          log=global_state['log'])
+    current_time = global_state['clock']()
+    with global_state['routing_state'].write('neighbors'):
+        for neighbor_id, info in global_state['neighbors'].items():
+            remaining = neighbor_timeout(info) - (current_time - info['last_received'])
+            global_state['liveness'].arm(neighbor_id, max(remaining, 0))
+
+
+def neighbor_timeout(info):
+    return info['dead_interval'] if info['dead_interval'] is not None else NEIGHBOR_TIMEOUT
+
+
+def start_transport(global_state, port_id, config_file_path):
+    # The UDP socket carries the hellos, and the advertisements too with TRANSPORT = 'udp'
+    global_state['pool'] = ConnectionPool()
+    global_state['datagrams'] = DatagramSocket(port_id, log=global_state['log'])
+    if TRANSPORT == 'udp':
+        global_state['datagrams'].on(CHANNEL_ROUTING, lambda data: receive_datagram_advertisement(data, global_state, config_file_path))
+        global_state['transport'] = global_state['datagrams']
+    else:
+        global_state['transport'] = global_state['pool']
+
+
+def start_heartbeat(global_state):
+    if HELLO_INTERVAL <= 0:
+        global_state['heartbeat'] = None
+        return
+    peers = {neighbor_id: info['port_id'] for neighbor_id, info in global_state['neighbors'].items()}
+    global_state['heartbeat'] = Heartbeat(global_state['node_id'], global_state['datagrams'], peers,
+                                          lambda neighbor_id, dead_interval: hello_received(global_state, neighbor_id, dead_interval),
+                                          lambda: global_state['active'], HELLO_INTERVAL, DEAD_MULTIPLIER)
+
+
+def hello_received(global_state, neighbor_id, dead_interval):
+    with global_state['routing_state'].write('neighbors'):
+        info = global_state['neighbors'][neighbor_id]
+        info['last_received'] = global_state['clock']()
+        info['dead_interval'] = dead_interval
+        came_back = not info['active']
+    if global_state['liveness'] is not None:
+        global_state['liveness'].arm(neighbor_id, dead_interval)
+    if came_back:
+        mark_neighbor_up(global_state, neighbor_id)
+
+
+def neighbor_timed_out(global_state, neighbor_id):
+    # While disabled nothing is received; the enable command rearms every neighbor
+    if not global_state['active']:
+        return
+    mark_neighbor_down(global_state, neighbor_id, global_state['clock']())
+
+
+def check_timeouts(global_state):
+    # Scan of every neighbor, for runtimes without a timer wheel (async_node)
+    current_time = global_state['clock']()
+    neighbors = global_state['neighbors']
+    with global_state['routing_state'].write('neighbors'):
+        timeout_neighbors = [neighbour_id for neighbour_id, info in neighbors.items() if current_time - info['last_received'] > NEIGHBOR_TIMEOUT]
+        global_state['log'].debug("timeout_neighbours: %s", timeout_neighbors)
+        for neighbor_id in timeout_neighbors:
+            mark_neighbor_down(global_state, neighbor_id, current_time)
+
+
+def mark_neighbor_down(global_state, neighbor_id, current_time):
+    node_id = global_state['node_id']
+    neighbors = global_state['neighbors']
+    with global_state['routing_state'].write('neighbors'):
+        if not neighbors[neighbor_id]['active']:
+            return
+        neighbors[neighbor_id]['active'] = False
+        global_state['log'].warning("Haven't received message from neighbor %s, consider it down.", neighbor_id)
+        if global_state['metrics'] is not None:
+            global_state['metrics'].count('routing_neighbor_flaps_total', neighbor=neighbor_id, state='down')
+        # Restored from here if the neighbor turns out to be alive after all
+        neighbors[neighbor_id]['link_cost'] = global_state['global_table']['cost'][node_id][neighbor_id]
+        # Only this node's own link goes down. The neighbor's row is its own to change: a copy of
+        # it stamped here would look newer than the real one, everywhere, until the neighbor
+        # changed its row again. A node nobody can reach any more is unreachable without it
+        set_link_cost(global_state, node_id, neighbor_id, float('inf'))
+        set_row_time(global_state, node_id, current_time)
+        note_change(global_state)
+
+
+def mark_neighbor_up(global_state, neighbor_id):
+    # A neighbor considered down sends hellos again (re-enabled, or hellos were lost for a while).
+    # The link gets the cost the neighbor's row gives it, which is newer than the one saved at the
+    # down if the neighbor changed it meanwhile
+    node_id = global_state['node_id']
+    neighbors = global_state['neighbors']
+    with global_state['routing_state'].write('neighbors'):
+        if neighbors[neighbor_id]['active']:
+            return
+        neighbors[neighbor_id]['active'] = True
+        global_state['log'].info("Neighbor %s is up again.", neighbor_id)
+        if global_state['metrics'] is not None:
+            global_state['metrics'].count('routing_neighbor_flaps_total', neighbor=neighbor_id, state='up')
+        link_cost = global_state['global_table']['cost'][neighbor_id].get(node_id, float('inf'))
+        if link_cost == float('inf'):
+            link_cost = neighbors[neighbor_id]['link_cost']
+        set_link_cost(global_state, node_id, neighbor_id, link_cost)
+        set_row_time(global_state, node_id, global_state['clock']())
+        note_change(global_state)
+
+
+def init_global_state(node_id, config_file_path, nodes=None, clock=None):
+    # clock: the time for row stamps and for the convergence detector; the emulator passes a
+    # virtual one, a real node uses time.time and time.monotonic
     global_state = {}
-    neighbors = load_config(config_file_path)
-    global_table = init_routing_table(node_id, neighbors)
+    global_state['clock'] = clock or time.time
+    neighbors = load_config(config_file_path, global_state['clock']())
+    global_table = init_routing_table(node_id, neighbors, nodes, global_state['clock']())
+    # Versioning for delta advertisements; the epoch tells acknowledgements from before a restart apart
+    global_table['row_versions'] = {}
+    global_table['table_version'] = 0
+    global_table['neighbors'] = neighbors
+    # The table, the neighbors and the versions are only changed inside routing_state.write(),
+    # one writer at a time; threads that just read them use routing_state.snapshot().
+    # global_state['global_table'] and ['neighbors'] are the live parts, for writers
+    routing_state = SharedState(global_table, copiers={'table_version': int})
+    global_state['routing_state'] = routing_state
+    # Timer wheel of neighbor deadlines, started after the first calculation
+    global_state['liveness'] = None
+    # Hellos to the neighbors, started with the server
+    global_state['heartbeat'] = None
     global_state['node_id'] = node_id
     global_state['global_table'] = global_table
     global_state['neighbors'] = neighbors
-    global_state['active'] = True
+    global_state['log'] = node_logger(node_id, LOG_LEVEL)
+    global_state['config_writer'] = ConfigWriter(config_file_path, log=global_state['log'])
+    init_activity(global_state)
+    # Before the convergence detector, which reports its waits to the metrics
+    init_metrics(global_state, node_id, METRICS)
+    init_convergence(global_state, neighbors, clock=clock or time.monotonic)
     global_state['last_enable'] = None
-    global_state['update'] = False
-    
+    global_state['spf_mode'] = SPF_MODE
+    # Owned by the calculation: the tree, and the lock that keeps two calculations apart.
+    # Writers only queue link changes for it or ask for a rebuild
+    global_state['spt'] = None
+    global_state['calculation_lock'] = threading.Lock()
+    global_state['pending_edges'] = []
+    global_state['rebuild_spt'] = True
+    global_state['epoch'] = global_state['clock']()
+    with routing_state.write('neighbors'):
+        mark_row_changed(global_state, node_id)
+        for info in neighbors.values():
+            info.update({'sent_count': 0, 'acked_version': 0, 'received_version': 0, 'received_epoch': None})
+    return global_state
+
+
+def start_server(node_id, port_id, config_file_path):
+    global_state = init_global_state(node_id, config_file_path)
+    start_workers(global_state, config_file_path)
 
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Long-lived neighbor streams leave TIME_WAIT entries behind, so allow quick restarts on the same port
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server_socket.bind(('localhost', port_id))
     server_socket.listen()
+    start_transport(global_state, port_id, config_file_path)
+    start_heartbeat(global_state)
+    if STATS_PORT_OFFSET:
+        start_stats_server(global_state, port_id + STATS_PORT_OFFSET)
 
     listening_thread = threading.Thread(target=listening_to_neighbors, args=(port_id, server_socket, global_state, config_file_path,calculation_signal))
     sending_thread = threading.Thread(target= send_updates, args=(global_state,))
     routing_calc_thread = threading.Thread(target=routing_calculation_thread, args=(global_state, calculation_signal))
     cli_thread = threading.Thread(target=command_line_interface, args=(global_state, config_file_path, server_socket))
     convergence_thread = threading.Thread(target=monitor_convergence, args=(global_state,calculation_signal))
-    check_thread = threading.Thread(target=check_neighbors_alive, args=(global_state,))
 
     listening_thread.start()
     sending_thread.start()
@@ -388,13 +836,10 @@ def start_server(node_id, port_id, config_file_path):
     cli_thread.start()
     convergence_thread.start()
 
-    # Wait for 60 seconds to gather sufficient information
-    print(f"Initialise: Node {node_id} is gathering information. Waiting for 20 seconds before executing the routing algorithm.")
-    time.sleep(60)
-    print("executing routing algorithm")
-    calculation_signal.set()  # Signal to calculate shortest path
-    
-    check_thread.start()
+    # The first calculation runs as soon as every neighbor has reported, liveness checks start after it
+    global_state['log'].info("Initialise: Node %s is gathering information. Waiting for its neighbors before executing the routing algorithm.", node_id)
+    if wait_for_first_calculation(global_state, shut_signal):
+        start_liveness(global_state)
     cli_thread.join()
 
 
@@ -0,0 +1,195 @@
+import asyncio
+import sys
+import time
+
+import Routing
+from convergence import (INITIAL_TIMEOUT, MAX_HOLD_DOWN, QUIET_PERIOD, init_convergence, next_calculation,
+                         take_due_calculation)
+from transport import HEADER
+
+# Same timings as the threaded node in Routing.py
+SEND_INTERVAL = 10
+LIVENESS_INTERVAL = 5
+CONNECT_TIMEOUT = 2.0
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 10.0
+
+
+class AsyncNode:
+    # A Routing.py node run as tasks on a shared event loop, so one process can host many nodes.
+    # The routing logic itself (tables, dijkstra, CLI commands) is the one from Routing.py.
+    def __init__(self, node_id, port_id, config_file_path, nodes=None, send_interval=SEND_INTERVAL,
+                 quiet_period=QUIET_PERIOD, max_hold_down=MAX_HOLD_DOWN, initial_timeout=INITIAL_TIMEOUT,
+                 liveness_interval=LIVENESS_INTERVAL):
+        self.node_id = node_id
+        self.port_id = port_id
+        self.config_file_path = config_file_path
+        self.global_state = Routing.init_global_state(node_id, config_file_path, nodes)
+        init_convergence(self.global_state, self.global_state['neighbors'], quiet_period, max_hold_down, initial_timeout)
+        self.send_interval = send_interval
+        self.liveness_interval = liveness_interval
+
+        self.enabled = asyncio.Event()
+        self.enabled.set()
+        self.server = None
+        self.tasks = []
+        self.streams = set()
+        self.writers = {}
+        self.backoff = {}
+        self.retry_at = {}
+        self.calculation_timer = None
+        self.calculation_deadline = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_stream, 'localhost', self.port_id, reuse_address=True)
+        log = self.global_state['log']
+        log.info("[%s] Node is listening on port %s", self.node_id, self.port_id)
+        log.info("Initialise: Node %s is gathering information. Waiting for its neighbors before executing the routing algorithm.", self.node_id)
+        self.schedule_calculation()
+        self.tasks = [asyncio.create_task(self.send_loop()), asyncio.create_task(self.liveness_loop())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.calculation_timer is not None:
+            self.calculation_timer.cancel()
+        for writer in list(self.writers.values()) + list(self.streams):
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # Writes the pending cost changes now, not when the whole process exits
+        self.global_state['config_writer'].close()
+
+    async def handle_stream(self, reader, writer):
+        self.streams.add(writer)
+        try:
+            while True:
+                (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                data = await reader.readexactly(length)
+                # Like the threaded listener, a disabled node leaves messages unread until re-enabled
+                await self.enabled.wait()
+                self.handle_message(data)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.streams.discard(writer)
+            writer.close()
+
+    def handle_message(self, data):
+        global_state = self.global_state
+        message = Routing.decode_received(data, global_state)
+        if message is None:
+            return
+        Routing.advertisement_received(global_state, message['sender'])
+
+        # Messages right after "enable" are dropped, the threaded node sleeps through them
+        if Routing.enable_wait(global_state) > 0:
+            return
+
+        Routing.apply_advertisement(message, global_state, self.config_file_path)
+        self.schedule_calculation()
+
+    def schedule_calculation(self):
+        # Keep one timer armed for the convergence detector's next deadline
+        deadline, _ = next_calculation(self.global_state['convergence'])
+        if deadline == self.calculation_deadline:
+            return
+        if self.calculation_timer is not None:
+            self.calculation_timer.cancel()
+            self.calculation_timer = None
+        self.calculation_deadline = deadline
+        if deadline is not None:
+            loop = asyncio.get_running_loop()
+            self.calculation_timer = loop.call_later(max(deadline - time.monotonic(), 0), self.calculate)
+
+    def calculate(self):
+        self.calculation_timer = self.calculation_deadline = None
+        reason = take_due_calculation(self.global_state)
+        if reason is not None:
+            self.global_state['log'].info("Convergence detected (%s), performing routing calculations...", reason)
+            Routing.recalculate_routes(self.global_state)
+        self.schedule_calculation()
+
+    async def send(self, port, payload):
+        writer = self.writers.get(port)
+        if writer is None:
+            if time.monotonic() < self.retry_at.get(port, 0):
+                return
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection('localhost', port), CONNECT_TIMEOUT)
+            except (OSError, asyncio.TimeoutError):
+                backoff = min(self.backoff.get(port, MIN_BACKOFF / 2) * 2, MAX_BACKOFF)
+                self.backoff[port] = backoff
+                self.retry_at[port] = time.monotonic() + backoff
+                return
+            self.writers[port] = writer
+            self.backoff.pop(port, None)
+
+        try:
+            writer.write(HEADER.pack(len(payload)))
+            writer.write(payload)
+            await writer.drain()
+        except OSError:
+            # Reconnect on the next round
+            self.writers.pop(port, None)
+            writer.close()
+
+    async def send_loop(self):
+        while True:
+            await self.enabled.wait()
+            neighbors = self.global_state['neighbors']
+            await asyncio.gather(*(self.send(info['port_id'], Routing.build_advertisement(self.global_state, neighbor_id))
+                                   for neighbor_id, info in neighbors.items()))
+            await asyncio.sleep(self.send_interval)
+
+    async def liveness_loop(self):
+        while True:
+            await asyncio.sleep(self.liveness_interval)
+            await self.enabled.wait()
+            # Like the threaded node, neighbors are only checked once the first routes are computed
+            if self.global_state['convergence']['calculated']:
+                Routing.check_timeouts(self.global_state)
+                self.schedule_calculation()
+
+    def run_command(self, cmd):
+        Routing.run_command(cmd, self.global_state, self.config_file_path)
+        self.schedule_calculation()
+        if self.global_state['active']:
+            self.enabled.set()
+        else:
+            self.enabled.clear()
+
+
+async def read_commands(node):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        node.run_command(line.decode('utf-8').rstrip('\n'))
+
+
+async def main(node_id, port_id, config_file_path):
+    node = AsyncNode(node_id, port_id, config_file_path)
+    await node.start()
+    try:
+        await read_commands(node)
+        # stdin closed: keep routing until interrupted, like the threaded node
+        await asyncio.Event().wait()
+    finally:
+        await node.stop()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: python3 async_node.py <Node ID> <Port ID> <Config File Path>")
+        sys.exit(1)
+
+    try:
+        asyncio.run(main(sys.argv[1], int(sys.argv[2]), sys.argv[3]))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,80 @@
+# Host many asyncio nodes in one process and report CPU and memory per node.
+# Usage (from the repository root): python3 -m benchmarks.bench_async_nodes [node counts...]
+import asyncio
+import contextlib
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from async_node import SEND_INTERVAL, AsyncNode
+from graph_generator import generate, node_names, write_configs
+
+BASE_PORT = 21000
+WINDOW = 30
+EXTRA_DEGREE = 2
+
+
+def write_topology(directory, num_nodes, seed=3221):
+    # graph_generator's ring model: a ring plus EXTRA_DEGREE links per node on average
+    nodes = node_names(num_nodes)
+    write_configs(directory, generate('ring', num_nodes, 2 + EXTRA_DEGREE, seed), nodes, BASE_PORT)
+    return nodes
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def host(num_nodes, directory):
+    node_ids = write_topology(directory, num_nodes)
+    base_rss = rss_mb()
+    nodes = [AsyncNode(node_id, BASE_PORT + i, os.path.join(directory, f"{node_id}config.txt"),
+                       send_interval=SEND_INTERVAL, initial_timeout=5, liveness_interval=5)
+             for i, node_id in enumerate(node_ids)]
+    for node in nodes:
+        await node.start()
+
+    start_cpu, start_wall = cpu_seconds(), time.perf_counter()
+    await asyncio.sleep(WINDOW)
+    cpu, wall = cpu_seconds() - start_cpu, time.perf_counter() - start_wall
+    memory = rss_mb() - base_rss
+    # Nodes start out knowing only their neighbors and learn the rest from advertisements
+    calculated = sum(len(node.global_state.get('shortest_distances', ())) == num_nodes for node in nodes)
+
+    for node in nodes:
+        await node.stop()
+    return cpu, wall, memory, calculated
+
+
+def run_one(num_nodes):
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            cpu, wall, memory, calculated = asyncio.run(host(num_nodes, directory))
+    print(f"{num_nodes:>5} nodes | CPU {cpu / wall * 100:6.1f}% of one core ({cpu / wall / num_nodes * 1000:6.2f} ms/s per node)"
+          f" | RSS +{memory:8.1f} MB ({memory * 1024 / num_nodes:8.1f} KB per node) | {calculated}/{num_nodes} computed routes to all nodes")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--one':
+        run_one(int(sys.argv[2]))
+        sys.exit(0)
+
+    # Each size runs in a fresh interpreter so memory figures do not accumulate
+    sizes = sys.argv[1:] or ['10', '50', '100']
+    for size in sizes:
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_async_nodes', '--one', size], check=True)
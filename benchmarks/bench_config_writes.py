@@ -0,0 +1,69 @@
+# Cost of persisting link cost changes under route flapping: the previous synchronous rewrite of
+# the config file per change versus the write-behind ConfigWriter.
+# Usage (from the repository root): python3 -m benchmarks.bench_config_writes [changes...]
+import os
+import sys
+import tempfile
+import time
+
+from persistence import ConfigWriter
+
+NEIGHBORS = ['B', 'C', 'D', 'E']
+
+
+def rewrite_config(config_file_path, target, new_cost):
+    # The previous apply_changes / update_cost_in_file
+    with open(config_file_path, 'r') as file:
+        lines = file.readlines()
+    with open(config_file_path, 'w') as file:
+        for line in lines:
+            parts = line.split()
+            if parts[0] == target:
+                parts[1] = str(new_cost)
+                file.write(' '.join(parts) + '\n')
+            else:
+                file.write(line)
+
+
+def write_config(config_file_path):
+    with open(config_file_path, 'w') as file:
+        file.write(f"{len(NEIGHBORS)}\n")
+        for i, neighbor in enumerate(NEIGHBORS):
+            file.write(f"{neighbor} 1.0 {6001 + i}\n")
+
+
+def flaps(num_changes):
+    for i in range(num_changes):
+        yield NEIGHBORS[i % len(NEIGHBORS)], float(1 + i % 7)
+
+
+def run(num_changes, directory):
+    config_file_path = os.path.join(directory, 'Aconfig.txt')
+
+    write_config(config_file_path)
+    start = time.perf_counter()
+    for neighbor, cost in flaps(num_changes):
+        rewrite_config(config_file_path, neighbor, cost)
+    sync_elapsed = time.perf_counter() - start
+    with open(config_file_path) as file:
+        expected = file.read()
+
+    write_config(config_file_path)
+    writer = ConfigWriter(config_file_path, flush_interval=0.05)
+    start = time.perf_counter()
+    for neighbor, cost in flaps(num_changes):
+        writer.set_cost(neighbor, cost)
+    receive_elapsed = time.perf_counter() - start
+    writer.close()
+    with open(config_file_path) as file:
+        assert file.read() == expected, "write-behind result differs from the synchronous rewrite"
+
+    print(f"{num_changes:>7} changes | synchronous: {num_changes} writes, {sync_elapsed / num_changes * 1e6:8.1f} us per change"
+          f" | write-behind: {writer.flushes} writes, {receive_elapsed / num_changes * 1e6:6.2f} us per change on the receive path")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 10000]
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            run(size, directory)
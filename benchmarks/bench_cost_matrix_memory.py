@@ -0,0 +1,60 @@
+# Memory of a full link-state cost table held by one node: the previous dict of dicts of floats
+# versus the dense array('d') and sparse row matrices from cost_matrix.py.
+# Usage (from the repository root): python3 -m benchmarks.bench_cost_matrix_memory [sizes...]
+import sys
+import tracemalloc
+
+from benchmarks.bench_spf import generate_cost_table
+from cost_matrix import make_cost_matrix
+
+INF = float('inf')
+# A dict of dicts with more rows than this is measured on this many rows and scaled up
+DICT_SAMPLE_ROWS = 1000
+
+
+def dict_table(nodes, links, rows):
+    # Built like the previous init_routing_table, then filled with link costs decoded from advertisements
+    cost_table = {}
+    for node in rows:
+        cost_table[node] = {dest: float('inf') for dest in nodes}
+        for dest, cost in links[node].items():
+            cost_table[node][dest] = round(cost, 3)
+    return cost_table
+
+
+def matrix_table(nodes, links, kind):
+    cost_table = make_cost_matrix(nodes, kind)
+    for node in nodes:
+        cost_table[node] = links[node]
+    return cost_table
+
+
+def measure(build, *args):
+    tracemalloc.start()
+    table = build(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del table
+    return size
+
+
+def report(label, num_nodes, size, note=''):
+    print(f"  {label:<14} {size / 2 ** 20:12,.1f} MB total | {size / num_nodes / 1024:10,.2f} KB per node {note}")
+
+
+def run(num_nodes):
+    links = generate_cost_table(num_nodes, dense=False)
+    nodes = list(links)
+    print(f"{num_nodes} nodes ({sum(map(len, links.values())) / num_nodes:.1f} links per row):")
+
+    rows = nodes[:min(num_nodes, DICT_SAMPLE_ROWS)]
+    size = measure(dict_table, nodes, links, rows) * num_nodes / len(rows)
+    report('dict of dicts', num_nodes, size, f"(scaled from {len(rows)} rows)" if len(rows) < num_nodes else '')
+    report('dense array', num_nodes, measure(matrix_table, nodes, links, 'dense'))
+    report('sparse rows', num_nodes, measure(matrix_table, nodes, links, 'sparse'))
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000]
+    for size in sizes:
+        run(size)
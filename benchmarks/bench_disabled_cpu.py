@@ -0,0 +1,58 @@
+# Measure the CPU time a disabled node uses over a fixed window, for both node implementations.
+# Exits with status 1 if a disabled node burns more than MAX_CPU_SHARE of one core.
+# Usage (from the repository root): python3 -m benchmarks.bench_disabled_cpu
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+WINDOW = 5
+SETTLE = 2
+MAX_CPU_SHARE = 0.05
+NODE_PORT = 23000
+IMPLEMENTATIONS = ['COMP3221_A1_Routing.py', 'Routing.py']
+
+
+def cpu_seconds(pid):
+    # utime + stime of a process, from /proc/<pid>/stat (Linux only)
+    with open(f'/proc/{pid}/stat') as stat:
+        fields = stat.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def measure(script, config_file_path):
+    with open(os.devnull, 'w') as devnull:
+        node = subprocess.Popen([sys.executable, script, 'A', str(NODE_PORT), config_file_path],
+                                stdin=subprocess.PIPE, stdout=devnull, stderr=devnull, text=True)
+    try:
+        node.stdin.write("disable\n")
+        node.stdin.flush()
+        time.sleep(SETTLE)
+        start = cpu_seconds(node.pid)
+        time.sleep(WINDOW)
+        return cpu_seconds(node.pid) - start
+    finally:
+        node.kill()
+        node.wait()
+
+
+if __name__ == "__main__":
+    if not os.path.exists('/proc/self/stat'):
+        print("This benchmark reads /proc and only runs on Linux")
+        sys.exit(0)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        config_file_path = os.path.join(directory, 'Aconfig.txt')
+        with open(config_file_path, 'w') as file:
+            file.write(f"1\nB 1.0 {NODE_PORT + 1}\n")
+
+        for script in IMPLEMENTATIONS:
+            cpu = measure(script, config_file_path)
+            share = cpu / WINDOW
+            failed |= share > MAX_CPU_SHARE
+            print(f"{script:<24} disabled for {WINDOW}s: {cpu:.3f}s CPU ({share * 100:.1f}% of one core)"
+                  f" {'FAIL' if share > MAX_CPU_SHARE else 'ok'}")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,110 @@
+# Time for all distance-vector nodes of the spec/ 10-node topology to hold correct routes: after
+# start-up, after a link cost change and after a node fails, with triggered updates and with the
+# 10 second tick only.
+# Every mode runs in its own process, since the nodes share module-level state.
+# Usage (from the repository root): python3 -m benchmarks.bench_dv_convergence
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import COMP3221_A1_Routing as dv
+from emulator import read_topology
+from spf import build_adjacency, shortest_paths
+
+TOPOLOGY = 'spec'
+# Lowered first, then set back to its configured cost
+LINK = ('A', 'B')
+NEW_COST = 1.0
+# Disabled last; its neighbors only notice through the neighbor timeout
+FAILED_NODE = 'G'
+TIMEOUT = 120
+POLL = 0.05
+MODES = ['triggered', 'periodic']
+
+
+def read_costs(directory):
+    # Ports and the {src: {dest: cost}} table of a config directory, every node at 0 from itself
+    ports = {}
+    topology = read_topology(directory, ports)
+    cost_table = {node_id: {node_id: 0, **links} for node_id, (_, links) in topology.items()}
+    return ports, cost_table
+
+
+def expected_distances(cost_table):
+    adjacency = build_adjacency(cost_table)
+    return {node: shortest_paths(adjacency, node)[0] for node in cost_table}
+
+
+def converged(states, expected):
+    for node_id, distances in expected.items():
+        routing_table = states[node_id]['routing_state'].snapshot()['routing_table']
+        for dest, distance in distances.items():
+            if dest == node_id:
+                continue
+            route = routing_table.get(dest)
+            if route is None or abs(route['distance'] - distance) > 1e-6:
+                return False
+        # Nodes that went away must not be reachable any more
+        for dest, route in routing_table.items():
+            if dest not in distances and route['distance'] != float('inf'):
+                return False
+    return True
+
+
+def wait_for_convergence(states, expected):
+    start = time.perf_counter()
+    while time.perf_counter() - start < TIMEOUT:
+        if converged(states, expected):
+            return time.perf_counter() - start
+        time.sleep(POLL)
+    return None
+
+
+def run_one(mode, directory):
+    dv.TRIGGERED_UPDATES = mode == 'triggered'
+    ports, cost_table = read_costs(directory)
+    results = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        states = {node_id: dv.start_node(node_id, ports[node_id], os.path.join(directory, f"{node_id}config.txt"))[0]
+                  for node_id in sorted(cost_table)}
+        results.append(('start-up', wait_for_convergence(states, expected_distances(cost_table))))
+
+        src, dest = LINK
+        for cost in (NEW_COST, cost_table[src][dest]):
+            cost_table[src][dest] = cost_table[dest][src] = cost
+            dv.change_neighbor_cost(src, dest, cost, states[src], os.path.join(directory, f"{src}config.txt"))
+            results.append((f"{src}-{dest} to {cost}", wait_for_convergence(states, expected_distances(cost_table))))
+
+        dv.set_active(states[FAILED_NODE], False)
+        del cost_table[FAILED_NODE]
+        for row in cost_table.values():
+            row.pop(FAILED_NODE, None)
+        results.append((f"{FAILED_NODE} fails", wait_for_convergence(states, expected_distances(cost_table))))
+
+        sent = {kind: sum(state['updates'][f"{kind}_sends"] for state in states.values()) for kind in ('triggered', 'periodic')}
+        for state in states.values():
+            dv.stop_node(state)
+        # Let the threads notice the shutdown before output goes back to the terminal
+        time.sleep(2)
+
+    for label, elapsed in results:
+        outcome = f"{elapsed:6.2f}s" if elapsed is not None else f"not within {TIMEOUT}s"
+        print(f"  {mode:<10} {label:<14} {outcome}")
+    print(f"  {mode:<10} messages sent: {sent['triggered']} triggered, {sent['periodic']} periodic")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--one':
+        with tempfile.TemporaryDirectory() as directory:
+            for name in os.listdir(TOPOLOGY):
+                shutil.copy(os.path.join(TOPOLOGY, name), directory)
+            run_one(sys.argv[2], directory)
+        sys.exit(0)
+
+    print(f"Time until every node of {TOPOLOGY}/ has correct distances:")
+    for mode in MODES:
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_dv_convergence', '--one', mode], check=True)
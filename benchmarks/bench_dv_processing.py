@@ -0,0 +1,120 @@
+# Time for a distance-vector node to process one received table on a long chain N0 - N1 - ... :
+# the previous text messages with whole paths (string concatenation in routing()) versus binary
+# messages with predecessors, without and with metrics (metrics.py). N0 hears from N1 only, and
+# every distance changes between messages.
+# Usage (from the repository root): python3 -m benchmarks.bench_dv_processing [sizes...]
+import sys
+import time
+
+import COMP3221_A1_Routing as dv
+from metrics import Metrics
+from node_log import node_logger
+from shared_state import SharedState
+from timer_wheel import TimerWheel
+from wire import decode_dv_message, encode_dv_table
+
+MIN_SECONDS = 1.0
+LINK_COST = 0.1
+
+
+def legacy_routing(node_id, message, routing_table):
+    # The previous routing(), without the timestamps and printing
+    lines = message.split('\n')
+    fr = lines[0].strip()
+    if_changed = False
+    for line in lines[1:]:
+        des, dis, path = line.split(' ')
+        dis = float(dis)
+        if des != node_id and node_id not in path:
+            if des in routing_table.keys():
+                if fr not in routing_table[des]['path']:
+                    if dis + routing_table[fr]['distance'] < routing_table[des]['distance']:
+                        routing_table[des]['distance'] = dis + routing_table[fr]['distance']
+                        routing_table[des]['path'] = routing_table[fr]['path'] + path[1:]
+                        if_changed = True
+                elif fr in routing_table[des]['path']:
+                    if routing_table[des]['distance'] != dis + routing_table[fr]['distance']:
+                        routing_table[des]['distance'] = dis + routing_table[fr]['distance']
+                        routing_table[des]['path'] = routing_table[fr]['path'] + path[1:]
+                        if_changed = True
+            else:
+                routing_table[des] = {'distance': dis + routing_table[fr]['distance'],
+                                      'path': routing_table[fr]['path'] + path[1:]}
+                if_changed = True
+    return if_changed
+
+
+def chain_tables(num_nodes):
+    # Two versions of N1's table, the second with every distance beyond N2 raised by 0.5.
+    # Links cost LINK_COST so that the far end stays below the distance-vector infinity
+    tables = []
+    for extra in (0.0, 0.5):
+        tables.append([(f"N{i}", round((i - 1) * LINK_COST + (extra if i > 2 else 0.0), 3), f"N{i - 1}")
+                       for i in range(2, num_nodes)])
+    return tables
+
+
+def legacy_message(entries):
+    lines = [f"{dest} {distance} {''.join(f'N{hop}' for hop in range(1, int(dest[1:]) + 1))}"
+             for dest, distance, _ in entries]
+    return "N1\n" + "\n".join(lines)
+
+
+def node_state(metrics=None):
+    neighbors = {'N1': {'distance': 1.0, 'port_id': 0, 'last_received': 0, 'alive': True, 'dead_interval': None}}
+    routing_table = {'N1': {'distance': 1.0, 'next_hop': 'N1', 'pred': 'N0'}}
+    return {
+        'clock': time.time,
+        'neighbors': neighbors,
+        'vectors': {'N1': {}},
+        'children': {'N1': {}},
+        'hold_downs': {},
+        # Never fires within a run, but routing() rearms N1's timeout on every message
+        'timers': TimerWheel(lambda key: None),
+        'routing_state': SharedState({'routing_table': routing_table, 'neighbors': neighbors},
+                                     copiers={'routing_table': dict}),
+        'routing_table': routing_table,
+        'log': node_logger('N0'),
+        'metrics': metrics,
+    }
+
+
+def per_message(process, messages):
+    calls, start = 0, time.perf_counter()
+    while True:
+        process(messages[calls % len(messages)])
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS and calls >= len(messages):
+            return elapsed / calls * 1000
+
+
+def run(num_nodes):
+    tables = chain_tables(num_nodes)
+    print(f"{num_nodes} node chain:")
+
+    messages = [legacy_message(entries) for entries in tables]
+    routing_table = {'N1': {'distance': 1.0, 'path': 'N0N1'}}
+    elapsed = per_message(lambda message: legacy_routing('N0', message, routing_table), messages)
+    print(f"  {'text, paths':<18} {len(messages[0]):>12,} bytes | {elapsed:9.3f} ms per message")
+
+    messages = [encode_dv_table('N1', entries) for entries in tables]
+    for label, metrics in (('binary, preds', None), ('with metrics', Metrics('N0'))):
+        global_state = node_state(metrics)
+
+        def process(message):
+            _, fr, entries = decode_dv_message(message)
+            dv.routing('N0', fr, entries, global_state)
+
+        elapsed = per_message(process, messages)
+        print(f"  {label:<18} {len(messages[0]):>12,} bytes | {elapsed:9.3f} ms per message")
+        path = dv.reconstruct_path('N0', f"N{num_nodes - 1}", global_state['routing_table'])
+        assert path == [f"N{i}" for i in range(num_nodes)], "chain routes were not installed"
+
+
+if __name__ == "__main__":
+    # Every message raises distances, which would otherwise only be accepted after the hold-down
+    dv.HOLD_DOWN = 0
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,73 @@
+# Convergence of generated topologies in the in-process emulator (emulator.py): virtual time
+# until the routes settle, messages and bytes sent, and the wall time the emulation took.
+# Per size and protocol: every node starts, then a node takes a neighbor for down while the link is
+# up and hears its hellos again FALSE_DOWN_FOR seconds later, then a link's cost goes up, then a
+# node fails.
+# Topologies are graph_generator's ring model, a ring with random chords, written as config files.
+# First, as a smoke check, every protocol starts each example topology of the repository (EXAMPLES,
+# config4 with a link only one end lists), takes a link down for nothing there as well, and must end
+# with correct routes after each.
+# Usage (from the repository root): python3 -m benchmarks.bench_emulator [sizes...]
+import os
+import sys
+import tempfile
+
+from emulator import format_result, read_topology, run
+from graph_generator import generate, node_names, write_configs
+
+# Average links per node: the ring's two plus two chords
+DEGREE = 4
+SEED = 3221
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = ('spec', 'config', 'config2', 'config3', 'config4')
+FALSE_DOWN_FOR = 0.5
+
+
+def false_down(node, neighbor):
+    return (f"false down {node}-{neighbor}", lambda network: network.false_down(node, neighbor, FALSE_DOWN_FOR))
+
+
+def scenarios(topology, names):
+    # The first ring link is taken down for nothing, then gets ten times dearer, then the node half
+    # way round the ring fails
+    src, dest = names[0], names[1]
+    cost = topology.links[0][1] * 10
+    failed = names[len(names) // 2]
+    return [false_down(src, dest),
+            (f"change {src}-{dest}", lambda network: network.change(src, dest, cost)),
+            (f"fail {failed}", lambda network: network.fail(failed))]
+
+
+def run_examples():
+    # Returns the number of runs that ended with wrong routes
+    failures = 0
+    for name in EXAMPLES:
+        directory = os.path.join(ROOT, name)
+        topology = read_topology(directory)
+        # The first link both ends list
+        node, neighbor = next((node, neighbor) for node, (_, links) in topology.items()
+                              for neighbor in links if node in topology.get(neighbor, ('', {}))[1])
+        for protocol in ('ls', 'dv'):
+            for result in run(directory, protocol, [false_down(node, neighbor)]):
+                failures += result['wrong'] > 0
+                print(f"{name:<8} {protocol}  {format_result(result)}")
+    return failures
+
+
+def run_size(num_nodes):
+    topology = generate('ring', num_nodes, DEGREE, SEED)
+    names = node_names(num_nodes)
+    with tempfile.TemporaryDirectory() as directory:
+        write_configs(directory, topology, names)
+        for protocol in ('ls', 'dv'):
+            print(f"{protocol}, {num_nodes} nodes, {topology.num_links} links:")
+            for result in run(directory, protocol, scenarios(topology, names)):
+                print(f"  {format_result(result)}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 200]
+    if run_examples():
+        sys.exit("Example topologies ended with wrong routes")
+    for size in sizes:
+        run_size(size)
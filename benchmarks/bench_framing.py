@@ -0,0 +1,73 @@
+# Throughput of the framed neighbor stream for routing tables from 1 KB to 10 MB.
+# Usage (from the repository root): python3 -m benchmarks.bench_framing [sizes in KB...]
+import socket
+import sys
+import threading
+import time
+
+from transport import HEADER, FrameReader, send_frame
+
+# Move roughly this much data per table size so small and large frames are measured alike
+BYTES_PER_RUN = 64 * 1024 * 1024
+
+
+def naive_read(sock, count):
+    # Reference reader: recv into fresh bytes objects and slice frames off a growing bytearray
+    buffer = bytearray()
+    frames = 0
+    while frames < count:
+        data = sock.recv(65536)
+        if not data:
+            break
+        buffer += data
+        while len(buffer) >= HEADER.size:
+            (length,) = HEADER.unpack_from(buffer)
+            if len(buffer) < HEADER.size + length:
+                break
+            bytes(buffer[HEADER.size:HEADER.size + length])
+            del buffer[:HEADER.size + length]
+            frames += 1
+
+
+def framed_read(sock, count):
+    reader = FrameReader()
+    frames = 0
+    while frames < count:
+        received = reader.read_from(sock)
+        if received is None:
+            break
+        frames += len(received)
+
+
+def measure(read, size, count):
+    sender, receiver = socket.socketpair()
+    payload = b'x' * size
+
+    def send():
+        for _ in range(count):
+            send_frame(sender, payload)
+
+    thread = threading.Thread(target=send)
+    start = time.perf_counter()
+    thread.start()
+    read(receiver, count)
+    elapsed = time.perf_counter() - start
+    thread.join()
+    sender.close()
+    receiver.close()
+    return size * count / elapsed / (1024 * 1024), count / elapsed
+
+
+def run(size_kb):
+    size = size_kb * 1024
+    count = max(BYTES_PER_RUN // size, 4)
+    naive_mb, _ = measure(naive_read, size, count)
+    framed_mb, framed_rate = measure(framed_read, size, count)
+    print(f"{size_kb:>6} KB tables x {count:>6} | recv_into reader {framed_mb:8.1f} MB/s ({framed_rate:9.1f} msg/s)"
+          f" | naive reader {naive_mb:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1, 10, 100, 1024, 10240]
+    for size in sizes:
+        run(size)
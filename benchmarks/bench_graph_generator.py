@@ -0,0 +1,32 @@
+# Time to generate a topology and write its config files with graph_generator.py, per model.
+# Generation is the models' own work; writing is dominated by creating one file per node.
+# Usage (from the repository root): python3 -m benchmarks.bench_graph_generator [sizes...]
+import sys
+import tempfile
+import time
+
+from graph_generator import MODELS, generate, node_names, write_configs
+
+DEGREE = 3.5
+
+
+def run(num_nodes):
+    print(f"{num_nodes} nodes, average degree {DEGREE:g}:")
+    names = node_names(num_nodes)
+    for model in sorted(MODELS):
+        start = time.perf_counter()
+        topology = generate(model, num_nodes, DEGREE, seed=3221)
+        generated = time.perf_counter() - start
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            write_configs(directory, topology, names)
+            written = time.perf_counter() - start
+        max_degree = max(len(links) for links in topology.links)
+        print(f"  {model:<7} {topology.num_links:>9,} links, max degree {max_degree:>5} |"
+              f" generate {generated:6.2f}s, write {written:6.2f}s")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 100000]
+    for size in sizes:
+        run(size)
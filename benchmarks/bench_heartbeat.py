@@ -0,0 +1,106 @@
+# Time until a distance-vector node (COMP3221_A1_Routing.py) considers a failed neighbor down,
+# with liveness taken from the routing tables only (NEIGHBOR_TIMEOUT) versus from hellos
+# (HELLO_INTERVAL * DEAD_MULTIPLIER), and the traffic the hellos add.
+# Two nodes A - B; B is disabled at random moments between tables, ROUNDS times per mode.
+# Every mode runs in its own process, since the nodes share module-level state.
+# Usage (from the repository root): python3 -m benchmarks.bench_heartbeat [rounds]
+import contextlib
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import COMP3221_A1_Routing as dv
+from datagram import HEADER
+from graph_generator import Topology, write_configs
+
+MODES = {'tables': 0, 'hellos': dv.HELLO_INTERVAL}
+POLL = 0.01
+# Headers of a datagram on the wire besides the hello: IPv4, UDP and datagram.py's own
+UDP_OVERHEAD = 28 + HEADER.size
+
+
+def free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(('localhost', 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def write_link(directory, ports):
+    # A - B at cost 1.0, on the ports given
+    topology = Topology(2, None)
+    topology.link(0, 1, 1.0)
+    write_configs(directory, topology, ['A', 'B'], ports=[ports['A'], ports['B']])
+
+
+def wait_for(condition, timeout):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if condition():
+            return time.perf_counter() - start
+        time.sleep(POLL)
+    return None
+
+
+def run_one(mode, rounds):
+    dv.HELLO_INTERVAL = MODES[mode]
+    rng = random.Random(rounds)
+    a_port, b_port = free_ports(2)
+    ports = {'A': a_port, 'B': b_port}
+    timeout = dv.NEIGHBOR_TIMEOUT + dv.SEND_INTERVAL + 5
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        write_link(directory, ports)
+        with contextlib.redirect_stdout(devnull):
+            states = {node_id: dv.start_node(node_id, ports[node_id], os.path.join(directory, f"{node_id}config.txt"))[0]
+                      for node_id in ports}
+            a, b = states['A'], states['B']
+
+            def b_alive():
+                return a['routing_state'].snapshot()['neighbors']['B']['alive']
+
+            def routes_up():
+                return b_alive() and 'A' in a['vectors']['B']
+
+            times = []
+            for _ in range(rounds):
+                wait_for(routes_up, timeout)
+                # Fail somewhere between two tables
+                time.sleep(rng.uniform(0, dv.SEND_INTERVAL))
+                dv.set_active(b, False)
+                times.append(wait_for(lambda: not b_alive(), timeout))
+                dv.set_active(b, True)
+            sent = a['heartbeat'].metrics()['sent'] if a['heartbeat'] is not None else 0
+            packet = a['heartbeat'].packet if a['heartbeat'] is not None else None
+            for state in states.values():
+                dv.stop_node(state)
+            # Let the threads notice the shutdown before output goes back to the terminal
+            time.sleep(2)
+
+    detected = [elapsed for elapsed in times if elapsed is not None]
+    missed = len(times) - len(detected)
+    line = f"  {mode:<7} mean {statistics.mean(detected):6.2f}s, max {max(detected):6.2f}s to notice" if detected else f"  {mode:<7}"
+    if missed:
+        line += f" ({missed} not within {timeout}s)"
+    print(line)
+    if packet is not None:
+        per_second = (len(packet) + UDP_OVERHEAD) / dv.HELLO_INTERVAL
+        print(f"  {'':<7} {sent} hellos of {len(packet)} bytes sent, {per_second:,.0f} bytes/s per neighbor with headers")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--one':
+        run_one(sys.argv[2], int(sys.argv[3]))
+        sys.exit(0)
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"Time until A notices that its neighbor B failed, {rounds} failures:")
+    for mode in MODES:
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_heartbeat', '--one', mode, str(rounds)], check=True)
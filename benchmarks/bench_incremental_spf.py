@@ -0,0 +1,69 @@
+# Count edge relaxations needed to keep the shortest path tree current after
+# single link-cost changes, with full recomputation versus incremental repair.
+# Usage (from the repository root): python3 -m benchmarks.bench_incremental_spf [sizes...]
+import random
+import sys
+import time
+
+from benchmarks.bench_spf import generate_cost_table
+from spf import build_adjacency, build_spt, shortest_paths, update_edge
+
+INF = float('inf')
+EVENTS = 200
+
+
+def random_link_changes(cost_table, count, seed=6):
+    rng = random.Random(seed)
+    links = [(src, dest) for src, row in cost_table.items() for dest, cost in row.items()
+             if src != dest and cost != INF]
+    changes = []
+    for _ in range(count):
+        src, dest = rng.choice(links)
+        # Mix cost increases, decreases and link failures
+        roll = rng.random()
+        if roll < 0.1:
+            cost = INF
+        elif roll < 0.55:
+            cost = round(rng.uniform(0.1, 1), 1)
+        else:
+            cost = round(rng.uniform(10, 20), 1)
+        changes.append((src, dest, cost))
+    return changes
+
+
+def run(num_nodes):
+    cost_table = generate_cost_table(num_nodes, dense=False)
+    source = next(iter(cost_table))
+    changes = random_link_changes(cost_table, EVENTS)
+
+    spt = build_spt(cost_table, source)
+    adjacency = build_adjacency(cost_table)
+
+    full_stats, incremental_stats = {}, {}
+    full_time = incremental_time = 0.0
+    for src, dest, cost in changes:
+        if cost == INF:
+            adjacency[src].pop(dest, None)
+        else:
+            adjacency[src][dest] = cost
+
+        start = time.perf_counter()
+        distances, _ = shortest_paths(adjacency, source, full_stats)
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        update_edge(spt, src, dest, cost, incremental_stats)
+        incremental_time += time.perf_counter() - start
+
+        assert spt['distances'] == distances, "incremental tree diverged from full recomputation"
+
+    full, incremental = full_stats['relaxations'], incremental_stats.get('relaxations', 0)
+    print(f"{num_nodes:>7} nodes, {EVENTS} changes | full {full / EVENTS:10.1f} relaxations/change"
+          f" ({full_time / EVENTS * 1000:.3f} ms) | incremental {incremental / EVENTS:8.1f} relaxations/change"
+          f" ({incremental_time / EVENTS * 1000:.3f} ms)")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 1000, 10000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,121 @@
+# Sustained advertisements per second a link-state node (Routing.py) takes in while many
+# simulated neighbors flood it, with the listener handling every message itself versus handing
+# them to the worker pool. The node's output goes to /dev/null, or to a slow terminal that takes
+# SLOW_WRITE seconds per write (handling is then mostly waiting, which workers can overlap).
+# Every run is its own process, since the node uses module-level state.
+# Usage (from the repository root): python3 -m benchmarks.bench_listener_flood [neighbors] [messages per neighbor]
+import contextlib
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import Routing
+import worker_pool
+from transport import send_frame
+from wire import encode_ls_advertisement
+
+NODE = 'A'
+SENDER_THREADS = 8
+TIMEOUT = 300
+MODES = {'listener': 0, 'workers': worker_pool.WORKERS}
+SINKS = ['devnull', 'slow']
+SLOW_WRITE = 0.002
+
+
+class SlowTerminal(io.TextIOBase):
+    def write(self, text):
+        time.sleep(SLOW_WRITE)
+        return len(text)
+
+
+def write_config(directory, num_neighbors):
+    path = os.path.join(directory, f"{NODE}config.txt")
+    with open(path, 'w') as file:
+        file.write(f"{num_neighbors}\n")
+        for i in range(num_neighbors):
+            # Nothing listens on these ports, the node only receives here
+            file.write(f"S{i} 1.0 {20000 + i}\n")
+    return path
+
+
+def advertisement(sender, sequence):
+    # A neighbor's own row with a newer timestamp every time, so every message gets applied
+    return encode_ls_advertisement({
+        'sender': sender, 'type': 'delta', 'epoch': 1.0, 'version': sequence, 'ack': 0, 'ack_epoch': None,
+        'table': {'cost': {sender: {sender: 0.0, NODE: 1.0 + sequence % 2}},
+                  'time': {sender: 1700000000.0 + sequence}}})
+
+
+def flood(port, senders, num_messages):
+    # One stream per simulated neighbor, messages interleaved across them
+    streams = {sender: socket.create_connection(('localhost', port)) for sender in senders}
+    for sequence in range(1, num_messages + 1):
+        for sender, stream in streams.items():
+            send_frame(stream, advertisement(sender, sequence))
+    return streams
+
+
+def run_one(mode, sink, num_neighbors, num_messages):
+    Routing.WORKERS = MODES[mode]
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, 'w') as devnull:
+        output = devnull if sink == 'devnull' else SlowTerminal()
+        config_file_path = write_config(directory, num_neighbors)
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.bind(('localhost', 0))
+        server_socket.listen()
+        port = server_socket.getsockname()[1]
+
+        with contextlib.redirect_stdout(output):
+            global_state = Routing.init_global_state(NODE, config_file_path)
+            Routing.start_workers(global_state, config_file_path)
+            listener = threading.Thread(target=Routing.listening_to_neighbors, daemon=True,
+                                        args=(port, server_socket, global_state, config_file_path, None))
+            listener.start()
+
+            senders = [f"S{i}" for i in range(num_neighbors)]
+            last_time = 1700000000.0 + num_messages
+            start = time.perf_counter()
+            threads = [threading.Thread(target=flood, args=(port, senders[i::SENDER_THREADS], num_messages))
+                       for i in range(SENDER_THREADS)]
+            for thread in threads:
+                thread.start()
+            while time.perf_counter() - start < TIMEOUT:
+                times = global_state['routing_state'].snapshot()['time']
+                if all(times.get(sender) == last_time for sender in senders):
+                    break
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            for thread in threads:
+                thread.join()
+            Routing.shut_signal.set()
+            if global_state['workers'] is not None:
+                global_state['workers'].close()
+            global_state['config_writer'].close()
+            listener.join()
+
+    total = num_neighbors * num_messages
+    label = f"{mode}, {sink}"
+    print(f"  {label:<18} {total:>7} messages in {elapsed:6.2f}s | {total / elapsed:8,.0f} messages/s")
+    if global_state['workers'] is not None:
+        metrics = global_state['workers'].metrics()
+        print(f"  {'':<18} highest queue {metrics['max_depth']}/{metrics['queue_size']},"
+              f" listener waited {metrics['blocked']} times ({metrics['blocked_time']:.2f}s)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == '--one':
+        run_one(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]))
+        sys.exit(0)
+
+    num_neighbors = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    num_messages = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    print(f"{num_neighbors} neighbors flooding {num_messages} advertisements each:")
+    for sink in SINKS:
+        for mode in MODES:
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_listener_flood', '--one', mode, sink,
+                            str(num_neighbors), str(num_messages)], check=True)
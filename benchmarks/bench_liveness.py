@@ -0,0 +1,91 @@
+# How late a silent neighbor is noticed, and what keeping neighbors alive costs: per-neighbor
+# deadlines on timer_wheel.TimerWheel versus the previous scans of every neighbor's last_received
+# every SCAN_INTERVAL seconds (5s in the link-state node, 1s in the distance-vector node).
+# Neighbors fall silent at random moments; lateness is the time from a deadline to its detection.
+# Usage (from the repository root): python3 -m benchmarks.bench_liveness [neighbors]
+import random
+import statistics
+import sys
+import threading
+import time
+
+from timer_wheel import TimerWheel
+
+# Neighbors fall silent within this many seconds; the timeout is the same for every neighbor
+SPREAD = 6.0
+TIMEOUT = 1.0
+SCAN_INTERVALS = [5.0, 1.0]
+REARMS = 100000
+
+
+def report(label, lateness, extra=""):
+    print(f"  {label:<14} mean {statistics.mean(lateness) * 1000:8.1f} ms late,"
+          f" max {max(lateness) * 1000:8.1f} ms{extra}")
+
+
+def silent_at(num_neighbors):
+    rng = random.Random(num_neighbors)
+    return {f"N{i}": rng.uniform(0, SPREAD) for i in range(num_neighbors)}
+
+
+def run_wheel(num_neighbors):
+    # Every neighbor is armed once more at the moment it falls silent
+    silences = silent_at(num_neighbors)
+    detected = {}
+    done = threading.Event()
+
+    def on_expire(key):
+        detected[key] = time.monotonic()
+        if len(detected) == num_neighbors:
+            done.set()
+
+    wheel = TimerWheel(on_expire)
+    start = time.monotonic()
+    deadlines = {}
+    for key, moment in sorted(silences.items(), key=lambda item: item[1]):
+        time.sleep(max(start + moment - time.monotonic(), 0))
+        wheel.arm(key, TIMEOUT)
+        deadlines[key] = time.monotonic() + TIMEOUT
+    done.wait(SPREAD + TIMEOUT + 5)
+    wheel.close()
+    report('timer wheel', [detected[key] - deadlines[key] for key in deadlines],
+           f", {wheel.moved} moved, {wheel.expired} expired")
+
+
+def run_scan(num_neighbors, interval):
+    # The previous checks: last_received of every neighbor against the timeout, every interval
+    silences = silent_at(num_neighbors)
+    start = time.monotonic()
+    last_received = {key: start + moment for key, moment in silences.items()}
+    lateness = []
+    next_scan = start + interval
+    while len(lateness) < num_neighbors:
+        time.sleep(max(next_scan - time.monotonic(), 0))
+        now = time.monotonic()
+        for key, received in list(last_received.items()):
+            if now - received > TIMEOUT:
+                lateness.append(now - (received + TIMEOUT))
+                del last_received[key]
+        next_scan += interval
+    report(f"scan every {interval:g}s", lateness)
+
+
+def run_rearm(num_neighbors):
+    # The cost added to every received message: one arm() of its sender
+    wheel = TimerWheel(lambda key: None)
+    keys = [f"N{i}" for i in range(num_neighbors)]
+    start = time.perf_counter()
+    for i in range(REARMS):
+        wheel.arm(keys[i % num_neighbors], TIMEOUT * 10)
+    elapsed = time.perf_counter() - start
+    wheel.close()
+    print(f"  {'rearm':<14} {elapsed / REARMS * 1e6:8.2f} us per arm()")
+
+
+if __name__ == "__main__":
+    num_neighbors = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{num_neighbors} neighbors falling silent over {SPREAD:g}s, timeout {TIMEOUT:g}s:")
+    run_wheel(num_neighbors)
+    for interval in SCAN_INTERVALS:
+        run_scan(num_neighbors, interval)
+    run_rearm(num_neighbors)
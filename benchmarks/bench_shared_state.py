@@ -0,0 +1,121 @@
+# Readers of the link-state table while a writer keeps replacing rows and now and then adds a
+# node, as the listener does for advertisements: the previous unlocked reads of the live table versus snapshots of
+# shared_state.SharedState. A read fails when it raises or sees a row half written (every node
+# has links, so an empty row is one). Also reports what publishing costs the writer, with the
+# table as a sparse and as a dense matrix.
+# Usage (from the repository root): python3 -m benchmarks.bench_shared_state [sizes...]
+import random
+import sys
+import threading
+import time
+
+from benchmarks.bench_spf import generate_cost_table
+from cost_matrix import make_cost_matrix
+from shared_state import SharedState
+from spf import build_spt
+
+SECONDS = 2.0
+# Switch threads far more often than the default 5 ms, so that races show up within SECONDS
+SWITCH_INTERVAL = 1e-5
+# Every this many writes a newly discovered node is added
+NEW_NODE_EVERY = 50
+
+
+def changes(links, nodes, rng):
+    # Lists of (src, row) to write together: one row at a time, alternately with and without the
+    # link to a random other node, and now and then a new node linked to an existing one
+    count = 0
+    while True:
+        count += 1
+        if count % NEW_NODE_EVERY == 0:
+            new, neighbor, cost = f"X{count}", rng.choice(nodes), round(rng.uniform(0.1, 10), 1)
+            links[neighbor] = dict(links[neighbor], **{new: cost})
+            links[new] = {new: 0, neighbor: cost}
+            yield [(new, links[new]), (neighbor, links[neighbor])]
+            continue
+        src = rng.choice(nodes)
+        row = dict(links[src])
+        row[rng.choice(nodes)] = round(rng.uniform(0.1, 10), 1)
+        yield [(src, row)]
+        yield [(src, links[src])]
+
+
+def run_readers(read, stop):
+    counts = {'reads': 0, 'errors': 0, 'torn': 0}
+
+    def reader():
+        while not stop.is_set():
+            try:
+                spt = read()
+            except (RuntimeError, KeyError, IndexError):
+                counts['errors'] += 1
+                continue
+            counts['reads'] += 1
+            if not all(spt['adjacency'].values()):
+                counts['torn'] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    return threads, counts
+
+
+def measure(label, num_nodes, links, write, read):
+    links = dict(links)
+    nodes = list(links)
+    stop = threading.Event()
+    threads, counts = run_readers(read, stop)
+    writes, write_time = 0, 0.0
+    start = time.perf_counter()
+    for rows in changes(links, nodes, random.Random(num_nodes)):
+        if time.perf_counter() - start >= SECONDS:
+            break
+        began = time.perf_counter()
+        write(rows)
+        write_time += time.perf_counter() - began
+        writes += 1
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print(f"  {label:<10} {writes / SECONDS:9,.0f} writes/s, {write_time / writes * 1e6:8.1f} us per write"
+          f" | {counts['reads'] / SECONDS:7,.1f} reads/s, failed: {counts['errors']} raised, {counts['torn']} torn")
+
+
+def run(num_nodes):
+    links = generate_cost_table(num_nodes, dense=False)
+    print(f"{num_nodes} nodes:")
+
+    # Previous code: the calculation iterates the table the listener is changing
+    table = {src: dict(row) for src, row in links.items()}
+
+    def write_dict(rows):
+        for src, row in rows:
+            table[src] = {}
+            table[src].update(row)
+
+    measure('unlocked', num_nodes, links, write_dict, lambda: build_spt(table, 'N0'))
+
+    # Publishing copies the matrix; both kinds share the rows a write did not touch
+    for kind in ('sparse', 'dense'):
+        cost_table = make_cost_matrix(list(links), kind)
+        for src, row in links.items():
+            cost_table[src] = row
+        routing_state = SharedState({'cost': cost_table})
+
+        def write_shared(rows, routing_state=routing_state):
+            with routing_state.write('cost') as live:
+                for src, row in rows:
+                    live['cost'].add_node(src)
+                    for dest in row:
+                        live['cost'].add_node(dest)
+                    live['cost'][src] = row
+
+        measure(f"{kind}", num_nodes, links, write_shared,
+                lambda routing_state=routing_state: build_spt(routing_state.snapshot()['cost'], 'N0'))
+
+
+if __name__ == "__main__":
+    sys.setswitchinterval(SWITCH_INTERVAL)
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000]
+    for size in sizes:
+        run(size)
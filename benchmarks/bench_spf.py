@@ -0,0 +1,80 @@
+# Compare the heap-based SPF engine with the original O(V^2) dijkstra.
+# Usage (from the repository root): python3 -m benchmarks.bench_spf [sizes...]
+import sys
+import time
+
+from graph_generator import generate, node_names
+from spf import build_adjacency, shortest_paths
+
+INF = float('inf')
+# The original implementation scans every unvisited node per step, so it is
+# only run on graphs small enough to finish in reasonable time
+LEGACY_LIMIT = 5000
+
+
+def generate_cost_table(num_nodes, extra_degree=2, seed=3221, dense=True):
+    # graph_generator's ring model (the ring keeps the graph connected, random chords keep it
+    # small-world) as {src: {dest: cost}}; dense tables list every node, unlinked ones at inf
+    topology = generate('ring', num_nodes, 2 + extra_degree, seed)
+    nodes = node_names(num_nodes)
+    cost_table = {}
+    for i, links in enumerate(topology.links):
+        row = dict.fromkeys(nodes, INF) if dense else {}
+        row[nodes[i]] = 0
+        row.update((nodes[j], cost) for j, cost in links.items())
+        cost_table[nodes[i]] = row
+    return cost_table
+
+
+def legacy_dijkstra(cost_table, node_id):
+    # The original Routing.dijkstra search loop, without the printing
+    distances = {node: float('inf') for node in cost_table}
+    distances[node_id] = 0
+    predecessors = {node: None for node in cost_table}
+    unvisited = set(cost_table.keys())
+
+    while unvisited:
+        current_node = min(unvisited, key=lambda node: distances[node])
+        unvisited.remove(current_node)
+        for neighbor, cost in cost_table[current_node].items():
+            if neighbor in unvisited:
+                new_cost = distances[current_node] + cost
+                if new_cost < distances[neighbor]:
+                    distances[neighbor] = round(new_cost, 3)
+                    predecessors[neighbor] = current_node
+        if distances[current_node] == float('inf'):
+            break
+    return distances, predecessors
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(num_nodes):
+    dense = num_nodes <= LEGACY_LIMIT
+    cost_table = generate_cost_table(num_nodes, dense=dense)
+    source = next(iter(cost_table))
+
+    adjacency, build_time = timed(build_adjacency, cost_table)
+    (heap_distances, _), heap_time = timed(shortest_paths, adjacency, source)
+
+    if dense:
+        (legacy_distances, _), legacy_time = timed(legacy_dijkstra, cost_table, source)
+        assert legacy_distances == heap_distances, "engines disagree on shortest distances"
+        legacy = f"{legacy_time * 1000:10.2f} ms"
+        speedup = f"{legacy_time / (build_time + heap_time):8.1f}x"
+    else:
+        legacy = f"{'skipped':>13}"
+        speedup = f"{'-':>9}"
+
+    print(f"{num_nodes:>7} nodes | legacy {legacy} | heap {heap_time * 1000:10.2f} ms"
+          f" (+{build_time * 1000:.2f} ms adjacency) | speedup {speedup}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 1000, 50000]
+    for size in sizes:
+        run(size)
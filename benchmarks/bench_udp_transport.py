@@ -0,0 +1,130 @@
+# Delivery of link-state advertisements between two sockets in one process: over a new TCP
+# connection per advertisement (as the nodes used to send), over a long-lived TCP stream
+# (transport.ConnectionPool and FrameListener) and as datagrams (datagram.DatagramSocket).
+# Latency is from handing one advertisement to the transport until the receiver has all of it;
+# a burst sends BURST advertisements back to back and counts how many arrive (UDP may drop some).
+# Usage (from the repository root): python3 -m benchmarks.bench_udp_transport [sizes...]
+import socket
+import statistics
+import sys
+import threading
+import time
+
+from benchmarks.bench_wire import ls_message
+from datagram import CHANNEL_ROUTING, MAX_PAYLOAD, DatagramSocket
+from transport import ConnectionPool, FrameListener, send_frame
+from wire import encode_ls_advertisement
+
+ROUNDS = 200
+BURST = 200
+SETTLE = 1.0
+
+
+class Receiver:
+    # Counts delivered messages and wakes up whoever waits for the next one
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.count = 0
+        self.last = None
+
+    def __call__(self, data):
+        with self.condition:
+            self.count += 1
+            self.last = time.perf_counter()
+            self.condition.notify_all()
+
+    def wait_for(self, count, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.count >= count, timeout)
+
+
+class ConnectPerMessage:
+    # Handshake, one frame and teardown for every message
+    def send(self, port, payload):
+        with socket.create_connection(('localhost', port)) as sock:
+            send_frame(sock, payload)
+
+    def close(self):
+        pass
+
+
+def tcp_pair(receiver, sender_class=ConnectionPool):
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('localhost', 0))
+    server_socket.listen()
+    port = server_socket.getsockname()[1]
+    listener = FrameListener(server_socket)
+    stop = threading.Event()
+
+    def listen():
+        while not stop.is_set():
+            for data in listener.poll(0.1):
+                receiver(data)
+
+    thread = threading.Thread(target=listen)
+    thread.start()
+    pool = sender_class()
+
+    def close():
+        stop.set()
+        thread.join()
+        pool.close()
+        listener.close()
+    return pool, port, close
+
+
+def udp_pair(receiver):
+    sender, target = DatagramSocket(0), DatagramSocket(0)
+    target.on(CHANNEL_ROUTING, receiver)
+
+    def close():
+        sender.close()
+        target.close()
+    return sender, target.sock.getsockname()[1], close
+
+
+def connect_pair(receiver):
+    return tcp_pair(receiver, ConnectPerMessage)
+
+
+def measure(label, make_pair, payload, datagrams=None):
+    receiver = Receiver()
+    transport, port, close = make_pair(receiver)
+    latencies, lost = [], 0
+    for _ in range(ROUNDS):
+        expected = receiver.count + 1
+        start = time.perf_counter()
+        transport.send(port, payload)
+        if receiver.wait_for(expected, SETTLE):
+            latencies.append(time.perf_counter() - start)
+        else:
+            lost += 1
+
+    before = receiver.count
+    start = time.perf_counter()
+    for _ in range(BURST):
+        transport.send(port, payload)
+    receiver.wait_for(before + BURST, SETTLE)
+    delivered = receiver.count - before
+    # Up to the last delivery, so lost messages do not add the time waited for them
+    elapsed = receiver.last - start
+    close()
+
+    latency = f"{statistics.median(latencies) * 1e6:9.1f} us" if latencies else "      n/a"
+    datagrams = f"{datagrams:>4} datagrams" if datagrams is not None else f"{'':>14}"
+    print(f"  {label:<12} {datagrams} | latency {latency} ({lost} lost)"
+          f" | burst {delivered}/{BURST} delivered, {delivered / elapsed:9,.0f} messages/s")
+
+
+def run(num_nodes):
+    payload = encode_ls_advertisement(ls_message(num_nodes))
+    print(f"{num_nodes} node advertisement, {len(payload):,} bytes:")
+    measure('tcp connect', connect_pair, payload)
+    measure('tcp stream', tcp_pair, payload)
+    measure('udp', udp_pair, payload, -(-len(payload) // MAX_PAYLOAD))
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 300]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,77 @@
+# Encode/decode cost of routing tables: binary wire format versus the previous JSON (Routing.py)
+# and space-separated text (COMP3221_A1_Routing.py) encodings.
+# Usage (from the repository root): python3 -m benchmarks.bench_wire [sizes...]
+import json
+import sys
+import time
+
+from benchmarks.bench_spf import generate_cost_table
+from wire import decode_dv_message, decode_ls_advertisement, encode_dv_table, encode_ls_advertisement
+
+INF = float('inf')
+MIN_SECONDS = 0.5
+
+
+def ls_message(num_nodes):
+    cost_table = generate_cost_table(num_nodes)
+    time_table = {node: 1700000000.0 + i for i, node in enumerate(cost_table)}
+    return {'sender': 'N0', 'type': 'full', 'epoch': 1700000000.0, 'version': 42, 'ack': 41,
+            'ack_epoch': 1700000001.0, 'table': {'cost': cost_table, 'time': time_table}}
+
+
+def dv_entries(num_nodes):
+    # A chain-shaped routing table: the text format carries the whole path, the binary one the predecessor
+    return [(f"N{i}", float(i), tuple(f"N{hop}" for hop in range(i + 1))) for i in range(1, num_nodes)]
+
+
+def dv_binary_entries(entries):
+    return [(dest, distance, path[-2]) for dest, distance, path in entries]
+
+
+def text_encode(sender, entries):
+    # Previous format_routing_table_for_sending: "<sender>\n<dest> <distance> <path>" lines
+    lines = [f"{dest} {distance} {''.join(path)}" for dest, distance, path in entries]
+    return f"{sender}\n" + "\n".join(lines)
+
+
+def text_decode(message):
+    lines = message.split('\n')
+    entries = []
+    for line in lines[1:]:
+        dest, distance, path = line.split(' ')
+        entries.append((dest, float(distance), path))
+    return lines[0], entries
+
+
+def per_call(func, arg):
+    calls, start = 0, time.perf_counter()
+    while True:
+        func(arg)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS:
+            return elapsed / calls * 1000
+
+
+def report(label, encode, decode, message):
+    encoded = encode(message)
+    print(f"  {label:<8} {len(encoded):>12,} bytes | encode {per_call(encode, message):9.3f} ms"
+          f" | decode {per_call(decode, encoded):9.3f} ms")
+
+
+def run(num_nodes):
+    print(f"{num_nodes} nodes, link-state cost matrix:")
+    message = ls_message(num_nodes)
+    report('json', lambda m: json.dumps(m).encode('utf-8'), lambda d: json.loads(d.decode('utf-8')), message)
+    report('binary', encode_ls_advertisement, decode_ls_advertisement, message)
+
+    print(f"{num_nodes} nodes, distance-vector table:")
+    entries = dv_entries(num_nodes)
+    report('text', lambda e: text_encode('N0', e).encode('utf-8'), lambda d: text_decode(d.decode('utf-8')), entries)
+    report('binary', lambda e: encode_dv_table('N0', e), decode_dv_message, dv_binary_entries(entries))
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]
+    for size in sizes:
+        run(size)
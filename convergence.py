@@ -0,0 +1,169 @@
+import threading
+import time
+
+# Decides when a node has heard enough to (re)compute its routes, instead of fixed sleeps.
+#   - before the first calculation: as soon as every configured neighbor has reported,
+#     or after INITIAL_TIMEOUT if some never do
+#   - afterwards: once no change has arrived for QUIET_PERIOD seconds, but never later than
+#     MAX_HOLD_DOWN seconds after the first change of a burst
+# Times come from the node's clock, time.monotonic() unless given (the emulator passes a virtual one).
+
+QUIET_PERIOD = 2.0
+MAX_HOLD_DOWN = 20.0
+INITIAL_TIMEOUT = 60.0
+
+
+def init_convergence(global_state, neighbors, quiet_period=QUIET_PERIOD, max_hold_down=MAX_HOLD_DOWN,
+                     initial_timeout=INITIAL_TIMEOUT, clock=time.monotonic):
+    global_state['convergence'] = {
+        'clock': clock,
+        'condition': threading.Condition(),
+        'quiet_period': quiet_period,
+        'max_hold_down': max_hold_down,
+        'initial_timeout': initial_timeout,
+        'started': clock(),
+        'waiting_for': set(neighbors),
+        'calculated': False,
+        'first_change': None,
+        'last_change': None,
+        # Metrics
+        'calculations': 0,
+        'changes': 0,
+        'reasons': {},
+        'first_calculation_after': None,
+        'holds': 0,
+        'last_hold': None,
+        'total_hold': 0.0,
+        'max_hold': 0.0,
+        # The node's metrics.Metrics (None: switched off), given every wait for a calculation
+        'metrics': global_state.get('metrics'),
+    }
+
+
+def note_change(global_state):
+    # A routing table change: (re)starts the quiet period of the current burst
+    state = global_state['convergence']
+    with state['condition']:
+        now = state['clock']()
+        if state['first_change'] is None:
+            state['first_change'] = now
+        state['last_change'] = now
+        state['changes'] += 1
+        state['condition'].notify_all()
+
+
+def note_report(global_state, neighbor_id):
+    state = global_state['convergence']
+    if neighbor_id not in state['waiting_for']:
+        return
+    with state['condition']:
+        state['waiting_for'].discard(neighbor_id)
+        state['condition'].notify_all()
+
+
+def next_calculation(state):
+    # Returns (deadline, reason) of the next calculation, or (None, None) when nothing is pending
+    if not state['calculated']:
+        if not state['waiting_for']:
+            return state['started'], 'neighbors'
+        return state['started'] + state['initial_timeout'], 'timeout'
+    if state['first_change'] is None:
+        return None, None
+    quiet = state['last_change'] + state['quiet_period']
+    hold_down = state['first_change'] + state['max_hold_down']
+    if quiet <= hold_down:
+        return quiet, 'quiet'
+    return hold_down, 'hold-down'
+
+
+def start_calculation(state, reason):
+    # Close the current burst and record how long it was held, caller holds the condition
+    now = state['clock']()
+    if not state['calculated']:
+        state['calculated'] = True
+        state['first_calculation_after'] = now - state['started']
+        if state['metrics'] is not None:
+            state['metrics'].observe('routing_convergence_seconds', state['first_calculation_after'])
+    elif state['first_change'] is not None:
+        hold = now - state['first_change']
+        state['holds'] += 1
+        state['last_hold'] = hold
+        state['total_hold'] += hold
+        state['max_hold'] = max(state['max_hold'], hold)
+        if state['metrics'] is not None:
+            state['metrics'].observe('routing_convergence_seconds', hold)
+    state['first_change'] = state['last_change'] = None
+    state['calculations'] += 1
+    state['reasons'][reason] = state['reasons'].get(reason, 0) + 1
+    state['condition'].notify_all()
+
+
+def take_due_calculation(global_state):
+    # Non-blocking: returns the reason if a calculation is due now (and starts it), else None
+    state = global_state['convergence']
+    with state['condition']:
+        deadline, reason = next_calculation(state)
+        if deadline is None or deadline > state['clock']():
+            return None
+        start_calculation(state, reason)
+        return reason
+
+
+def wait_for_convergence(global_state, shut_signal):
+    # Blocks until a calculation is due and returns its reason, or None on shutdown
+    state = global_state['convergence']
+    with state['condition']:
+        while not shut_signal.is_set():
+            deadline, reason = next_calculation(state)
+            now = state['clock']()
+            if deadline is not None and deadline <= now:
+                start_calculation(state, reason)
+                return reason
+            # Wake up at least every second to notice a shutdown
+            timeout = 1.0 if deadline is None else min(deadline - now, 1.0)
+            state['condition'].wait(timeout)
+    return None
+
+
+def wait_for_first_calculation(global_state, shut_signal):
+    state = global_state['convergence']
+    with state['condition']:
+        while not state['calculated'] and not shut_signal.is_set():
+            state['condition'].wait(1.0)
+    return state['calculated']
+
+
+def convergence_metrics(global_state):
+    state = global_state['convergence']
+    with state['condition']:
+        holds = state['holds']
+        pending = None
+        if state['first_change'] is not None:
+            pending = state['clock']() - state['first_change']
+        return {
+            'calculations': state['calculations'],
+            'changes': state['changes'],
+            'reasons': dict(state['reasons']),
+            'first_calculation_after': state['first_calculation_after'],
+            'last_hold': state['last_hold'],
+            'mean_hold': state['total_hold'] / holds if holds > 0 else None,
+            'max_hold': state['max_hold'] if holds > 0 else None,
+            'pending_for': pending,
+            'waiting_for': sorted(state['waiting_for']),
+        }
+
+
+def format_convergence_metrics(metrics):
+    def seconds(value):
+        return '-' if value is None else f"{value:.2f}s"
+
+    reasons = ', '.join(f"{reason} {count}" for reason, count in sorted(metrics['reasons'].items())) or '-'
+    lines = [f"calculations: {metrics['calculations']} ({reasons})",
+             f"changes: {metrics['changes']}",
+             f"first calculation after: {seconds(metrics['first_calculation_after'])}",
+             f"hold before calculation: last {seconds(metrics['last_hold'])}, mean {seconds(metrics['mean_hold'])},"
+             f" max {seconds(metrics['max_hold'])}",
+             f"changes pending for: {seconds(metrics['pending_for'])}"]
+    if metrics['waiting_for']:
+        lines.append(f"waiting for neighbors: {' '.join(metrics['waiting_for'])}")
+    return '\n'.join(lines)
@@ -0,0 +1,268 @@
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+# Link-state cost matrices stored in flat arrays of doubles instead of dicts of dicts.
+# Both variants map node IDs to row/column indices and behave like the old
+# {src: {dest: cost}} tables: matrix[src][dest], matrix[src] = {dest: cost, ...},
+# keys()/items()/values(), `in` and len() all work on them.
+# Nodes are added on demand with add_node(); indices never change once assigned.
+
+INF = float('inf')
+# Smallest row stride of a dense matrix
+MIN_CAPACITY = 16
+
+
+class CostRow(Mapping):
+    # Live view of one row. Unknown node IDs raise KeyError, known ones without a link give inf
+    def __init__(self, matrix, row):
+        self.matrix = matrix
+        self.row = row
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __contains__(self, dest):
+        return dest in self.matrix.index
+
+    def __eq__(self, other):
+        # Rows are equal when they give every node the same cost; missing entries count as inf
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        mine = {dest: cost for dest, cost in self.items() if cost != INF}
+        theirs = {dest: cost for dest, cost in other.items() if cost != INF}
+        return mine == theirs
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class DenseRow(CostRow):
+    def __getitem__(self, dest):
+        return self.matrix.rows[self.row][self.matrix.index[dest]]
+
+    def __setitem__(self, dest, cost):
+        self.matrix.writable(self.row)[self.matrix.index[dest]] = cost
+
+    def get(self, dest, default=None):
+        column = self.matrix.index.get(dest)
+        if column is None:
+            return default
+        return self.matrix.rows[self.row][column]
+
+    def keys(self):
+        return self.matrix.index.keys()
+
+    def values(self):
+        return self.matrix.rows[self.row][:self.matrix.size]
+
+    def items(self):
+        return zip(self.matrix.nodes, self.values())
+
+
+class DenseCostMatrix(Mapping):
+    # V x V doubles, one array('d') per row: 8 bytes per entry instead of a dict slot plus a float
+    # object. Rows are `capacity` entries long and the capacity doubles when full, so adding a node
+    # reallocates the rows only O(log V) times; unused entries stay inf.
+    # Copies share the row arrays: after copy(), a row is copied the first time either matrix
+    # writes it, so a copy costs O(V) and the rows changed since, not the whole matrix
+    def __init__(self, nodes, capacity=MIN_CAPACITY):
+        self.nodes = []
+        self.index = {}
+        self.size = 0
+        self.capacity = max(capacity, 1)
+        nodes = list(nodes)
+        while self.capacity < len(nodes):
+            self.capacity *= 2
+        self.rows = []
+        # Rows no copy shares, written in place
+        self.owned = set()
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node):
+        if node in self.index:
+            return self.index[node]
+        if self.size == self.capacity:
+            self._grow(2 * self.capacity)
+        self.index[node] = self.size
+        self.nodes.append(node)
+        self.rows.append(array('d', [INF]) * self.capacity)
+        self.owned.add(self.size)
+        self.size += 1
+        return self.size - 1
+
+    def _grow(self, capacity):
+        padding = array('d', [INF]) * (capacity - self.capacity)
+        self.rows = [row + padding for row in self.rows]
+        self.owned = set(range(self.size))
+        self.capacity = capacity
+
+    def writable(self, row):
+        # The row's array, copied first while a copy of the matrix shares it
+        if row not in self.owned:
+            self.rows[row] = array('d', self.rows[row])
+            self.owned.add(row)
+        return self.rows[row]
+
+    def __getitem__(self, src):
+        return DenseRow(self, self.index[src])
+
+    def __setitem__(self, src, row):
+        values = array('d', [INF]) * self.capacity
+        index = self.index
+        for dest, cost in row.items():
+            values[index[dest]] = cost
+        row_index = index[src]
+        self.rows[row_index] = values
+        self.owned.add(row_index)
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, src):
+        return src in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def copy(self):
+        # From now on both matrices share every row, the next write to one copies it
+        clone = DenseCostMatrix.__new__(DenseCostMatrix)
+        clone.nodes, clone.index = list(self.nodes), dict(self.index)
+        clone.size, clone.capacity = self.size, self.capacity
+        clone.rows, clone.owned = list(self.rows), set()
+        self.owned = set()
+        return clone
+
+
+class SparseRow(CostRow):
+    # Only finite links are stored, so keys()/items() list just the reachable destinations
+    def _find(self, dest):
+        column = self.matrix.index[dest]
+        columns = self.matrix.columns[self.row]
+        position = bisect_left(columns, column)
+        return column, position, position < len(columns) and columns[position] == column
+
+    def __getitem__(self, dest):
+        _, position, found = self._find(dest)
+        return self.matrix.costs[self.row][position] if found else INF
+
+    def __setitem__(self, dest, cost):
+        # Row arrays are replaced, never changed in place, so copies of the matrix can share them
+        column, position, found = self._find(dest)
+        columns, costs = array('i', self.matrix.columns[self.row]), array('d', self.matrix.costs[self.row])
+        if cost == INF:
+            if not found:
+                return
+            del columns[position]
+            del costs[position]
+        elif found:
+            costs[position] = cost
+        else:
+            columns.insert(position, column)
+            costs.insert(position, cost)
+        self.matrix.columns[self.row], self.matrix.costs[self.row] = columns, costs
+
+    def get(self, dest, default=None):
+        if dest not in self.matrix.index:
+            return default
+        return self[dest]
+
+    def keys(self):
+        nodes = self.matrix.nodes
+        return dict.fromkeys(map(nodes.__getitem__, self.matrix.columns[self.row])).keys()
+
+    def values(self):
+        return self.matrix.costs[self.row]
+
+    def items(self):
+        return zip(map(self.matrix.nodes.__getitem__, self.matrix.columns[self.row]), self.matrix.costs[self.row])
+
+
+class SparseCostMatrix(Mapping):
+    # Compressed sparse rows: per row, sorted column indices (array('i')) and their costs (array('d')).
+    # Memory is proportional to the number of links, which suits large low-degree topologies.
+    def __init__(self, nodes):
+        self.nodes = []
+        self.index = {}
+        self.columns = []
+        self.costs = []
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node):
+        if node in self.index:
+            return self.index[node]
+        self.index[node] = len(self.nodes)
+        self.nodes.append(node)
+        self.columns.append(array('i'))
+        self.costs.append(array('d'))
+        return len(self.nodes) - 1
+
+    def __getitem__(self, src):
+        return SparseRow(self, self.index[src])
+
+    def __setitem__(self, src, row):
+        index = self.index
+        links = sorted((index[dest], cost) for dest, cost in row.items() if cost != INF)
+        row_index = index[src]
+        self.columns[row_index] = array('i', [column for column, _ in links])
+        self.costs[row_index] = array('d', [cost for _, cost in links])
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, src):
+        return src in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    def csr(self):
+        # Classic CSR arrays (indptr, indices, data) for bulk consumers
+        indptr = array('q', [0])
+        indices, data = array('i'), array('d')
+        for columns, costs in zip(self.columns, self.costs):
+            indices.extend(columns)
+            data.extend(costs)
+            indptr.append(len(indices))
+        return indptr, indices, data
+
+    def copy(self):
+        # Rows are copy-on-write (see SparseRow.__setitem__), so the copy shares the row arrays
+        clone = SparseCostMatrix.__new__(SparseCostMatrix)
+        clone.nodes, clone.index = list(self.nodes), dict(self.index)
+        clone.columns, clone.costs = list(self.columns), list(self.costs)
+        return clone
+
+
+def convert_cost_matrix(matrix, kind):
+    # Same costs in the other storage variant, node indices are kept
+    converted = make_cost_matrix(matrix.nodes, kind)
+    for src in matrix.nodes:
+        converted[src] = matrix[src]
+    return converted
+
+
+def make_cost_matrix(nodes, kind='dense'):
+    if kind == 'dense':
+        return DenseCostMatrix(nodes)
+    if kind == 'sparse':
+        return SparseCostMatrix(nodes)
+    raise ValueError(f"unknown cost matrix kind {kind!r}")
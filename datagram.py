@@ -0,0 +1,162 @@
+import logging
+import socket
+import struct
+import threading
+import time
+
+# A node's UDP socket, bound to its own port number, for hellos and (with TRANSPORT = 'udp') routing
+# messages. Each message goes out as one or more datagrams of at most MAX_PAYLOAD bytes, each with
+#
+#   magic 'RU', version, channel, sender epoch, sequence, fragment index, fragment count
+#
+# Channels keep hellos and routing messages apart. Sequence numbers count the messages a socket sent
+# on a channel and the epoch tells a restarted sender apart, so a receiver drops a message that is
+# older than one it already delivered or started to reassemble from the same sender: stale or
+# reordered messages are never delivered, and a message that lost a fragment is given up once a
+# newer one arrives. Nothing is retransmitted; routing messages are sent again periodically anyway.
+# A failing handler is logged to `log`, the node's logger (node_log.py).
+
+MAGIC = b'RU'
+VERSION = 1
+HEADER = struct.Struct('<2sBBQIHH')
+CHANNEL_HELLO = 0
+CHANNEL_ROUTING = 1
+# Nodes talk over localhost, whose MTU is 64 KiB, so most tables fit one datagram. Between
+# machines use 1400: an Ethernet frame with the IP and UDP headers, never fragmented by IP
+MAX_PAYLOAD = 60000
+# Large tables arrive as bursts of datagrams, which the default receive buffer would drop
+RECEIVE_BUFFER = 4 * 1024 * 1024
+# Longest wait of the receiving thread, so it notices close() without a datagram arriving
+POLL_TIMEOUT = 1.0
+
+
+class DatagramSocket:
+    def __init__(self, port_id, host='localhost', max_payload=MAX_PAYLOAD, log=None):
+        self.host = host
+        self.log = log or logging.getLogger(__name__)
+        self.max_payload = max_payload
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        self.sock.bind((host, port_id))
+        self.sock.settimeout(POLL_TIMEOUT)
+        self.epoch = time.time_ns()
+        self.lock = threading.Lock()
+        self.sequences = {}
+        # {channel: handler(payload)}, called on the receiving thread
+        self.handlers = {}
+        # Per (sender address, channel): (epoch, sequence) of the newest message delivered,
+        # and the message being reassembled: [epoch, sequence, count, {index: fragment}]
+        self.delivered = {}
+        self.partial = {}
+        self.stopped = threading.Event()
+        # Metrics
+        self.sent_messages = 0
+        self.sent_datagrams = 0
+        self.send_errors = 0
+        self.received_messages = 0
+        self.stale = 0
+        self.incomplete = 0
+        self.malformed = 0
+        self.thread = threading.Thread(target=self.receive_loop, daemon=True)
+        self.thread.start()
+
+    def on(self, channel, handler):
+        self.handlers[channel] = handler
+
+    def send(self, port, payload, channel=CHANNEL_ROUTING):
+        # Same contract as transport.ConnectionPool.send: returns False if it could not be sent
+        return self.send_to([port], payload, channel) == 1
+
+    def send_to(self, ports, payload, channel=CHANNEL_ROUTING):
+        # One message to several ports, the fragments are cut once; returns how many were sent whole
+        with self.lock:
+            sequence = self.sequences.get(channel, 0) + 1
+            self.sequences[channel] = sequence
+        view = memoryview(payload)
+        count = max(1, -(-len(view) // self.max_payload))
+        if count > 0xFFFF:
+            raise ValueError(f"message of {len(view)} bytes needs more than {0xFFFF} datagrams")
+        fragments = [(HEADER.pack(MAGIC, VERSION, channel, self.epoch, sequence, index, count),
+                      view[index * self.max_payload:(index + 1) * self.max_payload])
+                     for index in range(count)]
+        sent = 0
+        for port in ports:
+            try:
+                for header, chunk in fragments:
+                    # Scatter-gather, so the fragment is not copied behind its header
+                    self.sock.sendmsg([header, chunk], [], 0, (self.host, port))
+            except OSError:
+                with self.lock:
+                    self.send_errors += 1
+                continue
+            sent += 1
+        with self.lock:
+            self.sent_messages += sent
+            self.sent_datagrams += sent * count
+        return sent
+
+    def receive_loop(self):
+        buffer = bytearray(65536)
+        view = memoryview(buffer)
+        while not self.stopped.is_set():
+            try:
+                size, address = self.sock.recvfrom_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # closed
+            payload = self.receive(view[:size], address)
+            if payload is None:
+                continue
+            channel, message = payload
+            handler = self.handlers.get(channel)
+            if handler is None:
+                continue
+            try:
+                handler(message)
+            except Exception:
+                self.log.exception("Failed to handle a datagram message")
+
+    def receive(self, data, address):
+        # Adds a datagram, returns (channel, message) when it completes a message
+        if len(data) < HEADER.size:
+            self.malformed += 1
+            return None
+        magic, version, channel, epoch, sequence, index, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or index >= count:
+            self.malformed += 1
+            return None
+        key = (address, channel)
+        order = (epoch, sequence)
+        if key in self.delivered and order <= self.delivered[key]:
+            self.stale += 1
+            return None
+
+        partial = self.partial.get(key)
+        if partial is None or order > (partial[0], partial[1]):
+            if partial is not None:
+                self.incomplete += 1
+            partial = self.partial[key] = [epoch, sequence, count, {}]
+        elif order < (partial[0], partial[1]) or count != partial[2]:
+            self.stale += 1
+            return None
+        partial[3][index] = bytes(data[HEADER.size:])
+        if len(partial[3]) < count:
+            return None
+
+        del self.partial[key]
+        self.delivered[key] = order
+        self.received_messages += 1
+        parts = partial[3]
+        return channel, parts[0] if count == 1 else b''.join(parts[i] for i in range(count))
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+        self.sock.close()
+
+    def metrics(self):
+        with self.lock:
+            return {'sent_messages': self.sent_messages, 'sent_datagrams': self.sent_datagrams,
+                    'send_errors': self.send_errors, 'received_messages': self.received_messages,
+                    'stale': self.stale, 'incomplete': self.incomplete, 'malformed': self.malformed}
@@ -0,0 +1,492 @@
+import argparse
+import contextlib
+import heapq
+import math
+import os
+import random
+import sys
+import time
+
+import COMP3221_A1_Routing as dv
+import Routing as ls
+from convergence import next_calculation, note_change, take_due_calculation
+from spf import shortest_paths
+from wire import encode_dv_change
+
+# A whole network in one process, as a deterministic discrete-event emulation: no sockets, no
+# threads and no real sleeps, so a topology converges in a fraction of the time run.sh takes.
+# Every node is the real node state (init_global_state of Routing.py or COMP3221_A1_Routing.py),
+# driven by the emulator in place of the node's threads:
+#   - the clock is virtual: global_state['clock'] returns the emulator's time
+#   - links are in memory: a message is encoded as for the wire, counted, and decoded by the
+#     neighbor LATENCY seconds later
+#   - sending, route calculations and timers are events at the moments the threads would act
+# Events at the same moment run in the order they were scheduled and the only random choice (when
+# each node starts) comes from a seeded generator, so a run always gives the same results.
+# Hellos are not emulated one by one: the neighbors of a failed node notice it a dead interval
+# after its last hello (or NEIGHBOR_TIMEOUT after its last message when hellos are off).
+# Topologies are config directories, <node>config.txt per node as for run.sh; ports are ignored
+# and the config files are never written. A link only one end lists is as for the real nodes: the
+# other end drops what comes over it, and the end that lists it times it out after NEIGHBOR_TIMEOUT.
+
+# Seconds a message spends on a link
+LATENCY = 0.001
+# Nodes start at random moments within this many seconds
+START_SPREAD = 1.0
+# A scenario has converged once no route changed for this many seconds, it is given up after MAX_PHASE
+SETTLE = 60.0
+MAX_PHASE = 3600.0
+SEED = 3221
+# Routes checked against a shortest path calculation over the whole topology, from this many nodes
+VERIFY_SOURCES = 20
+
+INF = float('inf')
+
+
+def read_topology(config_dir, ports=None):
+    # {node: (config file path, {neighbor: cost})}; ports, if given, gets {node: port} as the
+    # neighbors list them (the launcher reads config directories through here too)
+    topology = {}
+    for name in sorted(os.listdir(config_dir)):
+        if not name.endswith('config.txt'):
+            continue
+        path = os.path.join(config_dir, name)
+        with open(path) as file:
+            num_neighbors = int(file.readline().strip())
+            links = {}
+            for _ in range(num_neighbors):
+                neighbor, cost, port = file.readline().split()
+                links[neighbor] = float(cost)
+                if ports is not None:
+                    ports[neighbor] = int(port)
+        topology[name[:-len('config.txt')]] = (path, links)
+    return topology
+
+
+class Emulator:
+    def __init__(self, seed=SEED, latency=LATENCY):
+        self.now = 0.0
+        # (time, sequence, action, args); the sequence keeps events at the same time in order
+        self.queue = []
+        self.sequence = 0
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.started = set()
+        self.failed = set()
+        self.last_change = 0.0
+        # Metrics
+        self.messages = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.events = 0
+
+    def clock(self):
+        return self.now
+
+    def at(self, moment, action, *args):
+        self.sequence += 1
+        heapq.heappush(self.queue, (moment, self.sequence, action, args))
+
+    def after(self, delay, action, *args):
+        self.at(self.now + delay, action, *args)
+
+    def changed(self):
+        # A node's routes changed
+        self.last_change = self.now
+
+    def send(self, dest, data, deliver):
+        # deliver(dest, data) runs once the message arrives, unless dest is not running by then
+        self.messages += 1
+        self.bytes += len(data)
+        self.after(self.latency, self.arrive, dest, data, deliver)
+
+    def arrive(self, dest, data, deliver):
+        if dest not in self.started or dest in self.failed:
+            self.dropped += 1
+            return
+        deliver(dest, data)
+
+    def run_phase(self):
+        # Runs until no route changed for SETTLE seconds. Returns the time from the start of the
+        # phase to the last change, or None if the routes still changed after MAX_PHASE
+        start = self.last_change = self.now
+        while self.queue:
+            moment = self.queue[0][0]
+            if moment > self.last_change + SETTLE:
+                break
+            if moment > start + MAX_PHASE:
+                return None
+            _, _, action, args = heapq.heappop(self.queue)
+            self.now = moment
+            self.events += 1
+            action(*args)
+        self.now = max(self.now, self.last_change + SETTLE)
+        return self.last_change - start
+
+
+class VirtualTimers:
+    # timer_wheel.TimerWheel's arm and cancel on the emulator's clock: every deadline is an event,
+    # and one whose key was rearmed or cancelled since is ignored
+    def __init__(self, emulator, on_expire):
+        self.emulator = emulator
+        self.on_expire = on_expire
+        self.deadlines = {}
+
+    def arm(self, key, timeout):
+        deadline = self.emulator.now + timeout
+        self.deadlines[key] = deadline
+        self.emulator.at(deadline, self.expire, key, deadline)
+
+    def cancel(self, key):
+        self.deadlines.pop(key, None)
+
+    def deadline(self, key):
+        return self.deadlines.get(key)
+
+    def expire(self, key, deadline):
+        if self.deadlines.get(key) != deadline:
+            return
+        del self.deadlines[key]
+        self.on_expire(key)
+
+    def close(self):
+        self.deadlines.clear()
+
+
+class MemoryConfigWriter:
+    # persistence.ConfigWriter's interface, without ever writing the config file
+    def __init__(self):
+        self.costs = {}
+
+    def set_cost(self, neighbor_id, cost):
+        self.costs[neighbor_id] = cost
+
+    def close(self):
+        pass
+
+
+class Network:
+    # The nodes of one protocol on an emulator. Subclasses start and drive the nodes
+    module = None
+
+    def __init__(self, emulator, config_dir):
+        self.emulator = emulator
+        self.topology = read_topology(config_dir)
+        # The links both ends list, as they are now, for checking the routes
+        self.links = {node: {neighbor: cost for neighbor, cost in links.items()
+                             if node in self.topology.get(neighbor, ('', {}))[1]}
+                      for node, (_, links) in self.topology.items()}
+        self.nodes = {}
+
+    def start(self):
+        for node in self.topology:
+            self.emulator.at(self.emulator.rng.uniform(0, START_SPREAD), self.start_node, node)
+
+    def start_node(self, node):
+        raise NotImplementedError
+
+    def new_state(self, node, global_state):
+        # Link changes stay in memory, without a writer thread per node
+        global_state['config_writer'].close()
+        global_state['config_writer'] = MemoryConfigWriter()
+        if self.module.HELLO_INTERVAL > 0:
+            # As if the first hello of every neighbor that lists this node had just arrived
+            for neighbor_id in self.links[node]:
+                global_state['neighbors'][neighbor_id]['dead_interval'] = self.module.HELLO_INTERVAL * self.module.DEAD_MULTIPLIER
+        self.emulator.started.add(node)
+        return global_state
+
+    def one_sided(self, node):
+        # Neighbors of node that do not list it: never heard from, they time out
+        return [neighbor for neighbor in self.topology[node][1] if neighbor not in self.links[node]]
+
+    def detection_delay(self):
+        # From a failure until a neighbor notices it through hellos: the dead interval from the
+        # last hello, which went out less than a hello interval before the failure
+        interval = self.module.HELLO_INTERVAL
+        return interval * self.module.DEAD_MULTIPLIER - self.emulator.rng.uniform(0, interval)
+
+    def change(self, src, dest, cost):
+        self.links[src][dest] = self.links[dest][src] = cost
+
+    def fail(self, node):
+        self.emulator.failed.add(node)
+        for neighbor in self.links.pop(node):
+            del self.links[neighbor][node]
+
+    def false_down(self, node, neighbor, back_after):
+        # node takes neighbor for down while the link is up (its hellos were lost, or it stalled),
+        # and hears its hellos again back_after seconds later
+        raise NotImplementedError
+
+    def distances(self, node):
+        raise NotImplementedError
+
+    def verify(self, sources=VERIFY_SOURCES):
+        # Number of routes, from a sample of the running nodes, that differ from the shortest paths
+        alive = sorted(node for node in self.links if node in self.nodes)
+        sample = random.Random(len(alive)).sample(alive, min(sources, len(alive)))
+        wrong = 0
+        for source in sample:
+            expected, _ = shortest_paths(self.links, source)
+            distances = self.distances(source)
+            for dest in alive:
+                if dest != source and not same_distance(expected[dest], distances.get(dest, INF)):
+                    wrong += 1
+        return wrong
+
+
+def same_distance(expected, got):
+    # Costs travel as float32 and distances are rounded, so only nearly equal
+    if expected == INF or got == INF:
+        return expected == got
+    return math.isclose(expected, got, rel_tol=1e-5, abs_tol=1e-3)
+
+
+class LinkStateNetwork(Network):
+    # Routing.py: advertisements every SEND_INTERVAL, calculations when the convergence detector says so
+    module = ls
+
+    def __init__(self, emulator, config_dir):
+        super().__init__(emulator, config_dir)
+        self.results = {}
+        self.calculation_at = {}
+
+    def start_node(self, node):
+        path = self.topology[node][0]
+        self.nodes[node] = self.new_state(node, ls.init_global_state(node, path, clock=self.emulator.clock))
+        self.results[node] = None
+        for neighbor in self.one_sided(node):
+            self.emulator.after(ls.NEIGHBOR_TIMEOUT, self.neighbor_down, node, neighbor)
+        self.send_advertisements(node)
+        self.schedule_calculation(node)
+
+    def send_advertisements(self, node):
+        if node in self.emulator.failed:
+            return
+        global_state = self.nodes[node]
+        for neighbor_id in global_state['neighbors']:
+            self.emulator.send(neighbor_id, ls.build_advertisement(global_state, neighbor_id), self.receive)
+        self.emulator.after(ls.SEND_INTERVAL, self.send_advertisements, node)
+
+    def receive(self, node, data):
+        global_state = self.nodes[node]
+        # Drops what the node would drop, advertisements from nodes it does not list among others
+        message = ls.decode_received(data, global_state)
+        if message is None:
+            return
+        ls.advertisement_received(global_state, message['sender'])
+        if ls.merge_advertisement(message, global_state, self.topology[node][0]) > 0:
+            note_change(global_state)
+        self.schedule_calculation(node)
+
+    def schedule_calculation(self, node):
+        deadline, _ = next_calculation(self.nodes[node]['convergence'])
+        if deadline is None:
+            return
+        deadline = max(deadline, self.emulator.now)
+        # An earlier check finds the calculation not due yet and schedules the next one itself
+        pending = self.calculation_at.get(node)
+        if pending is not None and pending <= deadline:
+            return
+        self.calculation_at[node] = deadline
+        self.emulator.at(deadline, self.calculate, node, deadline)
+
+    def calculate(self, node, deadline):
+        if self.calculation_at.get(node) != deadline or node in self.emulator.failed:
+            return
+        del self.calculation_at[node]
+        global_state = self.nodes[node]
+        if take_due_calculation(global_state) is not None:
+            _, distances, _ = ls.calculate_routes(global_state)
+            if distances != self.results[node]:
+                self.results[node] = distances
+                self.emulator.changed()
+        self.schedule_calculation(node)
+
+    def change(self, src, dest, cost):
+        # The change command of src; dest takes the new cost from src's next advertisement
+        super().change(src, dest, cost)
+        global_state = self.nodes[src]
+        ls.update_link_cost(src, dest, cost, global_state, self.topology[src][0])
+        self.schedule_calculation(src)
+
+    def fail(self, node):
+        neighbors = list(self.links[node])
+        super().fail(node)
+        for neighbor in neighbors:
+            if neighbor not in self.nodes:
+                continue
+            if ls.HELLO_INTERVAL > 0:
+                delay = self.detection_delay()
+            else:
+                info = self.nodes[neighbor]['neighbors'][node]
+                delay = max(info['last_received'] + ls.NEIGHBOR_TIMEOUT - self.emulator.now, 0)
+            self.emulator.after(delay, self.neighbor_down, neighbor, node)
+
+    def neighbor_down(self, node, neighbor):
+        if node in self.emulator.failed:
+            return
+        ls.mark_neighbor_down(self.nodes[node], neighbor, self.emulator.now)
+        self.schedule_calculation(node)
+
+    def false_down(self, node, neighbor, back_after):
+        self.neighbor_down(node, neighbor)
+        self.emulator.after(back_after, self.hello, node, neighbor)
+
+    def hello(self, node, neighbor):
+        if node in self.emulator.failed:
+            return
+        ls.hello_received(self.nodes[node], neighbor, ls.HELLO_INTERVAL * ls.DEAD_MULTIPLIER)
+        self.schedule_calculation(node)
+
+    def distances(self, node):
+        return self.nodes[node].get('shortest_distances', {})
+
+
+class DistanceVectorNetwork(Network):
+    # COMP3221_A1_Routing.py: tables every SEND_INTERVAL and triggered by changes, timers for
+    # neighbors and hold-downs
+    module = dv
+
+    def __init__(self, emulator, config_dir):
+        super().__init__(emulator, config_dir)
+        self.send_at = {}
+
+    def start_node(self, node):
+        path = self.topology[node][0]
+
+        def timers(on_expire, log=None):
+            return VirtualTimers(self.emulator, lambda key: self.timer_expired(node, on_expire, key))
+        global_state = self.new_state(node, dv.init_global_state(node, path, self.emulator.clock, timers))
+        self.nodes[node] = global_state
+        timed = global_state['neighbors'] if dv.HELLO_INTERVAL <= 0 else self.one_sided(node)
+        for neighbor_id in timed:
+            global_state['timers'].arm(('neighbor', neighbor_id), dv.NEIGHBOR_TIMEOUT)
+        self.schedule_send(node, self.emulator.now)
+
+    def timer_expired(self, node, on_expire, key):
+        if node not in self.emulator.failed:
+            self.after_update(node, on_expire(key))
+
+    def after_update(self, node, changed):
+        if changed:
+            self.emulator.changed()
+        if self.nodes[node]['updates']['triggered']:
+            self.schedule_send(node, self.emulator.now)
+
+    def schedule_send(self, node, moment):
+        pending = self.send_at.get(node)
+        if pending is not None and pending <= moment:
+            return
+        self.send_at[node] = moment
+        self.emulator.at(moment, self.send_tables, node, moment)
+
+    def send_tables(self, node, moment):
+        # One turn of sending_routing_table
+        if self.send_at.get(node) != moment or node in self.emulator.failed:
+            return
+        del self.send_at[node]
+        global_state = self.nodes[node]
+        due, _ = dv.due_neighbors(global_state, self.emulator.now)
+        if due:
+            global_state['updates']['triggered'].difference_update(due)
+            dv.send_tables(node, global_state, due,
+                           lambda neighbor_id, message: self.emulator.send(neighbor_id, message, self.receive))
+        _, wait = dv.due_neighbors(global_state, self.emulator.now)
+        self.schedule_send(node, self.emulator.now + wait)
+
+    def receive(self, node, data):
+        global_state = self.nodes[node]
+        self.after_update(node, dv.receive_message(node, data, global_state, self.topology[node][0]))
+
+    def change(self, src, dest, cost):
+        # The change command of src: the neighbor is told first, then src changes its own end
+        super().change(src, dest, cost)
+        global_state = self.nodes[src]
+        self.emulator.send(dest, encode_dv_change(src, cost), self.receive)
+        dv.change_link_cost(src, dest, cost, global_state, self.topology[src][0])
+        self.after_update(src, True)
+
+    def fail(self, node):
+        neighbors = list(self.links[node])
+        super().fail(node)
+        if dv.HELLO_INTERVAL <= 0:
+            # The neighbors' timers run out by themselves once the tables stop
+            return
+        for neighbor in neighbors:
+            if neighbor in self.nodes:
+                self.nodes[neighbor]['timers'].arm(('neighbor', node), self.detection_delay())
+
+    def false_down(self, node, neighbor, back_after):
+        self.after_update(node, dv.neighbor_timed_out(node, self.nodes[node], neighbor))
+        self.emulator.after(back_after, self.hello, node, neighbor)
+
+    def hello(self, node, neighbor):
+        if node not in self.emulator.failed:
+            dv.hello_received(self.nodes[node], neighbor, dv.HELLO_INTERVAL * dv.DEAD_MULTIPLIER)
+
+    def distances(self, node):
+        return {des: route['distance'] for des, route in self.nodes[node]['routing_table'].items()}
+
+
+NETWORKS = {'ls': LinkStateNetwork, 'dv': DistanceVectorNetwork}
+
+
+def run(config_dir, protocol, scenarios, seed=SEED):
+    # scenarios: [(label, function(network))] run one after another once the previous one settled,
+    # after the start of every node. Returns one result per scenario, the start first
+    emulator = Emulator(seed)
+    network = NETWORKS[protocol](emulator, config_dir)
+    results = []
+    with open(os.devnull, 'w') as devnull:
+        for label, action in [('start', Network.start)] + list(scenarios):
+            messages, sent_bytes = emulator.messages, emulator.bytes
+            start = time.perf_counter()
+            # The nodes print as they would on a terminal
+            with contextlib.redirect_stdout(devnull):
+                action(network)
+                converged = emulator.run_phase()
+            wall = time.perf_counter() - start
+            results.append({'label': label, 'converged': converged, 'messages': emulator.messages - messages,
+                            'bytes': emulator.bytes - sent_bytes, 'wall': wall, 'wrong': network.verify()})
+    return results
+
+
+def format_result(result):
+    converged = f"{result['converged']:8.2f}s" if result['converged'] is not None else f"not within {MAX_PHASE:g}s"
+    wrong = 'routes ok' if result['wrong'] == 0 else f"{result['wrong']} wrong routes"
+    return (f"{result['label']:<16} converged after {converged} | {result['messages']:>9,} messages,"
+            f" {result['bytes'] / 1e6:9.2f} MB | {result['wall']:7.2f}s wall | {wrong}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Converge a topology in an in-process emulation")
+    parser.add_argument('config_dir', help="directory with a <node>config.txt per node")
+    parser.add_argument('--protocol', choices=sorted(NETWORKS), nargs='+', default=sorted(NETWORKS))
+    parser.add_argument('--change', nargs=3, action='append', default=[], metavar=('SRC', 'DEST', 'COST'),
+                        help="change the cost of a link once the network has converged")
+    parser.add_argument('--fail', action='append', default=[], metavar='NODE',
+                        help="stop a node once the network has converged")
+    parser.add_argument('--seed', type=int, default=SEED)
+    args = parser.parse_args(argv)
+
+    topology = read_topology(args.config_dir)
+    scenarios = []
+    for src, dest, cost in args.change:
+        if dest not in topology.get(src, ('', {}))[1]:
+            parser.error(f"no link {src}-{dest} in {args.config_dir}")
+        scenarios.append((f"change {src}-{dest}", lambda network, src=src, dest=dest, cost=float(cost): network.change(src, dest, cost)))
+    for node in args.fail:
+        if node not in topology:
+            parser.error(f"no node {node} in {args.config_dir}")
+        scenarios.append((f"fail {node}", lambda network, node=node: network.fail(node)))
+
+    for protocol in args.protocol:
+        print(f"{protocol}, {len(topology)} nodes:")
+        for result in run(args.config_dir, protocol, scenarios, args.seed):
+            print(f"  {format_result(result)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,51 +1,196 @@
+import argparse
+import math
+import os
 import random
-import networkx as nx
-import matplotlib.pyplot as plt
 import sys
+import time
 
-if len(sys.argv) != 2:
-    print("Usage: python3 graph_generator.py <dir_path>")
-dir = sys.argv[1]
-
-# Generate a graph with 10 nodes
-G = nx.Graph()
-nodes = [chr(i) for i in range(65, 75)]  # ASCII codes for A to J
-G.add_nodes_from(nodes)
-
-# Add 15-20 random edges with random weights between 0 to 10
-num_edges = random.randint(15, 20)
-for _ in range(num_edges):
-    # Select two different nodes
-    u = random.choice(list(G.nodes))
-    v = random.choice(list(G.nodes))
-    while u == v or G.has_edge(u, v):
-        u = random.choice(list(G.nodes))
-        v = random.choice(list(G.nodes))
-    # Generate a random weight
-    weight = round(random.uniform(0, 10),1)
-    # Add the edge with the weight
-    G.add_edge(u, v, weight=weight)
-
-# Draw the graph
-pos = nx.spring_layout(G)  # positions for all nodes
-edges = G.edges(data=True)
-
-
-nx.draw(G, pos, with_labels=True, node_size=700, node_color="skyblue", alpha=0.6)
-nx.draw_networkx_edge_labels(G, pos, edge_labels={(u, v): d['weight'] for u, v, d in edges})
-plt.title(f"Graph with 10 Nodes and {num_edges} Edges")
-plt.axis('off')
-plt.savefig(f"{dir}/graph.png", format="PNG")
-
-node_info = {}
-
-for node in G.nodes():
-    neighbors = G[node] 
-    node_info[node] = {neighbor: data['weight'] for neighbor, data in neighbors.items()}
-
-for label in nodes:
-    f = open(f"{dir}/{label}config.txt", "w")
-    f.write(f"{len(node_info[label])}\n")
-    neighbours = node_info[label]
-    for neighbour in neighbours:
-        f.write(f"{neighbour} {neighbours[neighbour]} {ord(neighbour)-65+6000}\n")
\ No newline at end of file
+# Writes a random topology as config files, <node>config.txt per node, for the nodes, run.sh or
+# the emulator. Every model gives a connected graph:
+#   - random: a random tree over all nodes, plus random links up to the average degree
+#   - grid: rows of nodes linked to their left and upper neighbors
+#   - ba: Barabasi-Albert, each node links to degree / 2 earlier nodes, preferring well-linked ones
+#   - ring: every node linked to the next, plus random chords up to the average degree
+# The links are kept as one small dict per node and each config file is written as soon as it
+# is formatted, so large topologies need neither networkx nor the whole output in memory.
+# Up to 26 nodes are named A to Z like the configs in this folder, larger topologies N0, N1, ...
+# Node i listens on port BASE_PORT + i.
+
+BASE_PORT = 6000
+MAX_PORT = 65535
+MIN_COST = 0.1
+MAX_COST = 10.0
+# Edge costs are only drawn on plots up to this many nodes
+LABELLED_PLOT_NODES = 50
+
+
+def node_names(num_nodes):
+    if num_nodes <= 26:
+        return [chr(ord('A') + i) for i in range(num_nodes)]
+    return [f"N{i}" for i in range(num_nodes)]
+
+
+class Topology:
+    # links[i]: {j: cost} for the nodes numbered 0 .. num_nodes - 1
+    def __init__(self, num_nodes, rng):
+        self.rng = rng
+        self.links = [{} for _ in range(num_nodes)]
+        self.num_links = 0
+
+    def link(self, u, v, cost=None):
+        # Returns False if the link is a loop or already there. The cost is random unless given
+        if u == v or v in self.links[u]:
+            return False
+        if cost is None:
+            cost = round(self.rng.uniform(MIN_COST, MAX_COST), 1)
+        self.links[u][v] = cost
+        self.links[v][u] = cost
+        self.num_links += 1
+        return True
+
+    def add_random_links(self, target):
+        # Random extra links until there are `target` links. Sparse graphs draw pairs until a new one
+        # comes up; denser ones pick from the pairs still missing, so this never spins on a full graph
+        num_nodes = len(self.links)
+        target = min(target, num_nodes * (num_nodes - 1) // 2)
+        if target - self.num_links <= (num_nodes * (num_nodes - 1) // 2 - self.num_links) // 2:
+            while self.num_links < target:
+                self.link(self.rng.randrange(num_nodes), self.rng.randrange(num_nodes))
+            return
+        missing = [(u, v) for u in range(num_nodes) for v in range(u + 1, num_nodes) if v not in self.links[u]]
+        for u, v in self.rng.sample(missing, target - self.num_links):
+            self.link(u, v)
+
+
+def random_model(num_nodes, degree, rng):
+    topology = Topology(num_nodes, rng)
+    # A random tree first: every node links to one of the nodes before it
+    for i in range(1, num_nodes):
+        topology.link(i, rng.randrange(i))
+    topology.add_random_links(round(num_nodes * degree / 2))
+    return topology
+
+
+def grid_model(num_nodes, degree, rng):
+    # As square as possible; the last row may be shorter, its nodes still have an upper neighbor
+    topology = Topology(num_nodes, rng)
+    columns = math.ceil(math.sqrt(num_nodes))
+    for i in range(num_nodes):
+        if i % columns > 0:
+            topology.link(i, i - 1)
+        if i >= columns:
+            topology.link(i, i - columns)
+    return topology
+
+
+def ba_model(num_nodes, degree, rng):
+    topology = Topology(num_nodes, rng)
+    per_node = max(1, round(degree / 2))
+    # Every node appears here once per link, so picking from it prefers well-linked nodes.
+    # All i earlier nodes are in it, so there are always enough to pick from
+    ends = [0]
+    for i in range(1, num_nodes):
+        wanted = min(per_node, i)
+        chosen = set()
+        while len(chosen) < wanted:
+            chosen.add(rng.choice(ends))
+        for j in chosen:
+            topology.link(i, j)
+            ends.extend((i, j))
+    return topology
+
+
+def ring_model(num_nodes, degree, rng):
+    topology = Topology(num_nodes, rng)
+    for i in range(num_nodes):
+        topology.link(i, (i + 1) % num_nodes)
+    topology.add_random_links(round(num_nodes * degree / 2))
+    return topology
+
+
+MODELS = {'random': random_model, 'grid': grid_model, 'ba': ba_model, 'ring': ring_model}
+
+
+def generate(model, num_nodes, degree, seed=None):
+    return MODELS[model](num_nodes, degree, random.Random(seed))
+
+
+def write_configs(directory, topology, names, base_port=BASE_PORT, ports=None):
+    # ports: each node's port, in place of base_port + i
+    os.makedirs(directory, exist_ok=True)
+    if ports is None:
+        ports = range(base_port, base_port + len(names))
+    for i, links in enumerate(topology.links):
+        lines = [f"{len(links)}\n"]
+        lines.extend(f"{names[j]} {cost} {ports[j]}\n" for j, cost in links.items())
+        # One write through a bare descriptor: with 100k files, opening dominates
+        fd = os.open(os.path.join(directory, f"{names[i]}config.txt"), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, ''.join(lines).encode())
+        finally:
+            os.close(fd)
+
+
+def plot(directory, topology, names, model):
+    # Nodes on a circle (on their grid for the grid model), saved as graph.png next to the configs
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("Plotting needs matplotlib, the config files were written without graph.png")
+        return
+    num_nodes = len(names)
+    if model == 'grid':
+        columns = math.ceil(math.sqrt(num_nodes))
+        positions = [(i % columns, -(i // columns)) for i in range(num_nodes)]
+    else:
+        positions = [(math.cos(2 * math.pi * i / num_nodes), math.sin(2 * math.pi * i / num_nodes))
+                     for i in range(num_nodes)]
+    labelled = num_nodes <= LABELLED_PLOT_NODES
+    plt.figure(figsize=(8, 8))
+    for u, links in enumerate(topology.links):
+        for v, cost in links.items():
+            if u < v:
+                (x1, y1), (x2, y2) = positions[u], positions[v]
+                plt.plot([x1, x2], [y1, y2], color='grey', linewidth=0.5, zorder=1)
+                if labelled:
+                    plt.text((x1 + x2) / 2, (y1 + y2) / 2, f"{cost}", fontsize=7)
+    xs, ys = zip(*positions)
+    plt.scatter(xs, ys, s=300 if labelled else 4, color='skyblue', zorder=2)
+    if labelled:
+        for name, (x, y) in zip(names, positions):
+            plt.text(x, y, name, ha='center', va='center', zorder=3)
+    plt.title(f"{model} graph with {num_nodes} nodes and {topology.num_links} edges")
+    plt.axis('off')
+    plt.savefig(os.path.join(directory, "graph.png"), format="PNG")
+    plt.close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Write a connected random topology as config files")
+    parser.add_argument('dir_path', help="directory for the config files, created if needed")
+    parser.add_argument('--nodes', type=int, default=10)
+    parser.add_argument('--model', choices=sorted(MODELS), default='random')
+    parser.add_argument('--degree', type=float, default=3.5, help="average links per node (grid: always up to 4)")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--base-port', type=int, default=BASE_PORT)
+    parser.add_argument('--plot', action='store_true', help="also draw the graph into graph.png (needs matplotlib)")
+    args = parser.parse_args(argv)
+    if args.nodes < 2:
+        parser.error("a topology needs at least 2 nodes")
+
+    start = time.perf_counter()
+    topology = generate(args.model, args.nodes, args.degree, args.seed)
+    names = node_names(args.nodes)
+    write_configs(args.dir_path, topology, names, args.base_port)
+    print(f"{args.model} graph with {args.nodes} nodes and {topology.num_links} edges written to {args.dir_path}"
+          f" in {time.perf_counter() - start:.2f}s")
+    if args.base_port + args.nodes - 1 > MAX_PORT:
+        print(f"Ports go above {MAX_PORT}: only the emulator (emulator.py) can run this topology")
+    if args.plot:
+        plot(args.dir_path, topology, names, args.model)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
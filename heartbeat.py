@@ -0,0 +1,64 @@
+import threading
+import time
+
+from datagram import CHANNEL_HELLO
+from wire import decode_hello, encode_hello
+
+# Hellos: small datagrams every `interval` seconds to each neighbor, next to the routing messages.
+# They go through the node's datagram.DatagramSocket, on its own channel, to the neighbors' port
+# numbers. Each hello carries interval * dead_multiplier, the time its neighbors should wait for the
+# next one before considering the sender down; a few lost datagrams are therefore tolerated.
+# While the node is disabled (active() is false) it neither sends hellos nor takes any in.
+
+HELLO_INTERVAL = 1.0
+DEAD_MULTIPLIER = 4
+
+
+class Heartbeat:
+    def __init__(self, node_id, datagrams, peers, on_hello, active=lambda: True,
+                 interval=HELLO_INTERVAL, dead_multiplier=DEAD_MULTIPLIER):
+        # peers: {neighbor id: port}; on_hello(neighbor_id, dead_interval) runs on the receiving thread
+        self.datagrams = datagrams
+        self.peers = dict(peers)
+        self.on_hello = on_hello
+        self.active = active
+        self.interval = interval
+        self.packet = encode_hello(node_id, interval * dead_multiplier)
+        self.stopped = threading.Event()
+        # Metrics
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        datagrams.on(CHANNEL_HELLO, self.receive)
+        self.thread = threading.Thread(target=self.send_loop, daemon=True)
+        self.thread.start()
+
+    def send_loop(self):
+        ports = list(self.peers.values())
+        next_send = time.monotonic()
+        while not self.stopped.is_set():
+            if self.active():
+                # A neighbor whose port is not open (yet) just misses this one
+                self.sent += self.datagrams.send_to(ports, self.packet, CHANNEL_HELLO)
+            # Fixed rate rather than fixed gaps, so slow sends do not stretch the interval
+            next_send = max(next_send + self.interval, time.monotonic())
+            self.stopped.wait(next_send - time.monotonic())
+
+    def receive(self, data):
+        try:
+            sender, dead_interval = decode_hello(data)
+        except ValueError:
+            self.dropped += 1
+            return
+        if sender not in self.peers or not self.active():
+            self.dropped += 1
+            return
+        self.received += 1
+        self.on_hello(sender, dead_interval)
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def metrics(self):
+        return {'interval': self.interval, 'sent': self.sent, 'received': self.received, 'dropped': self.dropped}
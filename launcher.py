@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import contextvars
+import os
+import resource
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from emulator import read_topology
+from node_log import current_node
+
+# Runs every node of a config directory (<node>config.txt per node) on this machine, in place of
+# one terminal per node (run.sh):
+#   - process mode: one interpreter per node, all started at once
+#   - inprocess mode: every node in this process; link-state nodes as async_node.AsyncNode tasks
+#     on one event loop, distance-vector nodes as the threads of COMP3221_A1_Routing.start_node
+# A node's port is the one its neighbors list for it. The output of every node comes out here,
+# each line prefixed with the node's ID. Commands typed here go to one node as "<node>: <command>"
+# or to every node as "*: <command>".
+# Ctrl-C, SIGTERM or the end of --duration shut every node down: the shutdown command first, and
+# processes still running GRACE seconds later are terminated.
+
+SCRIPTS = {'dv': 'COMP3221_A1_Routing.py', 'ls': 'Routing.py'}
+GRACE = 5.0
+# In-process distance-vector nodes share one interpreter, so each node's threads run less often the
+# more nodes there are. Their hello interval is at least a second per this many nodes, or the
+# stalls would outlast the dead interval and take links down for nothing
+NODES_PER_HELLO_SECOND = 50
+# Output of threads that belong to no node
+UNKNOWN = '-'
+
+# Threads started by an in-process node. The node the running code belongs to is otherwise
+# node_log.current_node: set here for every node's asyncio tasks and for the thread that starts it,
+# and by the log writer for the records it writes
+thread_nodes = {}
+
+
+def read_nodes(config_dir):
+    # {node: (config file path, port)}; ports come from the neighbors' config files
+    ports = {}
+    topology = read_topology(os.path.abspath(config_dir), ports)
+    missing = sorted(node for node in topology if node not in ports)
+    if missing:
+        raise ValueError(f"no neighbor lists a port for {', '.join(missing)}")
+    return {node: (path, ports[node]) for node, (path, _) in topology.items()}
+
+
+class PrefixedOutput:
+    # Writes whole lines to `out`, each prefixed with the ID of the node that printed it
+    def __init__(self, out, width):
+        self.out = out
+        self.width = width
+        self.lock = threading.Lock()
+        self.partial = {}
+
+    def node(self):
+        node = current_node.get()
+        if node is None:
+            node = thread_nodes.get(threading.current_thread(), UNKNOWN)
+        return node
+
+    def write(self, text, node=None):
+        node = node or self.node()
+        with self.lock:
+            lines = (self.partial.pop(node, '') + text).split('\n')
+            if lines[-1]:
+                self.partial[node] = lines[-1]
+            if len(lines) > 1:
+                self.out.write(''.join(f"{node:>{self.width}} | {line}\n" for line in lines[:-1]))
+                self.out.flush()
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def raise_file_limit(needed):
+    # Every node process takes two pipes here, more than the usual limit of 1024 with 1000 nodes
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        limit = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+
+class ProcessNodes:
+    # One `python3 -u <script> <node> <port> <config>` per node, its output read through a pipe
+    def __init__(self, protocol, nodes, output):
+        self.output = output
+        raise_file_limit(len(nodes) * 2 + 64)
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), SCRIPTS[protocol])
+        self.processes = {}
+        for node, (path, port) in nodes.items():
+            # A session of its own, so Ctrl-C reaches the launcher only and the nodes are shut down in order
+            self.processes[node] = subprocess.Popen([sys.executable, '-u', script, node, str(port), path],
+                                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                    stderr=subprocess.STDOUT, start_new_session=True)
+        self.reader = threading.Thread(target=self.read_output, daemon=True)
+        self.reader.start()
+
+    def read_output(self):
+        # All pipes from one thread
+        selector = selectors.DefaultSelector()
+        for node, process in self.processes.items():
+            os.set_blocking(process.stdout.fileno(), False)
+            selector.register(process.stdout, selectors.EVENT_READ, node)
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fileobj.fileno(), 65536)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    self.output.write("(exited)\n", key.data)
+                    continue
+                self.output.write(data.decode('utf-8', 'replace'), key.data)
+
+    def command(self, node, cmd):
+        process = self.processes[node]
+        try:
+            process.stdin.write(f"{cmd}\n".encode())
+            process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            self.output.write(f"[{node}] is not running\n", node)
+
+    def stop(self):
+        for node in self.processes:
+            self.command(node, "shutdown")
+        deadline = time.monotonic() + GRACE
+        for process in self.processes.values():
+            try:
+                process.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(GRACE)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            process.stdin.close()
+        self.reader.join(GRACE)
+
+
+class ThreadedNodes:
+    # Distance-vector nodes, each with the threads start_node gives it, all in this process
+    def __init__(self, nodes):
+        import COMP3221_A1_Routing as dv
+        self.dv = dv
+        if dv.HELLO_INTERVAL > 0:
+            dv.HELLO_INTERVAL = max(dv.HELLO_INTERVAL, len(nodes) / NODES_PER_HELLO_SECOND)
+        self.nodes = {}
+        self.paths = {}
+        for node, (path, port) in nodes.items():
+            before = set(threading.enumerate())
+            token = current_node.set(node)
+            try:
+                self.nodes[node] = dv.start_node(node, port, path)
+            finally:
+                current_node.reset(token)
+            for thread in set(threading.enumerate()) - before:
+                thread_nodes[thread] = node
+            self.paths[node] = path
+
+    def command(self, node, cmd):
+        global_state, listening_socket = self.nodes[node]
+        token = current_node.set(node)
+        try:
+            self.dv.run_command(node, cmd, global_state, self.paths[node], listening_socket)
+        finally:
+            current_node.reset(token)
+
+    def stop(self):
+        for node, (global_state, listening_socket) in self.nodes.items():
+            token = current_node.set(node)
+            try:
+                # Nodes already shut down by their command are left as they are
+                self.dv.shutdown(global_state, listening_socket)
+            finally:
+                current_node.reset(token)
+
+
+class AsyncNodes:
+    # Link-state nodes as AsyncNode tasks on an event loop of their own thread, all in this process
+    def __init__(self, nodes):
+        from async_node import AsyncNode
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.nodes = {}
+        self.contexts = {}
+        for node, (path, port) in nodes.items():
+            context = contextvars.Context()
+            context.run(current_node.set, node)
+            self.contexts[node] = context
+            self.nodes[node] = context.run(AsyncNode, node, port, path)
+        asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+
+    async def start(self):
+        # The nodes' tasks and callbacks inherit the context, and with it the node's output prefix
+        await asyncio.gather(*(self.loop.create_task(self.nodes[node].start(), context=self.contexts[node])
+                               for node in self.nodes))
+
+    def command(self, node, cmd):
+        # The shared run_command has no shutdown, that is up to whoever runs the node
+        if cmd == "shutdown":
+            asyncio.run_coroutine_threadsafe(self.nodes[node].stop(), self.loop)
+        else:
+            self.loop.call_soon_threadsafe(self.nodes[node].run_command, cmd, context=self.contexts[node])
+
+    async def stop_nodes(self):
+        await asyncio.gather(*(node.stop() for node in self.nodes.values()))
+
+    def stop(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self.stop_nodes(), self.loop).result(GRACE)
+        except TimeoutError:
+            # A loop busy with route calculations; its thread and sockets go with the process
+            print(f"Nodes still stopping after {GRACE:g}s, leaving them to the exit")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(GRACE)
+
+
+def read_commands(started, names, output):
+    # "<node>: <command>" or "*: <command>", until the end of input; the nodes keep running after it
+    for line in sys.stdin:
+        target, separator, cmd = line.rstrip('\n').partition(':')
+        target, cmd = target.strip(), cmd.strip()
+        if not separator or not cmd:
+            output.write("Type <node>: <command>, or *: <command> for every node\n", UNKNOWN)
+        elif target == '*':
+            for node in names:
+                started.command(node, cmd)
+        elif target in names:
+            started.command(target, cmd)
+        else:
+            output.write(f"No node {target}\n", UNKNOWN)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run every node of a config directory on this machine")
+    parser.add_argument('config_dir', help="directory with a <node>config.txt per node")
+    parser.add_argument('--protocol', choices=sorted(SCRIPTS), default='dv')
+    parser.add_argument('--mode', choices=['process', 'inprocess'], default='process')
+    parser.add_argument('--duration', type=float, default=None, help="shut down after this many seconds")
+    args = parser.parse_args(argv)
+
+    try:
+        nodes = read_nodes(args.config_dir)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    width = max(len(node) for node in nodes)
+    output = PrefixedOutput(sys.stdout, max(width, len(UNKNOWN)))
+    stopping = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    start = time.perf_counter()
+    if args.mode == 'process':
+        started = ProcessNodes(args.protocol, nodes, output)
+    else:
+        # The nodes print straight to sys.stdout
+        sys.stdout = output
+        started = ThreadedNodes(nodes) if args.protocol == 'dv' else AsyncNodes(nodes)
+    output.write(f"{len(nodes)} {args.protocol} nodes started ({args.mode}) in {time.perf_counter() - start:.2f}s\n", UNKNOWN)
+
+    threading.Thread(target=read_commands, args=(started, sorted(nodes), output), daemon=True).start()
+    stopping.wait(args.duration)
+    output.write("Shutting down\n", UNKNOWN)
+    started.stop()
+    output.write("Stopped\n", UNKNOWN)
+    sys.stdout = sys.__stdout__
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,145 @@
+import bisect
+import http.server
+import threading
+
+# Counters and latency histograms of one node, in the Prometheus text format: printed by the
+# "stats" command, or served to curl and Prometheus scrapes on a local stats socket.
+# A node with metrics switched off has global_state['metrics'] = None and its hot paths skip the
+# timing altogether. Latencies are wall times (time.perf_counter), convergence uses the node's clock.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds; the last bucket (+Inf) is implied
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+CONVERGENCE_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+# Distance-vector routes have converged once they stopped changing for this many seconds
+QUIET_PERIOD = 2.0
+
+# name: (type, help, buckets of a histogram)
+DESCRIPTIONS = {
+    'routing_messages_received_total': ('counter', "Routing messages received from neighbors, by kind", None),
+    'routing_bytes_received_total': ('counter', "Bytes of routing messages received", None),
+    'routing_messages_dropped_total': ('counter', "Received messages dropped, by reason", None),
+    'routing_messages_sent_total': ('counter', "Routing messages handed to the transport, by kind", None),
+    'routing_bytes_sent_total': ('counter', "Bytes of routing messages handed to the transport", None),
+    'routing_neighbor_flaps_total': ('counter', "Neighbors considered down, or up again", None),
+    'routing_decode_seconds': ('histogram', "Time to decode a received message", LATENCY_BUCKETS),
+    'routing_update_seconds': ('histogram', "Time to take a received message into the routing table", LATENCY_BUCKETS),
+    'routing_spf_seconds': ('histogram', "Time to recompute the routes (ls: shortest path tree, dv: changed destinations)",
+                            LATENCY_BUCKETS),
+    'routing_convergence_seconds': ('histogram', "Time from the first change of a burst until the routes were"
+                                    " recalculated (ls) or stopped changing (dv)", CONVERGENCE_BUCKETS),
+}
+
+
+class Metrics:
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.lock = threading.Lock()
+        # {(name, labels): value}, labels a sorted tuple of (label, value)
+        self.counters = {}
+        # {name: [bucket counts..., +Inf count, sum]}
+        self.histograms = {}
+        # Open burst of distance-vector route changes: (first, last) change time
+        self.burst = None
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value):
+        with self.lock:
+            self.add(name, value)
+
+    def add(self, name, value):
+        # Caller holds the lock
+        buckets = DESCRIPTIONS[name][2]
+        counts = self.histograms.get(name)
+        if counts is None:
+            counts = self.histograms[name] = [0] * (len(buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def routes_changed(self, now):
+        # A change more than QUIET_PERIOD after the previous one starts a new burst
+        with self.lock:
+            self.close_burst(now)
+            first = now if self.burst is None else self.burst[0]
+            self.burst = (first, now)
+
+    def close_burst(self, now):
+        # Caller holds the lock; the burst is observed once it has been quiet long enough
+        if self.burst is None or now - self.burst[1] <= QUIET_PERIOD:
+            return
+        first, last = self.burst
+        self.burst = None
+        self.add('routing_convergence_seconds', last - first)
+
+    def render(self, now=None):
+        # now: the node's clock, to close a quiet burst of route changes before reporting
+        node = self.node_id.replace('\\', '\\\\').replace('"', '\\"')
+        lines = []
+        with self.lock:
+            if now is not None:
+                self.close_burst(now)
+            for name, (kind, description, buckets) in DESCRIPTIONS.items():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == 'counter':
+                    series = sorted((labels, value) for (counter, labels), value in self.counters.items() if counter == name)
+                    for labels, value in series or [((), 0)]:
+                        extra = ''.join(f',{label}="{label_value}"' for label, label_value in labels)
+                        lines.append(f'{name}{{node="{node}"{extra}}} {value}')
+                    continue
+                counts = self.histograms.get(name, [0] * (len(buckets) + 1) + [0.0])
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{node="{node}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{node="{node}"}} {counts[-1]:.6f}')
+                lines.append(f'{name}_count{{node="{node}"}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def init_metrics(global_state, node_id, enabled=True):
+    global_state['metrics'] = Metrics(node_id) if enabled else None
+    global_state['stats_server'] = None
+
+
+def format_stats(global_state):
+    metrics = global_state['metrics']
+    if metrics is None:
+        return "Metrics are switched off (METRICS = False)"
+    return metrics.render(global_state['clock']()).rstrip('\n')
+
+
+class StatsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = format_stats(self.server.global_state).encode('utf-8') + b'\n'
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise be logged to the node's terminal
+        pass
+
+
+def start_stats_server(global_state, port):
+    # GET http://localhost:<port>/ (any path) answers the node's metrics
+    server = http.server.ThreadingHTTPServer(('localhost', port), StatsHandler)
+    server.daemon_threads = True
+    server.global_state = global_state
+    threading.Thread(target=server.serve_forever, args=(0.5,), daemon=True).start()
+    global_state['stats_server'] = server
+    return server
+
+
+def stop_stats_server(global_state):
+    server = global_state.get('stats_server')
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        global_state['stats_server'] = None
@@ -0,0 +1,127 @@
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+# What a node reports on its own (neighbors down, calculations, dropped messages) goes through
+# logging instead of print, so the node's threads never wait for the terminal:
+#   - every node has its logger, "routing.<node ID>", with a level of its own ("log" command)
+#   - records below the level cost a level check; the others are formatted by the thread that
+#     logged them and queued
+#   - one writer thread per process writes the queue out in batches, one write and flush each
+# A record goes to the sys.stdout of when it was logged, so contextlib.redirect_stdout keeps
+# working for nodes run in-process (the emulator, benchmarks). Answers to commands still print.
+
+LEVEL = 'info'
+LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING, 'error': logging.ERROR}
+# Records written together at most
+BATCH_SIZE = 512
+
+# The node whose records are being written, for outputs that tell nodes apart (launcher.py).
+# Launchers running nodes in-process set it for the nodes' own code as well
+current_node = contextvars.ContextVar('current_node', default=None)
+
+_STOP = object()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class LogWriter:
+    def __init__(self):
+        self.records = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.records.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if isinstance(record, logging.LogRecord)]
+            self.write(records)
+            for item in batch:
+                # flush() waits on an event queued behind the records it waits for
+                if isinstance(item, threading.Event):
+                    item.set()
+            if _STOP in batch:
+                return
+
+    def write(self, records):
+        # Consecutive records of one node and one output go out in one write
+        start = 0
+        while start < len(records):
+            end = start + 1
+            stream, node = records[start].stream, records[start].node
+            while end < len(records) and records[end].stream is stream and records[end].node == node:
+                end += 1
+            text = ''.join(f"{record.msg}\n" for record in records[start:end])
+            token = current_node.set(node)
+            try:
+                stream.write(text)
+                stream.flush()
+            except (OSError, ValueError):
+                # The output went away (a closed redirect), its records with it
+                pass
+            finally:
+                current_node.reset(token)
+            start = end
+
+    def flush(self):
+        done = threading.Event()
+        self.records.put(done)
+        done.wait()
+
+    def close(self):
+        self.records.put(_STOP)
+        self.thread.join()
+
+
+class NodeHandler(logging.handlers.QueueHandler):
+    def __init__(self, node_id, records):
+        super().__init__(records)
+        self.node_id = node_id
+
+    def prepare(self, record):
+        # Formatted here (record.msg), in the thread that logged it
+        record = super().prepare(record)
+        record.node = self.node_id
+        record.stream = sys.stdout
+        return record
+
+
+def writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter()
+            # Whatever is still queued is written before the process exits
+            atexit.register(_writer.close)
+        return _writer
+
+
+def node_logger(node_id, level=LEVEL):
+    logger = logging.getLogger(f"routing.{node_id}")
+    logger.setLevel(LEVELS[level])
+    logger.propagate = False
+    if not logger.handlers:
+        logger.addHandler(NodeHandler(node_id, writer().records))
+    return logger
+
+
+def set_level(logger, level):
+    # Returns False for an unknown level name
+    if level not in LEVELS:
+        return False
+    logger.setLevel(LEVELS[level])
+    return True
+
+
+def flush():
+    # Waits until everything logged so far has been written
+    writer().flush()
@@ -0,0 +1,31 @@
+import threading
+
+# Enable/disable transitions shared by the node threads. A disabled node's threads block on
+# the condition instead of polling global_state['active'].
+
+
+def init_activity(global_state):
+    global_state['active'] = True
+    global_state['active_changed'] = threading.Condition()
+
+
+def set_active(global_state, active):
+    condition = global_state['active_changed']
+    with condition:
+        global_state['active'] = active
+        condition.notify_all()
+
+
+def wait_until_active(global_state, shut_signal):
+    # Blocks while the node is disabled. Returns False when it was woken up by a shutdown instead
+    condition = global_state['active_changed']
+    with condition:
+        condition.wait_for(lambda: global_state['active'] or shut_signal.is_set())
+    return not shut_signal.is_set()
+
+
+def request_shutdown(global_state, shut_signal):
+    condition = global_state['active_changed']
+    with condition:
+        shut_signal.set()
+        condition.notify_all()
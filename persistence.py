@@ -0,0 +1,105 @@
+import atexit
+import logging
+import os
+import tempfile
+import threading
+import time
+
+# Write-behind persistence of link cost changes to a node's config file.
+# Receive paths only record the new cost in memory; a background thread rewrites the file at most
+# once per FLUSH_INTERVAL, with every change made in between coalesced into that one write.
+# The file is replaced atomically (temp file + rename), so a crash leaves either the old or the new copy.
+# Failed writes are logged to `log`, the node's logger (node_log.py).
+
+FLUSH_INTERVAL = 1.0
+
+
+class ConfigWriter:
+    def __init__(self, config_file_path, flush_interval=FLUSH_INTERVAL, log=None):
+        self.config_file_path = config_file_path
+        self.log = log or logging.getLogger(__name__)
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.condition = threading.Condition()
+        # Serialises flushes from the background thread and from close()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.closed = False
+        self.flushes = 0
+        self.coalesced = 0
+        atexit.register(self.close)
+
+    def set_cost(self, neighbor_id, cost):
+        # Never touches the disk, a newer cost for the same neighbor replaces the pending one
+        with self.condition:
+            if neighbor_id in self.pending:
+                self.coalesced += 1
+            self.pending[neighbor_id] = cost
+            if self.closed:
+                return
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+            # Let more changes pile up before writing
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.condition:
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return
+            try:
+                self.write(pending)
+            except OSError as error:
+                self.log.error("Could not save link costs to %s: %s", self.config_file_path, error)
+                # Keep the changes for the next flush, unless newer ones arrived meanwhile
+                with self.condition:
+                    for neighbor_id, cost in pending.items():
+                        self.pending.setdefault(neighbor_id, cost)
+                return
+            self.flushes += 1
+
+    def write(self, pending):
+        with open(self.config_file_path, 'r') as file:
+            lines = file.readlines()
+
+        updated_lines = []
+        for line in lines:
+            parts = line.split()
+            if len(parts) > 1 and parts[0] in pending:
+                parts[1] = str(pending[parts[0]])
+                updated_lines.append(' '.join(parts) + '\n')
+            else:
+                updated_lines.append(line)
+
+        directory = os.path.dirname(os.path.abspath(self.config_file_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.config-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.writelines(updated_lines)
+                file.flush()
+                os.fsync(file.fileno())
+            # mkstemp creates the file private to us, keep the permissions of the config file
+            os.chmod(temp_path, os.stat(self.config_file_path).st_mode & 0o7777)
+            os.replace(temp_path, self.config_file_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def close(self):
+        # Stop the background thread and write whatever is still pending
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.flush()
@@ -0,0 +1,79 @@
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+
+# Routing state shared between a node's threads (listener, sender, calculation, liveness, CLI).
+#   - readers call snapshot(): the copy published by the last writer. It is never changed
+#     afterwards, so it can be iterated without any lock while writers carry on
+#   - writers go through `with state.write(names...) as live:`, one at a time, on the live parts,
+#     naming the parts they change. Leaving the outermost write block publishes a new snapshot.
+#     A block naming no part just owns the state for a moment (e.g. to read it together with
+#     other writer-owned data) and publishes nothing
+# Publishing is copy-on-write per part: only the parts a write block named are copied, every
+# other part of the new snapshot is the previous snapshot's copy.
+
+
+def copy_part(value):
+    # Default copy: the container itself plus one level of dicts below it (e.g. per-neighbor info)
+    if isinstance(value, dict):
+        return {key: dict(item) if isinstance(item, dict) else item for key, item in value.items()}
+    return value.copy()
+
+
+class Snapshot:
+    # Read-only view of the parts at one version; the parts themselves must not be modified
+    def __init__(self, version, parts):
+        self.version = version
+        self.parts = MappingProxyType(parts)
+
+    def __getitem__(self, name):
+        return self.parts[name]
+
+    def __contains__(self, name):
+        return name in self.parts
+
+
+class SharedState:
+    def __init__(self, parts, copiers=None):
+        # parts: {name: live object}; copiers: {name: function giving a copy to publish}
+        self.live = parts
+        self.copiers = dict(copiers or {})
+        # The single owner of the live parts; re-entrant so write blocks can nest
+        self.lock = threading.RLock()
+        self.depth = 0
+        self.changed = set()
+        self.published = Snapshot(0, {name: self.copy(name) for name in parts})
+
+    def copy(self, name):
+        return self.copiers.get(name, copy_part)(self.live[name])
+
+    def snapshot(self):
+        # A plain attribute read: never blocks, and always a complete snapshot
+        return self.published
+
+    @contextmanager
+    def write(self, *names):
+        with self.lock:
+            self.changed.update(names)
+            self.depth += 1
+            try:
+                yield self.live
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.publish()
+
+    def mark_changed(self, *names):
+        # For writers that find out inside the block which parts they changed
+        with self.lock:
+            self.changed.update(names)
+
+    def publish(self):
+        with self.lock:
+            if not self.changed:
+                return
+            parts = dict(self.published.parts)
+            for name in self.changed:
+                parts[name] = self.copy(name)
+            self.changed = set()
+            self.published = Snapshot(self.published.version + 1, parts)
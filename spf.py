@@ -0,0 +1,157 @@
+import heapq
+
+INF = float('inf')
+
+
+def build_adjacency(cost_table):
+    # Sparse view of the cost matrix: keep only finite links between known nodes
+    adjacency = {}
+    for src, row in cost_table.items():
+        adjacency[src] = {dest: cost for dest, cost in row.items()
+                          if cost != INF and dest != src and dest in cost_table}
+    return adjacency
+
+
+def shortest_paths(adjacency, source, stats=None):
+    # Dijkstra over adjacency lists with a binary heap and lazy deletion:
+    # stale heap entries are skipped when popped instead of being removed
+    distances = {node: INF for node in adjacency}
+    predecessors = {node: None for node in adjacency}
+    distances[source] = 0
+
+    relaxations = 0
+    visited = set()
+    heap = [(0, source)]
+    while heap:
+        dist, current_node = heapq.heappop(heap)
+        if current_node in visited or dist > distances[current_node]:
+            continue
+        visited.add(current_node)
+
+        for neighbor, cost in adjacency[current_node].items():
+            if neighbor in visited:
+                continue
+            relaxations += 1
+            new_cost = dist + cost
+            if new_cost < distances[neighbor]:
+                distances[neighbor] = round(new_cost, 3)
+                predecessors[neighbor] = current_node
+                heapq.heappush(heap, (distances[neighbor], neighbor))
+
+    if stats is not None:
+        stats['relaxations'] = stats.get('relaxations', 0) + relaxations
+    return distances, predecessors
+
+
+def build_spt(cost_table, source, stats=None):
+    # Shortest path tree that can later be repaired edge by edge with update_edge
+    adjacency = build_adjacency(cost_table)
+    reverse = {node: {} for node in adjacency}
+    for src, row in adjacency.items():
+        for dest, cost in row.items():
+            reverse[dest][src] = cost
+
+    distances, predecessors = shortest_paths(adjacency, source, stats)
+    children = {node: set() for node in adjacency}
+    for node, pred in predecessors.items():
+        if pred is not None:
+            children[pred].add(node)
+
+    return {'source': source, 'adjacency': adjacency, 'reverse': reverse,
+            'distances': distances, 'predecessors': predecessors, 'children': children}
+
+
+def _ensure_node(spt, node):
+    if node not in spt['adjacency']:
+        spt['adjacency'][node] = {}
+        spt['reverse'][node] = {}
+        spt['distances'][node] = INF
+        spt['predecessors'][node] = None
+        spt['children'][node] = set()
+
+
+def _set_predecessor(spt, node, pred):
+    old_pred = spt['predecessors'][node]
+    if old_pred is not None:
+        spt['children'][old_pred].discard(node)
+    spt['predecessors'][node] = pred
+    if pred is not None:
+        spt['children'][pred].add(node)
+
+
+def _propagate(spt, heap, stats):
+    # Dijkstra restricted to the nodes whose distance was just lowered
+    adjacency, distances = spt['adjacency'], spt['distances']
+    relaxations = 0
+    heapq.heapify(heap)
+    while heap:
+        dist, current_node = heapq.heappop(heap)
+        if dist > distances[current_node]:
+            continue
+        for neighbor, cost in adjacency[current_node].items():
+            relaxations += 1
+            new_cost = dist + cost
+            if new_cost < distances[neighbor]:
+                distances[neighbor] = round(new_cost, 3)
+                _set_predecessor(spt, neighbor, current_node)
+                heapq.heappush(heap, (distances[neighbor], neighbor))
+
+    if stats is not None:
+        stats['relaxations'] = stats.get('relaxations', 0) + relaxations
+
+
+def update_edge(spt, src, dest, cost, stats=None):
+    # Apply a single link-cost change and repair only the part of the tree it affects
+    if src == dest:
+        return
+    _ensure_node(spt, src)
+    _ensure_node(spt, dest)
+    adjacency, reverse = spt['adjacency'], spt['reverse']
+    distances, predecessors = spt['distances'], spt['predecessors']
+
+    old_cost = adjacency[src].get(dest, INF)
+    if cost == INF:
+        adjacency[src].pop(dest, None)
+        reverse[dest].pop(src, None)
+    else:
+        adjacency[src][dest] = cost
+        reverse[dest][src] = cost
+
+    if cost < old_cost:
+        # Cheaper link: dest and everything reached through it may improve
+        new_cost = distances[src] + cost
+        if new_cost < distances[dest]:
+            distances[dest] = round(new_cost, 3)
+            _set_predecessor(spt, dest, src)
+            _propagate(spt, [(distances[dest], dest)], stats)
+
+    elif cost > old_cost and predecessors[dest] == src:
+        # More expensive tree link: invalidate the subtree rooted at dest
+        affected = []
+        stack = [dest]
+        while stack:
+            node = stack.pop()
+            affected.append(node)
+            stack.extend(spt['children'][node])
+        affected_set = set(affected)
+        for node in affected:
+            distances[node] = INF
+            _set_predecessor(spt, node, None)
+
+        # Reattach each affected node through its best unaffected in-link
+        relaxations = 0
+        heap = []
+        for node in affected:
+            for pred, link_cost in reverse[node].items():
+                if pred in affected_set:
+                    continue
+                relaxations += 1
+                new_cost = distances[pred] + link_cost
+                if new_cost < distances[node]:
+                    distances[node] = round(new_cost, 3)
+                    _set_predecessor(spt, node, pred)
+            if distances[node] != INF:
+                heap.append((distances[node], node))
+        if stats is not None:
+            stats['relaxations'] = stats.get('relaxations', 0) + relaxations
+        _propagate(spt, heap, stats)
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+
+# Per-key deadlines (neighbor liveness, hold-downs) on a hashed timer wheel.
+# Time is cut into ticks of `tick` seconds and a key waits in the slot of the first tick that
+# starts after its deadline (slot = tick % slots; deadlines more than one turn ahead just stay in their slot until
+# their turn comes). A background thread advances the wheel every tick and calls on_expire(key)
+# for each deadline that passed, so expiry is noticed within one tick.
+# Rearming is O(1) and lazy: arm() only records the new deadline. A key found in its slot before
+# its deadline is moved to the slot of the new deadline then, so a neighbor heard from on every
+# message costs one dict write per message and at most one move per timeout.
+# Deadlines are time.monotonic() values. A failing on_expire is logged to `log`, the node's logger.
+
+TICK = 0.1
+SLOTS = 512
+
+
+class TimerWheel:
+    def __init__(self, on_expire, tick=TICK, slots=SLOTS, log=None):
+        self.on_expire = on_expire
+        self.log = log or logging.getLogger(__name__)
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.deadlines = {}
+        # Tick of the slot each key is in; a key is in at most one slot
+        self.scheduled = {}
+        self.condition = threading.Condition()
+        self.current = self.tick_of(time.monotonic())
+        self.closed = False
+        self.thread = None
+        # Metrics
+        self.expired = 0
+        self.moved = 0
+
+    def tick_of(self, moment):
+        return int(moment / self.tick)
+
+    def due_tick(self, deadline):
+        # Reaching this tick means the deadline has passed
+        return self.tick_of(deadline) + 1
+
+    def _schedule(self, key, deadline):
+        # Caller holds the condition; never into a tick the wheel has already passed
+        tick = max(self.due_tick(deadline), self.current + 1)
+        old = self.scheduled.get(key)
+        if old is not None:
+            self.slots[old % len(self.slots)].discard(key)
+        self.scheduled[key] = tick
+        self.slots[tick % len(self.slots)].add(key)
+
+    def arm(self, key, timeout):
+        # (Re)starts key's timer: on_expire(key) runs once timeout seconds pass without another arm()
+        now = time.monotonic()
+        deadline = now + timeout
+        with self.condition:
+            if not self.deadlines:
+                # The wheel is empty, skip the ticks it slept through
+                self.current = max(self.current, self.tick_of(now))
+            self.deadlines[key] = deadline
+            old = self.scheduled.get(key)
+            # Later deadlines are picked up lazily, when the wheel reaches the old slot
+            if old is None or self.due_tick(deadline) < old:
+                self._schedule(key, deadline)
+                self.condition.notify()
+            if self.thread is None and not self.closed:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def cancel(self, key):
+        with self.condition:
+            self.deadlines.pop(key, None)
+            old = self.scheduled.pop(key, None)
+            if old is not None:
+                self.slots[old % len(self.slots)].discard(key)
+
+    def deadline(self, key):
+        with self.condition:
+            return self.deadlines.get(key)
+
+    def advance(self, now):
+        # Moves the wheel up to now and returns the keys whose deadline passed, caller holds the condition
+        due = []
+        target = self.tick_of(now)
+        while self.current < target:
+            self.current += 1
+            slot = self.slots[self.current % len(self.slots)]
+            for key in list(slot):
+                if self.scheduled[key] != self.current:
+                    continue  # a later turn of the wheel
+                slot.discard(key)
+                del self.scheduled[key]
+                deadline = self.deadlines[key]
+                if deadline <= now:
+                    del self.deadlines[key]
+                    due.append(key)
+                else:
+                    # Rearmed since it was put here
+                    self._schedule(key, deadline)
+                    self.moved += 1
+        self.expired += len(due)
+        return due
+
+    def run(self):
+        while True:
+            with self.condition:
+                # Sleep through idle periods, otherwise wake up at the next tick
+                while not self.deadlines and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                self.condition.wait(max((self.current + 1) * self.tick - time.monotonic(), 0))
+                due = self.advance(time.monotonic())
+            for key in due:
+                try:
+                    self.on_expire(key)
+                except Exception:
+                    self.log.exception("Timer for %s failed", key)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,190 @@
+import selectors
+import socket
+import struct
+import threading
+import time
+
+# Every message on a neighbor stream is prefixed with its length (4 bytes, network order)
+HEADER = struct.Struct('!I')
+
+
+# Anything larger is treated as a corrupt stream rather than allocated
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+
+def send_frame(sock, payload):
+    # Scatter-gather send of header and payload, so large tables are not copied into one buffer
+    buffers = [HEADER.pack(len(payload)), memoryview(payload)]
+    sent = sock.sendmsg(buffers)
+    for buffer in buffers:
+        if sent >= len(buffer):
+            sent -= len(buffer)
+            continue
+        sock.sendall(buffer[sent:])
+        sent = 0
+
+
+class FrameReader:
+    # Reassembles length-prefixed frames from one stream. Data is received with recv_into
+    # into a reusable buffer; frames bigger than that buffer get a dedicated buffer of
+    # exactly their size that the rest of the body is received into directly.
+    def __init__(self, buffer_size=65536):
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.large = None
+        self.large_filled = 0
+
+    def read_from(self, sock):
+        # Returns the frames completed by this read, or None once the peer closed the stream
+        if self.large is not None:
+            received = sock.recv_into(memoryview(self.large)[self.large_filled:])
+            if not received:
+                return None
+            self.large_filled += received
+            if self.large_filled < len(self.large):
+                return []
+            frame, self.large = self.large, None
+            return [frame]
+
+        if self.end == len(self.buffer):
+            # Move the unfinished frame to the front to make room
+            pending = self.end - self.start
+            self.view[:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+
+        received = sock.recv_into(self.view[self.end:])
+        if not received:
+            return None
+        self.end += received
+        return self._split()
+
+    def _split(self):
+        frames = []
+        while self.end - self.start >= HEADER.size:
+            (length,) = HEADER.unpack_from(self.buffer, self.start)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f"frame of {length} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+            body = self.start + HEADER.size
+            if self.end - body >= length:
+                frames.append(bytes(self.view[body:body + length]))
+                self.start = body + length
+            elif HEADER.size + length > len(self.buffer):
+                self.large = bytearray(length)
+                self.large_filled = self.end - body
+                self.large[:self.large_filled] = self.view[body:self.end]
+                self.start = self.end
+                break
+            else:
+                break
+
+        if self.start == self.end:
+            self.start = self.end = 0
+        return frames
+
+
+class ConnectionPool:
+    # One long-lived stream per neighbor port, reopened with exponential backoff after failures
+    def __init__(self, host='localhost', timeout=2.0, min_backoff=0.5, max_backoff=10.0):
+        self.host = host
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connections = {}
+        self.backoff = {}
+        self.retry_at = {}
+        self.lock = threading.Lock()
+
+    def _connect(self, port):
+        sock = socket.create_connection((self.host, port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connections[port] = sock
+        return sock
+
+    def _drop(self, port):
+        sock = self.connections.pop(port, None)
+        if sock is not None:
+            sock.close()
+
+    def _fail(self, port):
+        self._drop(port)
+        backoff = min(self.backoff.get(port, self.min_backoff / 2) * 2, self.max_backoff)
+        self.backoff[port] = backoff
+        self.retry_at[port] = time.monotonic() + backoff
+
+    def send(self, port, payload):
+        # Returns False when the neighbor is unreachable or still backing off
+        with self.lock:
+            sock = self.connections.get(port)
+            if sock is None and time.monotonic() < self.retry_at.get(port, 0):
+                return False
+
+            # An idle stream may have been closed by a restarted neighbor, so retry once on a fresh one
+            reused = sock is not None
+            while True:
+                try:
+                    if sock is None:
+                        sock = self._connect(port)
+                    send_frame(sock, payload)
+                    self.backoff.pop(port, None)
+                    self.retry_at.pop(port, None)
+                    return True
+                except OSError:
+                    self._drop(port)
+                    sock = None
+                    if not reused:
+                        break
+                    reused = False
+
+            self._fail(port)
+            return False
+
+    def close(self):
+        with self.lock:
+            for port in list(self.connections):
+                self._drop(port)
+
+
+class FrameListener:
+    # Multiplexes the listening socket and every accepted neighbor stream on one selector
+    def __init__(self, server_socket):
+        self.server_socket = server_socket
+        self.selector = selectors.DefaultSelector()
+        server_socket.setblocking(False)
+        self.selector.register(server_socket, selectors.EVENT_READ, None)
+
+    def _close_stream(self, conn):
+        self.selector.unregister(conn)
+        conn.close()
+
+    def poll(self, timeout=1.0):
+        # Wait up to timeout and return the complete messages received meanwhile
+        frames = []
+        for key, _ in self.selector.select(timeout):
+            if key.data is None:
+                try:
+                    conn, _ = self.server_socket.accept()
+                except OSError:
+                    continue
+                conn.setblocking(False)
+                self.selector.register(conn, selectors.EVENT_READ, FrameReader())
+                continue
+
+            try:
+                received = key.data.read_from(key.fileobj)
+            except BlockingIOError:
+                continue
+            except (OSError, ValueError):
+                received = None
+            if received is None:
+                self._close_stream(key.fileobj)
+                continue
+            frames.extend(received)
+        return frames
+
+    def close(self):
+        for key in list(self.selector.get_map().values()):
+            if key.fileobj is not self.server_socket:
+                key.fileobj.close()
+        self.selector.close()
@@ -0,0 +1,289 @@
+import math
+import struct
+import sys
+from array import array
+from itertools import repeat
+
+# Compact binary encoding of routing messages. Node IDs are interned into a table at the start
+# of each message and referenced by index afterwards (uint16, or uint32 once a message names more
+# than 65535 nodes); costs travel as little-endian float32. Decoded node IDs are sys.intern()ed,
+# so equal IDs from different messages are the same string object.
+#
+#   header      magic 'RT', wire version, message kind
+#   node table  count, then one length-prefixed UTF-8 ID per node
+#   body        depends on the kind, see the encode_* functions below
+
+MAGIC = b'RT'
+WIRE_VERSION = 2
+KIND_LS_FULL = 0
+KIND_LS_DELTA = 1
+KIND_DV_TABLE = 2
+KIND_DV_CHANGE = 3
+KIND_HELLO = 4
+
+# "No link" is sent as the IEEE-754 float32 infinity, which unlike JSON every decoder reads back as inf
+INF = float('inf')
+# float32 keeps about 7 significant digits, decoded costs are rounded back to this many decimals
+COST_DECIMALS = 3
+
+HEADER = struct.Struct('<2sBB')
+COUNT = struct.Struct('<I')
+NODE_ID = struct.Struct('<B')
+# Node IDs are length-prefixed with one byte
+MAX_NODE_ID_BYTES = 0xFF
+LS_HEADER = struct.Struct('<IddQQI')       # sender, epoch, ack epoch, version, ack, row count
+LS_ROW = struct.Struct('<IdBI')            # node, time, dense flag, entry count
+DV_CHANGE = struct.Struct('<If')           # sender, new cost
+HELLO = struct.Struct('<If')               # sender, dead interval in seconds
+
+# memoryview.cast reads native values, so big-endian hosts byteswap copies instead
+NATIVE_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class NodeTable:
+    # Interns node IDs into indices while a message is encoded
+    def __init__(self):
+        self.index = {}
+        self.nodes = []
+
+    def __call__(self, node):
+        index = self.index.get(node)
+        if index is None:
+            index = self.index[node] = len(self.nodes)
+            self.nodes.append(node)
+        return index
+
+    def add(self, nodes):
+        for node in nodes:
+            if node not in self.index:
+                self.index[node] = len(self.nodes)
+                self.nodes.append(node)
+
+    def encode(self):
+        parts = [COUNT.pack(len(self.nodes))]
+        for node in self.nodes:
+            raw = node.encode('utf-8')
+            if len(raw) > MAX_NODE_ID_BYTES:
+                raise ValueError(f"node ID {node!r} is longer than {MAX_NODE_ID_BYTES} bytes")
+            parts.append(NODE_ID.pack(len(raw)))
+            parts.append(raw)
+        return b''.join(parts)
+
+
+def _little_endian(values):
+    if not NATIVE_LITTLE_ENDIAN:
+        values.byteswap()
+    return values.tobytes()
+
+
+def _index_typecode(node_count):
+    return 'H' if node_count <= 0xFFFF else 'I'
+
+
+def _array_view(typecode, view, offset, count):
+    # Zero-copy view of count values (float32 'f', uint16 'H' or uint32 'I') inside the received buffer
+    raw = view[offset:offset + array(typecode).itemsize * count]
+    if NATIVE_LITTLE_ENDIAN:
+        return raw.cast(typecode)
+    values = array(typecode, raw)
+    values.byteswap()
+    return values
+
+
+def _costs_from_float32(values):
+    # round() leaves inf untouched, so unreachable entries come back as float('inf')
+    return map(round, values, repeat(COST_DECIMALS))
+
+
+def _check_length(view, end, what):
+    # Slices and zip() stop short silently at the end of the buffer, so sizes are checked first
+    if len(view) < end:
+        raise ValueError(f"truncated {what}")
+
+
+def _pack(kind, nodes, body):
+    return HEADER.pack(MAGIC, WIRE_VERSION, kind) + nodes.encode() + body
+
+
+def _unpack(data):
+    # Returns the message kind, the interned node IDs and the offset of the body
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise ValueError("message too short")
+    magic, version, kind = HEADER.unpack_from(view)
+    if magic != MAGIC or version != WIRE_VERSION:
+        raise ValueError("not a routing message of a known wire version")
+
+    offset = HEADER.size
+    _check_length(view, offset + COUNT.size, "node table")
+    (count,) = COUNT.unpack_from(view, offset)
+    offset += COUNT.size
+    nodes = []
+    for _ in range(count):
+        _check_length(view, offset + NODE_ID.size, "node table")
+        (length,) = NODE_ID.unpack_from(view, offset)
+        offset += NODE_ID.size
+        _check_length(view, offset + length, "node table")
+        nodes.append(sys.intern(str(view[offset:offset + length], 'utf-8')))
+        offset += length
+    return view, kind, nodes, offset
+
+
+def encode_ls_advertisement(message):
+    # Link-state advertisement from Routing.py: a (partial) cost matrix plus row time stamps
+    intern = NodeTable()
+    sender = intern(message['sender'])
+    costs, times = message['table']['cost'], message['table']['time']
+    intern.add(costs)
+    # Only each row's own keys, a sparse row names just its links
+    for row in costs.values():
+        intern.add(row)
+    nodes = intern.nodes
+    node_count = len(nodes)
+    index_type = _index_typecode(node_count)
+
+    ack_epoch = message['ack_epoch']
+    parts = [LS_HEADER.pack(sender, message['epoch'], math.nan if ack_epoch is None else ack_epoch,
+                            message['version'], message['ack'], len(costs))]
+    for src, row in costs.items():
+        time_stamp = times.get(src)
+        time_stamp = math.nan if time_stamp is None else time_stamp
+        finite = len(row) - list(row.values()).count(INF)
+        if 2 * finite < node_count:
+            # Sparse row: indices of the reachable nodes, then their costs
+            reachable = [(dest, cost) for dest, cost in row.items() if cost != INF]
+            parts.append(LS_ROW.pack(intern(src), time_stamp, 0, len(reachable)))
+            parts.append(_little_endian(array(index_type, [intern.index[dest] for dest, _ in reachable])))
+            parts.append(_little_endian(array('f', [cost for _, cost in reachable])))
+        else:
+            parts.append(LS_ROW.pack(intern(src), time_stamp, 1, node_count))
+            parts.append(_little_endian(array('f', map(row.get, nodes, repeat(INF)))))
+
+    kind = KIND_LS_FULL if message['type'] == 'full' else KIND_LS_DELTA
+    return _pack(kind, intern, b''.join(parts))
+
+
+def _decode_ls_advertisement(data):
+    view, kind, nodes, offset = _unpack(data)
+    if kind not in (KIND_LS_FULL, KIND_LS_DELTA):
+        raise ValueError(f"unexpected message kind {kind}")
+
+    _check_length(view, offset + LS_HEADER.size, "link-state advertisement")
+    sender, epoch, ack_epoch, version, ack, row_count = LS_HEADER.unpack_from(view, offset)
+    offset += LS_HEADER.size
+    index_type = _index_typecode(len(nodes))
+    index_size = array(index_type).itemsize
+    costs, times = {}, {}
+    for _ in range(row_count):
+        _check_length(view, offset + LS_ROW.size, "link-state row")
+        src, time_stamp, dense, count = LS_ROW.unpack_from(view, offset)
+        offset += LS_ROW.size
+        _check_length(view, offset + (4 if dense else index_size + 4) * count, "link-state row")
+        if dense:
+            if count != len(nodes):
+                raise ValueError("dense link-state row does not cover the node table")
+            values = _array_view('f', view, offset, count)
+            offset += 4 * count
+            row = dict(zip(nodes, _costs_from_float32(values)))
+        else:
+            indices = _array_view(index_type, view, offset, count)
+            offset += index_size * count
+            values = _array_view('f', view, offset, count)
+            offset += 4 * count
+            # Just the links; the nodes a sparse row leaves out are unreachable from its source
+            row = dict(zip(map(nodes.__getitem__, indices), _costs_from_float32(values)))
+        costs[nodes[src]] = row
+        times[nodes[src]] = None if math.isnan(time_stamp) else time_stamp
+
+    return {'sender': nodes[sender], 'type': 'full' if kind == KIND_LS_FULL else 'delta',
+            'epoch': epoch, 'version': version, 'ack': ack,
+            'ack_epoch': None if math.isnan(ack_epoch) else ack_epoch,
+            'table': {'cost': costs, 'time': times}}
+
+
+def encode_dv_table(sender, entries):
+    # Distance-vector table from COMP3221_A1_Routing.py: (destination, distance, predecessor) entries,
+    # the predecessor being the node before the destination on the path, or None.
+    # Sent as three columns: destinations, float32 distances, predecessors (a destination's own
+    # index stands for "no predecessor")
+    intern = NodeTable()
+    intern(sender)
+    dests, distances, preds = [], [], []
+    for dest, distance, pred in entries:
+        dest_index = intern(dest)
+        dests.append(dest_index)
+        distances.append(distance)
+        preds.append(dest_index if pred is None else intern(pred))
+    index_type = _index_typecode(len(intern.nodes))
+
+    parts = [COUNT.pack(intern.index[sender]), COUNT.pack(len(dests)),
+             _little_endian(array(index_type, dests)), _little_endian(array('f', distances)),
+             _little_endian(array(index_type, preds))]
+    return _pack(KIND_DV_TABLE, intern, b''.join(parts))
+
+
+def encode_dv_change(sender, cost):
+    intern = NodeTable()
+    return _pack(KIND_DV_CHANGE, intern, DV_CHANGE.pack(intern(sender), cost))
+
+
+def _decode_dv_message(data):
+    view, kind, nodes, offset = _unpack(data)
+    if kind == KIND_DV_CHANGE:
+        sender, cost = DV_CHANGE.unpack_from(view, offset)
+        return 'change', nodes[sender], round(cost, COST_DECIMALS)
+    if kind != KIND_DV_TABLE:
+        raise ValueError(f"unexpected message kind {kind}")
+
+    (sender,) = COUNT.unpack_from(view, offset)
+    (count,) = COUNT.unpack_from(view, offset + COUNT.size)
+    offset += 2 * COUNT.size
+    index_type = _index_typecode(len(nodes))
+    index_size = array(index_type).itemsize
+    _check_length(view, offset + (2 * index_size + 4) * count, "distance-vector table")
+    dests = _array_view(index_type, view, offset, count)
+    offset += index_size * count
+    distances = _array_view('f', view, offset, count)
+    offset += 4 * count
+    preds = _array_view(index_type, view, offset, count)
+
+    dest_ids = list(map(nodes.__getitem__, dests))
+    pred_ids = [None if pred == dest else nodes[pred] for dest, pred in zip(dests, preds)]
+    return 'table', nodes[sender], list(zip(dest_ids, _costs_from_float32(distances), pred_ids))
+
+
+def encode_hello(sender, dead_interval):
+    # Heartbeat of either node (heartbeat.py): the sender and how long its neighbors should wait
+    # for the next one before considering it down
+    intern = NodeTable()
+    return _pack(KIND_HELLO, intern, HELLO.pack(intern(sender), dead_interval))
+
+
+def _decode_hello(data):
+    view, kind, nodes, offset = _unpack(data)
+    if kind != KIND_HELLO:
+        raise ValueError(f"unexpected message kind {kind}")
+    sender, dead_interval = HELLO.unpack_from(view, offset)
+    return nodes[sender], round(dead_interval, COST_DECIMALS)
+
+
+def _checked(decode, data):
+    # Truncated or corrupt buffers surface as ValueError, like a wrong magic or kind
+    try:
+        return decode(data)
+    except (struct.error, IndexError, TypeError) as error:
+        raise ValueError(f"malformed routing message: {error}") from error
+
+
+def decode_ls_advertisement(data):
+    return _checked(_decode_ls_advertisement, data)
+
+
+def decode_dv_message(data):
+    # Returns ('table', sender, [(destination, distance, predecessor or None), ...]) or ('change', sender, cost)
+    return _checked(_decode_dv_message, data)
+
+
+def decode_hello(data):
+    # Returns (sender, dead interval)
+    return _checked(_decode_hello, data)
@@ -0,0 +1,118 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+
+# Bounded pool of workers for received messages.
+# Messages are sharded by origin: all messages of one origin go to the same worker and are
+# handled in the order they were submitted, messages of different origins are handled side by
+# side. Each worker has a bounded queue; submit() blocks while it is full, so a flood slows down
+# the reader (and through TCP the senders) instead of piling up in memory. How often and how long
+# submit() had to wait is counted as backpressure. Readers that must not wait (datagrams, which
+# also carry the hellos) submit with block=False and the message is dropped instead.
+# A handler that fails is logged to `log`, the node's logger (node_log.py).
+
+WORKERS = 4
+QUEUE_SIZE = 64
+
+_STOP = object()
+
+
+class WorkerPool:
+    def __init__(self, handler, workers=WORKERS, queue_size=QUEUE_SIZE, log=None):
+        self.handler = handler
+        self.log = log or logging.getLogger(__name__)
+        self.queues = [queue.Queue(queue_size) for _ in range(max(workers, 1))]
+        self.lock = threading.Lock()
+        # Metrics
+        self.submitted = 0
+        self.handled = 0
+        self.failed = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self.max_depth = 0
+        self.threads = [threading.Thread(target=self.run, args=(work,), daemon=True) for work in self.queues]
+        for thread in self.threads:
+            thread.start()
+
+    def shard(self, origin):
+        # crc32 rather than hash(), which differs between runs for strings
+        return self.queues[zlib.crc32(origin.encode('utf-8')) % len(self.queues)]
+
+    def submit(self, origin, item, block=True):
+        # Returns False when the item was dropped, its worker's queue being full and block False
+        work = self.shard(origin)
+        waited = None
+        try:
+            work.put_nowait(item)
+        except queue.Full:
+            if not block:
+                with self.lock:
+                    self.dropped += 1
+                return False
+            start = time.monotonic()
+            work.put(item)
+            waited = time.monotonic() - start
+        depth = work.qsize()
+        with self.lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, depth)
+            if waited is not None:
+                self.blocked += 1
+                self.blocked_time += waited
+        return True
+
+    def run(self, work):
+        while True:
+            item = work.get()
+            try:
+                if item is _STOP:
+                    return
+                try:
+                    self.handler(item)
+                except Exception:
+                    # One bad message must not take the worker down
+                    self.log.exception("Failed to handle a message")
+                    with self.lock:
+                        self.failed += 1
+                with self.lock:
+                    self.handled += 1
+            finally:
+                work.task_done()
+
+    def join(self):
+        # Wait until everything submitted so far has been handled
+        for work in self.queues:
+            work.join()
+
+    def close(self):
+        for work in self.queues:
+            work.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'workers': len(self.queues),
+                'queue_size': self.queues[0].maxsize,
+                'depths': [work.qsize() for work in self.queues],
+                'max_depth': self.max_depth,
+                'submitted': self.submitted,
+                'handled': self.handled,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'blocked': self.blocked,
+                'blocked_time': self.blocked_time,
+            }
+
+
+def format_worker_metrics(metrics):
+    depths = ' '.join(str(depth) for depth in metrics['depths'])
+    return '\n'.join([f"workers: {metrics['workers']}, queue size {metrics['queue_size']} each",
+                      f"queued now: {depths} (highest: {metrics['max_depth']})",
+                      f"messages: {metrics['submitted']} submitted, {metrics['handled']} handled, {metrics['failed']} failed,"
+                      f" {metrics['dropped']} dropped on a full queue",
+                      f"backpressure: listener waited {metrics['blocked']} times, {metrics['blocked_time']:.2f}s in total"])